@@ -0,0 +1,267 @@
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import compactacion
+import dynamo
+from compras import DecimalEncoder, table
+from repositorio import clave_usuario
+
+# Items por página de Scan en cada segmento
+PAGINA = 500
+
+# Errores de DynamoDB que indican que hay que bajar el ritmo
+ERRORES_THROTTLING = (
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded'
+)
+
+# Pausa entre páginas de cada worker: se duplica ante throttling o exceso de
+# capacidad y se reduce de a poco mientras todo va bien (AIMD)
+PAUSA_MINIMA = 0.05
+PAUSA_MAXIMA = 10.0
+PAUSA_PASO = 0.02
+VENTANA_CAPACIDAD = 5.0
+
+def transformar_tenant_usuario(item):
+    """Completa tenant_usuario (clave del índice por usuario) en compras anteriores al índice"""
+    if not item.get('email_usuario'):
+        return None
+    esperado = clave_usuario(item['tenant_id'], item['email_usuario'])
+    if item.get('tenant_usuario') == esperado:
+        return None
+    return {**item, 'tenant_usuario': esperado}
+
+def transformar_total_monto(item):
+    """Recalcula subtotales, total_monto y total_productos en Decimal exacto desde productos"""
+    productos = compactacion.leer_productos(item) or []
+    recalculados = []
+    for producto in productos:
+        subtotal = Decimal(str(producto.get('precio', 0))) * Decimal(str(producto.get('cantidad', 0)))
+        recalculados.append({**producto, 'subtotal': subtotal})
+    total_monto = sum((p['subtotal'] for p in recalculados), Decimal('0'))
+    total_productos = sum((Decimal(str(p.get('cantidad', 0))) for p in recalculados), Decimal('0'))
+
+    sin_cambios = (
+        total_monto == item.get('total_monto')
+        and total_productos == item.get('total_productos')
+        and all(p['subtotal'] == o.get('subtotal') for p, o in zip(recalculados, productos))
+    )
+    if sin_cambios:
+        return None
+    # Se conserva el formato en que estaba guardado
+    if 'productos_z' in item:
+        return {**item, 'productos_z': compactacion.empaquetar(recalculados),
+                'total_monto': total_monto, 'total_productos': total_productos}
+    return {**item, 'productos': recalculados, 'total_monto': total_monto, 'total_productos': total_productos}
+
+def transformar_productos_compactos(item):
+    """Migra productos (lista de maps) al formato comprimido productos_z"""
+    if 'productos' not in item:
+        return None
+    return compactacion.compactar(item)
+
+# Transformaciones incluidas; también se acepta modulo:funcion
+TRANSFORMACIONES = {
+    'tenant_usuario': transformar_tenant_usuario,
+    'total_monto': transformar_total_monto,
+    'productos_compactos': transformar_productos_compactos
+}
+
+def resolver_transformacion(nombre):
+    """Transformación por nombre registrado o ruta modulo:funcion"""
+    if nombre in TRANSFORMACIONES:
+        return TRANSFORMACIONES[nombre]
+    if ':' not in nombre:
+        raise ValueError(f"Transformación desconocida: {nombre}")
+    modulo, funcion = nombre.split(':', 1)
+    return getattr(importlib.import_module(modulo), funcion)
+
+class Acelerador:
+    """Throttle adaptativo compartido por los workers según capacidad consumida y throttling"""
+
+    def __init__(self, capacidad_objetivo=None):
+        self.capacidad_objetivo = capacidad_objetivo
+        self.pausa = 0.0
+        self._consumos = deque()
+        self._lock = threading.Lock()
+
+    def registrar(self, unidades=0.0, throttling=False):
+        ahora = time.monotonic()
+        with self._lock:
+            self._consumos.append((ahora, unidades))
+            while self._consumos and self._consumos[0][0] < ahora - VENTANA_CAPACIDAD:
+                self._consumos.popleft()
+            ritmo = sum(u for _, u in self._consumos) / VENTANA_CAPACIDAD
+
+            if throttling or (self.capacidad_objetivo and ritmo > self.capacidad_objetivo):
+                self.pausa = min(PAUSA_MAXIMA, max(PAUSA_MINIMA, self.pausa * 2))
+            else:
+                self.pausa = max(0.0, self.pausa - PAUSA_PASO)
+            return ritmo
+
+    def esperar(self):
+        if self.pausa:
+            time.sleep(self.pausa)
+
+class Progreso:
+    """Contadores globales con reporte limitado a uno cada `intervalo` segundos"""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.inicio = time.monotonic()
+        self.leidos = 0
+        self.modificados = 0
+        self._ultimo_reporte = self.inicio
+        self._lock = threading.Lock()
+
+    def sumar(self, leidos, modificados, acelerador):
+        with self._lock:
+            self.leidos += leidos
+            self.modificados += modificados
+            ahora = time.monotonic()
+            if ahora - self._ultimo_reporte < self.intervalo:
+                return
+            self._ultimo_reporte = ahora
+            ritmo = self.leidos / (ahora - self.inicio)
+            print(f"leídos {self.leidos}, modificados {self.modificados}, "
+                  f"{ritmo:.0f} items/s, pausa {acelerador.pausa:.2f}s")
+
+class Checkpoint:
+    """Estado por segmento (clave de reanudación y contadores), guardado de forma atómica"""
+
+    def __init__(self, ruta, total_segmentos, transformacion):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self.estado = {'total_segmentos': total_segmentos, 'transformacion': transformacion, 'segmentos': {}}
+        if ruta and os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                guardado = json.load(f)
+            if (guardado['total_segmentos'], guardado['transformacion']) != (total_segmentos, transformacion):
+                raise ValueError('El checkpoint corresponde a otro número de segmentos o transformación')
+            self.estado = guardado
+
+    def segmento(self, numero):
+        return self.estado['segmentos'].get(str(numero), {'start_key': None, 'terminado': False,
+                                                          'leidos': 0, 'modificados': 0})
+
+    def actualizar(self, numero, segmento):
+        with self._lock:
+            self.estado['segmentos'][str(numero)] = segmento
+            if not self.ruta:
+                return
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(self.estado, f, cls=DecimalEncoder, montos_exactos=True)
+            os.replace(temporal, self.ruta)
+
+def llamar_con_throttle(acelerador, operacion, **kwargs):
+    """Ejecuta una llamada a DynamoDB reintentando mientras la rechace por throttling"""
+    while True:
+        try:
+            return operacion(**kwargs)
+        except Exception as e:
+            if dynamo.codigo_error(e) not in ERRORES_THROTTLING:
+                raise
+            acelerador.registrar(throttling=True)
+            acelerador.esperar()
+
+def escribir(items, acelerador):
+    """BatchWriteItem de los items transformados; lo no procesado se reintenta con throttle"""
+    pendientes = [{'PutRequest': {'Item': item}} for item in items]
+    while pendientes:
+        pendientes = llamar_con_throttle(acelerador, table.batch_write, solicitudes=pendientes)
+        if pendientes:
+            acelerador.registrar(throttling=True)
+            acelerador.esperar()
+
+def procesar_segmento(numero, total_segmentos, transformacion, checkpoint, acelerador, progreso, simulacion):
+    """Recorre un segmento del Scan aplicando la transformación página a página"""
+    segmento = checkpoint.segmento(numero)
+    if segmento['terminado']:
+        return segmento
+
+    scan_kwargs = {'Segment': numero, 'TotalSegments': total_segmentos, 'Limit': PAGINA}
+    while True:
+        if segmento['start_key']:
+            scan_kwargs['ExclusiveStartKey'] = segmento['start_key']
+        acelerador.esperar()
+        response = llamar_con_throttle(acelerador, table.scan, **dict(scan_kwargs))
+
+        items = response.get('Items', [])
+        modificados = [nuevo for nuevo in map(transformacion, items) if nuevo is not None]
+        if modificados and not simulacion:
+            escribir(modificados, acelerador)
+
+        # Capacidad de la lectura más una estimación de 1 WCU por item escrito
+        consumida = (response.get('ConsumedCapacity') or {}).get('CapacityUnits', 0)
+        acelerador.registrar(consumida + (0 if simulacion else len(modificados)))
+        progreso.sumar(len(items), len(modificados), acelerador)
+
+        segmento = {
+            'start_key': response.get('LastEvaluatedKey'),
+            'terminado': 'LastEvaluatedKey' not in response,
+            'leidos': segmento['leidos'] + len(items),
+            'modificados': segmento['modificados'] + len(modificados)
+        }
+        checkpoint.actualizar(numero, segmento)
+        if segmento['terminado']:
+            return segmento
+
+def ejecutar(transformacion, total_segmentos=8, hilos=None, ruta_checkpoint=None, nombre_transformacion=None,
+             capacidad_objetivo=None, intervalo_progreso=5.0, simulacion=False):
+    """
+    Scan paralelo (TotalSegments) aplicando la transformación a cada item y
+    escribiendo los modificados con BatchWriteItem. Los items se reescriben
+    completos: no ejecutar en paralelo con modificaciones de las mismas compras.
+    """
+    checkpoint = Checkpoint(ruta_checkpoint, total_segmentos, nombre_transformacion or transformacion.__name__)
+    acelerador = Acelerador(capacidad_objetivo)
+    progreso = Progreso(intervalo_progreso)
+
+    with ThreadPoolExecutor(max_workers=hilos or total_segmentos) as pool:
+        futuros = [
+            pool.submit(procesar_segmento, numero, total_segmentos, transformacion,
+                        checkpoint, acelerador, progreso, simulacion)
+            for numero in range(total_segmentos)
+        ]
+        segmentos = [futuro.result() for futuro in futuros]
+
+    # Backfill completo: el checkpoint ya no sirve
+    if ruta_checkpoint and os.path.exists(ruta_checkpoint):
+        os.remove(ruta_checkpoint)
+
+    return {
+        'leidos': sum(s['leidos'] for s in segmentos),
+        'modificados': sum(s['modificados'] for s in segmentos),
+        'segundos': round(time.monotonic() - progreso.inicio, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill con Scan paralelo sobre la tabla de compras')
+    parser.add_argument('transformacion',
+                        help=f"Transformación ({', '.join(TRANSFORMACIONES)}) o modulo:funcion")
+    parser.add_argument('--segmentos', type=int, default=8, help='TotalSegments del Scan')
+    parser.add_argument('--hilos', type=int, help='Workers (por defecto uno por segmento)')
+    parser.add_argument('--checkpoint', help='Archivo de checkpoint por segmento para reanudar')
+    parser.add_argument('--capacidad', type=float,
+                        help='Capacidad objetivo (unidades/s); por encima se reduce el ritmo')
+    parser.add_argument('--progreso', type=float, default=5.0, help='Segundos entre reportes de progreso')
+    parser.add_argument('--simulacion', action='store_true', help='Contar cambios sin escribir')
+    args = parser.parse_args()
+
+    transformacion = resolver_transformacion(args.transformacion)
+    resultado = ejecutar(transformacion, args.segmentos, args.hilos, args.checkpoint, args.transformacion,
+                         args.capacidad, args.progreso, args.simulacion)
+    print(f"Leídos {resultado['leidos']} items, modificados {resultado['modificados']} "
+          f"en {resultado['segundos']}s{' (simulación)' if args.simulacion else ''}")
+
+if __name__ == '__main__':
+    main()
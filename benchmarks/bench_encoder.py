@@ -0,0 +1,76 @@
+import argparse
+import json
+from decimal import Decimal
+
+from benchmarks.comun import emitir, medir
+
+import compras
+
+def decimal_to_float(obj):
+    """Conversión previa (copia recursiva) usada como referencia"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {k: decimal_to_float(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [decimal_to_float(item) for item in obj]
+    return obj
+
+def compra_sintetica(i, lineas):
+    """Compra con la forma que devuelve DynamoDB (números como Decimal)"""
+    productos = [
+        {
+            'codigo': f'MED-{i:06d}-{j:04d}',
+            'nombre': f'Producto {j}',
+            'precio': Decimal('12.50'),
+            'cantidad': Decimal(2),
+            'subtotal': Decimal('25.00')
+        }
+        for j in range(lineas)
+    ]
+    return {
+        'tenant_id': 'inkafarma',
+        'codigo_compra': f'COM-1718123456-{i:08X}',
+        'email_usuario': 'usuario@email.com',
+        'nombre_usuario': 'Juan Pérez',
+        'productos': productos,
+        'total_productos': Decimal(2 * lineas),
+        'total_monto': Decimal('25.00') * lineas,
+        'fecha_compra': '2025-06-15T10:30:00.000000',
+        'estado': 'completada',
+        'metodo_pago': 'tarjeta',
+        'direccion_entrega': 'Av. Siempre Viva 123, Lima',
+        'observaciones': ''
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialización de respuestas')
+    parser.add_argument('--compras', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--lineas', type=int, default=10, help='Productos por compra')
+    parser.add_argument('--repeticiones', type=int, default=100)
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    for n in args.compras:
+        body = {'compras': [compra_sintetica(i, args.lineas) for i in range(n)], 'count': n}
+
+        variantes = {
+            'decimal_to_float+dumps': lambda: json.dumps(decimal_to_float(body), default=str, ensure_ascii=False),
+            'DecimalEncoder': lambda: json.dumps(body, cls=compras.DecimalEncoder, ensure_ascii=False),
+            'DecimalEncoder(montos_exactos)': lambda: json.dumps(
+                body, cls=compras.DecimalEncoder, ensure_ascii=False, montos_exactos=True
+            )
+        }
+        for nombre, funcion in variantes.items():
+            resultados.append({
+                'variante': nombre,
+                'compras': n,
+                'lineas_por_compra': args.lineas,
+                **medir(funcion, args.repeticiones)
+            })
+
+    emitir(resultados, args.salida)
+
+if __name__ == '__main__':
+    main()
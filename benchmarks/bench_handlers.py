@@ -0,0 +1,221 @@
+import argparse
+import itertools
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import jwt
+
+from benchmarks.comun import emitir, medir
+from benchmarks.tabla_memoria import TablaMemoria
+
+import compras
+from repositorio import USUARIO_INDEX, RepositorioDynamo, clave_estadisticas, clave_usuario, crear_repositorio
+
+TENANT = 'inkafarma'
+
+def token_para(email):
+    """JWT firmado con el secreto del entorno de benchmark"""
+    payload = {
+        'email': email,
+        'nombre': 'Usuario Benchmark',
+        'tenant_id': TENANT,
+        'exp': int(time.time()) + 3600
+    }
+    return jwt.encode(payload, compras.jwt_secret, algorithm='HS256')
+
+# Integraciones de API Gateway: lambda (rutas de compras en serverless.yml) y lambda-proxy
+INTEGRACIONES = ('lambda', 'lambda-proxy')
+
+def evento(integracion, token, metodo, ruta, parametros=None, query=None, body=None):
+    """Evento de API Gateway con la forma de la integración indicada"""
+    headers = {'Authorization': f'Bearer {token}'}
+    if integracion == 'lambda':
+        # Plantilla de la integración lambda de serverless: path y query como objetos
+        return {
+            'body': body if body else {},
+            'method': metodo,
+            'headers': headers,
+            'query': query or {},
+            'path': parametros or {},
+            'stage': 'bench',
+            'requestPath': ruta
+        }
+    path = ruta
+    for nombre, valor in (parametros or {}).items():
+        path = path.replace(f'{{{nombre}}}', valor)
+    return {
+        'resource': ruta,
+        'path': path,
+        'httpMethod': metodo,
+        'headers': headers,
+        'queryStringParameters': query or None,
+        'pathParameters': parametros or None,
+        'requestContext': {'stage': 'bench', 'resourcePath': ruta},
+        'body': body or None,
+        'isBase64Encoded': False
+    }
+
+def compra_sintetica(i, email, fecha, lineas):
+    """Item de compra con la forma que guarda registrar_compra"""
+    productos = [
+        {
+            'codigo': f'MED-{j:04d}',
+            'nombre': f'Producto {j}',
+            'precio': Decimal('12.5'),
+            'cantidad': 2,
+            'subtotal': Decimal('25.0')
+        }
+        for j in range(lineas)
+    ]
+    return {
+        'tenant_id': TENANT,
+        'codigo_compra': f'COM-{int(fecha.timestamp())}-{i:08X}',
+        'tenant_usuario': clave_usuario(TENANT, email),
+        'email_usuario': email,
+        'nombre_usuario': 'Usuario Benchmark',
+        'productos': productos,
+        'total_productos': 2 * lineas,
+        'total_monto': Decimal('25.0') * lineas,
+        'fecha_compra': fecha.isoformat(),
+        'estado': 'completada',
+        'metodo_pago': 'tarjeta',
+        'direccion_entrega': 'Av. Siempre Viva 123, Lima',
+        'observaciones': ''
+    }
+
+def poblar(tamano, usuarios, lineas, backend='dynamodb'):
+    """
+    Repositorio con `tamano` compras repartidas entre `usuarios` del tenant.
+    Con backend dynamodb usa tablas en memoria que contabilizan RCU/WCU
+    (devueltas como segundo elemento); memoria y sqlite son los backends de
+    repositorio.py. El tercer elemento son hasta 50 códigos del usuario 0.
+    """
+    inicio = datetime(2025, 1, 1)
+    todas = [
+        compra_sintetica(i, f'usuario{i % usuarios}@email.com', inicio + timedelta(minutes=i), lineas)
+        for i in range(tamano)
+    ]
+    codigos = [compra['codigo_compra'] for compra in todas if compra['email_usuario'] == 'usuario0@email.com'][:50]
+
+    if backend != 'dynamodb':
+        repo = crear_repositorio(backend)
+        repo.guardar_compras(todas)
+        return repo, [], codigos
+
+    tabla = TablaMemoria('tenant_id', 'codigo_compra',
+                         indices={USUARIO_INDEX: ('tenant_usuario', 'fecha_compra')})
+    agregados = TablaMemoria('tenant_id', 'clave')
+
+    estadisticas = {}
+    for compra in todas:
+        email = compra['email_usuario']
+        tabla.put_item(Item=compra)
+
+        # Lo que mantendría el consumidor del stream
+        agregado = estadisticas.setdefault(email, {
+            'tenant_id': TENANT,
+            'clave': clave_estadisticas(email),
+            'email_usuario': email,
+            'total_compras': 0,
+            'total_gastado': Decimal('0'),
+            'total_productos_comprados': 0,
+            'primera_compra': compra['fecha_compra']
+        })
+        agregado['total_compras'] += 1
+        agregado['total_gastado'] += compra['total_monto']
+        agregado['total_productos_comprados'] += compra['total_productos']
+        agregado['ultima_compra'] = compra['fecha_compra']
+
+    for agregado in estadisticas.values():
+        agregados.put_item(Item=agregado)
+
+    tabla.reiniciar_consumo()
+    agregados.reiniciar_consumo()
+    return RepositorioDynamo(tabla, agregados), [tabla, agregados], codigos
+
+def casos(codigos, lineas, integracion):
+    """Eventos sintéticos por handler para el usuario 0 del tenant, con la forma de la integración"""
+    email = 'usuario0@email.com'
+    token = token_para(email)
+    codigo = codigos[0]
+    body = {
+        'productos': [
+            {'codigo': f'MED-{j:04d}', 'nombre': f'Producto {j}', 'precio': 12.5, 'cantidad': 2}
+            for j in range(lineas)
+        ],
+        'metodo_pago': 'tarjeta'
+    }
+    # registrar_compra va al final porque agrega compras al usuario medido
+    def crear(metodo, ruta, **campos):
+        return lambda: evento(integracion, token, metodo, ruta, **campos)
+
+    return {
+        'listar_compras': (compras.listar_compras, crear('GET', '/compras/listar', query={'limit': '20'})),
+        'listar_compras_resumen': (compras.listar_compras,
+                                   crear('GET', '/compras/listar', query={'limit': '20', 'vista': 'resumen'})),
+        'buscar_compra': (compras.buscar_compra,
+                          crear('GET', '/compras/buscar/{codigo}', parametros={'codigo': codigo})),
+        'buscar_compras': (compras.buscar_compras,
+                           crear('GET', '/compras/buscar', query={'codigos': ','.join(codigos)})),
+        'obtener_estadisticas_compras': (compras.obtener_estadisticas_compras, crear('GET', '/compras/estadisticas')),
+        'registrar_compra': (compras.registrar_compra,
+                             crear('POST', '/compras/registrar', body=json.dumps(body)))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark de handlers contra un repositorio local')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000],
+                        help='Compras por tenant')
+    parser.add_argument('--usuarios', type=int, default=10, help='Usuarios por tenant')
+    parser.add_argument('--lineas', type=int, default=3, help='Productos por compra')
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--handlers', nargs='+', help='Subconjunto de handlers a medir')
+    parser.add_argument('--backend', choices=('dynamodb', 'memoria', 'sqlite'), default='dynamodb',
+                        help='dynamodb: tablas en memoria con RCU/WCU simuladas; memoria o sqlite: repositorio.py')
+    parser.add_argument('--integraciones', nargs='+', choices=INTEGRACIONES, default=list(INTEGRACIONES),
+                        help='Forma de los eventos de API Gateway (por defecto ambas)')
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    for tamano, integracion in itertools.product(args.tamanos, args.integraciones):
+        compras.repositorio, tablas, codigos = poblar(tamano, args.usuarios, args.lineas, args.backend)
+        compras.compra_cache.limpiar()
+        compras.version_cache.limpiar()
+
+        for nombre, (handler, crear_evento) in casos(codigos, args.lineas, integracion).items():
+            if args.handlers and nombre not in args.handlers:
+                continue
+
+            llamadas = 0
+            estados = set()
+
+            def invocar():
+                nonlocal llamadas
+                llamadas += 1
+                estados.add(handler(crear_evento(), None)['statusCode'])
+
+            for tabla in tablas:
+                tabla.reiniciar_consumo()
+            metricas = medir(invocar, args.repeticiones)
+
+            resultado = {
+                'handler': nombre,
+                'backend': args.backend,
+                'integracion': integracion,
+                'compras_por_tenant': tamano,
+                'usuarios': args.usuarios,
+                **metricas,
+                'status_codes': sorted(estados)
+            }
+            if tablas:
+                resultado['rcu_por_llamada'] = round(sum(t.rcu for t in tablas) / llamadas, 3)
+                resultado['wcu_por_llamada'] = round(sum(t.wcu for t in tablas) / llamadas, 3)
+            resultados.append(resultado)
+
+    emitir(resultados, args.salida)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+
+from benchmarks.comun import emitir, medir
+
+import compras
+
+CODIGO = 'COM-1718123456-ABCD1234'
+
+# Llamadas por muestra: una sola resolución queda por debajo de la resolución del reloj
+LLAMADAS_POR_MUESTRA = 1000
+
+def resolver_inline(event):
+    """Cadena de fallbacks previa de buscar_compra (regex compilada en cada llamada), como referencia"""
+    codigo_compra = None
+    if event.get('pathParameters') and event['pathParameters'].get('codigo'):
+        codigo_compra = event['pathParameters']['codigo']
+    elif event.get('path') and isinstance(event['path'], dict) and event['path'].get('codigo'):
+        codigo_compra = event['path']['codigo']
+    elif event.get('queryStringParameters') and event['queryStringParameters'].get('codigo'):
+        codigo_compra = event['queryStringParameters']['codigo']
+    elif event.get('resource'):
+        import re
+        matches = re.search(r'/compras/buscar/([^/]+)', event['resource'])
+        if matches:
+            codigo_compra = matches.group(1)
+    elif event.get('requestPath'):
+        import re
+        matches = re.search(r'/compras/buscar/([^/]+)', event['requestPath'])
+        if matches:
+            codigo_compra = matches.group(1)
+    elif event.get('requestContext') and event['requestContext'].get('resourcePath'):
+        import re
+        matches = re.search(r'/compras/buscar/([^/]+)', event['requestContext']['resourcePath'])
+        if matches:
+            codigo_compra = matches.group(1)
+    elif event.get('path') and isinstance(event['path'], str):
+        import re
+        matches = re.search(r'/compras/buscar/([^/]+)', str(event['path']))
+        if matches:
+            codigo_compra = matches.group(1)
+    return codigo_compra
+
+def formas_evento():
+    """Eventos de ejemplo por forma de integración"""
+    return {
+        # integration: lambda (plantilla por defecto de serverless)
+        'lambda': {
+            'body': {},
+            'method': 'GET',
+            'headers': {'Authorization': 'Bearer x'},
+            'path': {'codigo': CODIGO},
+            'query': {},
+            'stage': 'dev',
+            'requestPath': '/compras/buscar/{codigo}'
+        },
+        # integration: lambda-proxy
+        'lambda-proxy': {
+            'resource': '/compras/buscar/{codigo}',
+            'path': f'/compras/buscar/{CODIGO}',
+            'httpMethod': 'GET',
+            'headers': {'Authorization': 'Bearer x'},
+            'queryStringParameters': None,
+            'pathParameters': {'codigo': CODIGO},
+            'requestContext': {'resourcePath': '/compras/buscar/{codigo}', 'stage': 'dev'}
+        },
+        # lambda-proxy sin pathParameters (p. ej. ruta {proxy+}): solo la ruta como string
+        'lambda-proxy-ruta': {
+            'resource': '/{proxy+}',
+            'path': f'/dev/compras/buscar/{CODIGO}',
+            'httpMethod': 'GET',
+            'headers': {'Authorization': 'Bearer x'},
+            'pathParameters': None,
+            'requestContext': {'resourcePath': '/{proxy+}', 'stage': 'dev'}
+        },
+        # Sin código: agota los lugares posibles de la forma lambda
+        'sin-codigo': {
+            'path': {},
+            'query': {},
+            'headers': {'Authorization': 'Bearer x'}
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark del resolver de código de buscar_compra')
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    for forma, event in formas_evento().items():
+        for nombre, resolver in (('inline', resolver_inline), ('precompilado', compras.resolver_codigo_compra)):
+            def muestra():
+                for _ in range(LLAMADAS_POR_MUESTRA):
+                    resolver(event)
+
+            metricas = medir(muestra, args.repeticiones)
+            resultados.append({
+                'forma': forma,
+                'resolver': nombre,
+                'codigo': resolver(event),
+                'ns_por_llamada': round(metricas['media_ms'] * 1e6 / LLAMADAS_POR_MUESTRA, 1),
+                **metricas
+            })
+
+    emitir(resultados, args.salida)
+
+if __name__ == '__main__':
+    main()
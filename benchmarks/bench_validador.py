@@ -0,0 +1,77 @@
+import argparse
+import json
+from decimal import Decimal
+
+from benchmarks.comun import emitir, medir
+
+import compras
+
+def validar_anterior(productos):
+    """Validación previa de registrar_compra (float → str → Decimal y dos pasadas de sum), como referencia"""
+    for i, producto in enumerate(productos):
+        required_fields = ['codigo', 'nombre', 'precio', 'cantidad']
+        for field in required_fields:
+            if field not in producto or producto[field] is None:
+                return None, f'Campo requerido en producto {i+1}: {field}'
+        try:
+            if not isinstance(producto['cantidad'], int) or producto['cantidad'] <= 0:
+                return None, f'Cantidad debe ser un número entero mayor a 0 en producto {i+1}'
+            precio = float(producto['precio'])
+            if precio <= 0:
+                return None, f'Precio debe ser mayor a 0 en producto {i+1}'
+            producto['precio'] = Decimal(str(precio))
+            producto['subtotal'] = Decimal(str(precio * producto['cantidad']))
+        except (ValueError, TypeError):
+            return None, f'Precio inválido en producto {i+1}'
+
+    total_productos = sum(p['cantidad'] for p in productos)
+    total_monto = sum(p['subtotal'] for p in productos)
+    return (total_productos, total_monto), None
+
+def carrito(lineas, invalidas=0):
+    """Body JSON de una compra con `lineas` productos; las últimas `invalidas` traen precio 0"""
+    productos = [
+        {
+            'codigo': f'MED-{j:04d}',
+            'nombre': f'Producto {j}',
+            'precio': 0 if j >= lineas - invalidas else 12.35 + j % 7,
+            'cantidad': 1 + j % 3
+        }
+        for j in range(lineas)
+    ]
+    return json.dumps({'productos': productos})
+
+def main():
+    parser = argparse.ArgumentParser(description='Parseo y validación del carrito de registrar_compra')
+    parser.add_argument('--lineas', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    # Cada muestra parsea el body: la validación modifica los productos
+    variantes = {
+        'anterior': lambda body: validar_anterior(json.loads(body)['productos']),
+        'compilado': lambda body: compras.validar_productos(json.loads(body, parse_float=Decimal)['productos'])
+    }
+
+    resultados = []
+    for lineas in args.lineas:
+        for caso, invalidas in (('valido', 0), ('con_errores', max(1, lineas // 10))):
+            body = carrito(lineas, invalidas)
+            for nombre, variante in variantes.items():
+                totales, errores = variante(body)
+                metricas = medir(lambda: variante(body), args.repeticiones)
+                resultados.append({
+                    'lineas': lineas,
+                    'caso': caso,
+                    'validador': nombre,
+                    'total_monto': str(totales[1]) if totales else None,
+                    'errores_reportados': len(errores) if isinstance(errores, list) else int(bool(errores)),
+                    'us_por_linea': round(metricas['media_ms'] * 1000 / lineas, 3),
+                    **metricas
+                })
+
+    emitir(resultados, args.salida)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Entorno mínimo para importar los handlers fuera de AWS
+os.environ.setdefault('TABLE_NAME', 'bench-t_compras')
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+# Sin líneas EMF: no se mezclan con los resultados en stdout ni suman su costo a los tiempos
+os.environ.setdefault('METRICAS_HABILITADAS', 'false')
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista de valores"""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def medir(funcion, repeticiones=200, calentamiento=10):
+    """Latencia (p50/p99/media en ms) y asignaciones (pico en KiB) de una función"""
+    for _ in range(calentamiento):
+        funcion()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # Las asignaciones se miden aparte: tracemalloc distorsiona la latencia
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentil(tiempos, 50), 4),
+        'p99_ms': round(percentil(tiempos, 99), 4),
+        'media_ms': round(statistics.fmean(tiempos), 4),
+        'pico_kib': round(pico / 1024, 2),
+        'repeticiones': repeticiones
+    }
+
+def emitir(resultados, salida=None):
+    """Escribe los resultados como JSON (stdout o archivo) para comparar entre corridas"""
+    documento = {
+        'python': sys.version.split()[0],
+        'timestamp': int(time.time()),
+        'resultados': resultados
+    }
+    texto = json.dumps(documento, indent=2, ensure_ascii=False)
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
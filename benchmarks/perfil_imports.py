@@ -0,0 +1,87 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.comun import emitir
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Línea de `python -X importtime`: "import time: <self> | <cumulative> | <paquete>"
+LINEA_IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def handlers_serverless():
+    """Pares (función, módulo.handler) declarados en serverless.yml"""
+    handlers = []
+    funcion = None
+    for linea in (RAIZ / 'serverless.yml').read_text(encoding='utf-8').splitlines():
+        coincidencia = re.match(r'^  ([\w-]+):\s*$', linea)
+        if coincidencia:
+            funcion = coincidencia.group(1)
+        coincidencia = re.match(r'^\s+handler:\s*([\w.]+)', linea)
+        if coincidencia and funcion:
+            handlers.append((funcion, coincidencia.group(1)))
+    return handlers
+
+def perfilar(modulo, handler, con_cliente):
+    """Ejecuta un intérprete limpio con -X importtime y devuelve el reporte del módulo"""
+    codigo = f"import {modulo}; getattr({modulo}, {handler!r})"
+    if con_cliente:
+        # Incluye la creación perezosa del cliente DynamoDB (primera invocación)
+        codigo += "; import sys; 'dynamo' in sys.modules and sys.modules['dynamo'].obtener_cliente()"
+
+    env = {
+        'TABLE_NAME': 'perfil-t_compras',
+        'JWT_SECRET': 'perfil-secret',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        **os.environ,
+        'PYTHONDONTWRITEBYTECODE': '1'
+    }
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ, env=env, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr.strip().splitlines()[-1])
+
+    paquetes = []
+    total_us = 0
+    for linea in proceso.stderr.splitlines():
+        coincidencia = LINEA_IMPORTTIME.match(linea)
+        if not coincidencia:
+            continue
+        propio, acumulado, sangria, paquete = coincidencia.groups()
+        paquetes.append({'paquete': paquete, 'propio_us': int(propio), 'acumulado_us': int(acumulado)})
+        # Los imports de primer nivel (sin sangría) suman el total
+        if len(sangria) == 1:
+            total_us += int(acumulado)
+
+    return total_us, paquetes
+
+def main():
+    parser = argparse.ArgumentParser(description='Perfil de tiempo de importación por handler')
+    parser.add_argument('--top', type=int, default=15, help='Paquetes más costosos a reportar')
+    parser.add_argument('--con-cliente', action='store_true',
+                        help='Incluir la creación del cliente DynamoDB')
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    for funcion, ruta in handlers_serverless():
+        modulo, handler = ruta.rsplit('.', 1)
+        total_us, paquetes = perfilar(modulo, handler, args.con_cliente)
+        paquetes.sort(key=lambda p: p['acumulado_us'], reverse=True)
+        resultados.append({
+            'funcion': funcion,
+            'handler': ruta,
+            'total_ms': round(total_us / 1000, 2),
+            'boto3_importado': any(p['paquete'] == 'boto3' for p in paquetes),
+            'top': paquetes[:args.top]
+        })
+
+    emitir(resultados, args.salida)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import bisect
+import math
+import re
+
+from dynamo import tamano_item
+
+# Condiciones de clave soportadas (las que usan los handlers)
+CONDICION_HASH = re.compile(r'^(\w+) = (:\w+)$')
+CONDICION_BETWEEN = re.compile(r'^(\w+) BETWEEN (:\w+) AND (:\w+)$')
+CONDICION_COMPARACION = re.compile(r'^(\w+) (=|<=|>=|<|>) (:\w+)$')
+CONDICION_BEGINS_WITH = re.compile(r'^begins_with\((\w+), (:\w+)\)$')
+
+class TablaMemoria:
+    """
+    Sustituto en memoria de dynamo.Tabla para benchmarks locales. Soporta
+    las operaciones y expresiones que usan los handlers y contabiliza las
+    RCU/WCU que DynamoDB cobraría por cada llamada.
+    """
+
+    def __init__(self, hash_key, range_key, indices=None):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indices = indices or {}
+        self.particiones = {}
+        self._ordenadas = {}
+        self._indices = {nombre: {} for nombre in self.indices}
+        self.rcu = 0.0
+        self.wcu = 0.0
+
+    def reiniciar_consumo(self):
+        self.rcu = 0.0
+        self.wcu = 0.0
+
+    def _clave(self, item):
+        return item[self.hash_key], item[self.range_key]
+
+    def put_item(self, Item, **kwargs):
+        pk, sk = self._clave(Item)
+        particion = self.particiones.setdefault(pk, {})
+        anterior = particion.get(sk)
+        if anterior is None:
+            bisect.insort(self._ordenadas.setdefault(pk, []), (sk, pk, sk))
+        else:
+            self._quitar_de_indices(anterior)
+        particion[sk] = Item
+        self._agregar_a_indices(Item)
+        self.wcu += math.ceil(tamano_item(Item) / 1024)
+        return {}
+
+    def _agregar_a_indices(self, item):
+        for nombre, (ih, ir) in self.indices.items():
+            if ih in item and ir in item:
+                entradas = self._indices[nombre].setdefault(item[ih], [])
+                bisect.insort(entradas, (item[ir], item[self.hash_key], item[self.range_key]))
+
+    def _quitar_de_indices(self, item):
+        for nombre, (ih, ir) in self.indices.items():
+            if ih in item and ir in item:
+                entradas = self._indices[nombre].get(item[ih], [])
+                entrada = (item[ir], item[self.hash_key], item[self.range_key])
+                posicion = bisect.bisect_left(entradas, entrada)
+                if posicion < len(entradas) and entradas[posicion] == entrada:
+                    entradas.pop(posicion)
+
+    def get_item(self, Key, ConsistentRead=False, **kwargs):
+        item = self.particiones.get(Key[self.hash_key], {}).get(Key[self.range_key])
+        unidades = max(1, math.ceil(tamano_item(item) / 4096)) if item else 1
+        self.rcu += unidades if ConsistentRead else unidades / 2
+        return {'Item': item} if item is not None else {}
+
+    def batch_get(self, claves, context=None, ConsistentRead=False, ProjectionExpression=None,
+                  ExpressionAttributeNames=None, **kwargs):
+        items = []
+        for clave in claves:
+            item = self.particiones.get(clave[self.hash_key], {}).get(clave[self.range_key])
+            # BatchGetItem cobra cada item por separado, redondeado a 4 KB
+            unidades = max(1, math.ceil(tamano_item(item) / 4096)) if item else 1
+            self.rcu += unidades if ConsistentRead else unidades / 2
+            if item is not None:
+                items.append(self._proyectar(item, ProjectionExpression, ExpressionAttributeNames))
+        return items, []
+
+    def batch_write(self, solicitudes, context=None):
+        for solicitud in solicitudes:
+            self.put_item(Item=solicitud['PutRequest']['Item'])
+        return []
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              ScanIndexForward=True, Limit=None, ExclusiveStartKey=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        condiciones = KeyConditionExpression.split(' AND ', 1)
+        hash_attr, hash_param = CONDICION_HASH.match(condiciones[0]).groups()
+        hash_valor = ExpressionAttributeValues[hash_param]
+        rango = self._filtro_rango(condiciones[1], ExpressionAttributeValues) if len(condiciones) > 1 else None
+
+        # Entradas (valor de rango, pk, sk) ordenadas por la clave de rango
+        if IndexName:
+            index_hash, index_range = self.indices[IndexName]
+            entradas = self._indices[IndexName].get(hash_valor, [])
+        else:
+            index_hash, index_range = self.hash_key, self.range_key
+            entradas = self._ordenadas.get(hash_valor, [])
+
+        # Posición de inicio por búsqueda binaria (ExclusiveStartKey incluido)
+        if ExclusiveStartKey:
+            inicio = (ExclusiveStartKey[index_range], ExclusiveStartKey[self.hash_key],
+                      ExclusiveStartKey[self.range_key])
+            if ScanIndexForward:
+                posiciones = range(bisect.bisect_right(entradas, inicio), len(entradas))
+            else:
+                posiciones = range(bisect.bisect_left(entradas, inicio) - 1, -1, -1)
+        elif ScanIndexForward:
+            posiciones = range(len(entradas))
+        else:
+            posiciones = range(len(entradas) - 1, -1, -1)
+
+        items = []
+        leidos = 0
+        ultimo = None
+        for posicion in posiciones:
+            entrada = entradas[posicion]
+            if rango and not rango(entrada[0]):
+                continue
+            item = self.particiones[entrada[1]][entrada[2]]
+            leidos += tamano_item(item)
+            items.append(self._proyectar(item, ProjectionExpression, ExpressionAttributeNames))
+            if Limit and len(items) >= Limit:
+                ultimo = item
+                break
+
+        self.rcu += max(1, math.ceil(leidos / 4096)) / 2
+
+        response = {'Items': items, 'Count': len(items)}
+        if ultimo is not None:
+            claves = {index_hash, index_range, self.hash_key, self.range_key}
+            response['LastEvaluatedKey'] = {k: ultimo[k] for k in claves}
+        return response
+
+    def _filtro_rango(self, condicion, valores):
+        coincidencia = CONDICION_BETWEEN.match(condicion)
+        if coincidencia:
+            desde, hasta = valores[coincidencia.group(2)], valores[coincidencia.group(3)]
+            return lambda v: desde <= v <= hasta
+        coincidencia = CONDICION_BEGINS_WITH.match(condicion)
+        if coincidencia:
+            prefijo = valores[coincidencia.group(2)]
+            return lambda v: v.startswith(prefijo)
+        coincidencia = CONDICION_COMPARACION.match(condicion)
+        if coincidencia:
+            operador, valor = coincidencia.group(2), valores[coincidencia.group(3)]
+            return {
+                '=': lambda v: v == valor,
+                '<=': lambda v: v <= valor,
+                '>=': lambda v: v >= valor,
+                '<': lambda v: v < valor,
+                '>': lambda v: v > valor
+            }[operador]
+        raise ValueError(f'Condición de clave no soportada: {condicion}')
+
+    @staticmethod
+    def _proyectar(item, proyeccion, nombres):
+        if not proyeccion:
+            return item
+        nombres = nombres or {}
+        campos = [nombres.get(c.strip(), c.strip()) for c in proyeccion.split(',')]
+        return {c: item[c] for c in campos if c in item}
@@ -0,0 +1,87 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+def tamano_aproximado(valor):
+    """Memoria aproximada (sys.getsizeof recursivo) de un valor en bytes"""
+    tamano = sys.getsizeof(valor)
+    if isinstance(valor, dict):
+        tamano += sum(tamano_aproximado(k) + tamano_aproximado(v) for k, v in valor.items())
+    elif isinstance(valor, (list, tuple, set)):
+        tamano += sum(tamano_aproximado(v) for v in valor)
+    return tamano
+
+class CacheLRU:
+    """Cache LRU acotado con expiración por entrada, pensado para contenedores calientes"""
+
+    def __init__(self, max_entradas, ttl=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, default=None):
+        """Devuelve el valor vigente o default; las entradas vencidas se descartan"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                valor, expira_en, tamano = entrada
+                if expira_en is None or expira_en > time.time():
+                    self._entradas.move_to_end(clave)
+                    self.hits += 1
+                    return valor
+                del self._entradas[clave]
+                self.bytes -= tamano
+            self.misses += 1
+            return default
+
+    def guardar(self, clave, valor, expira_en=None, tamano=0):
+        """
+        Guarda un valor hasta expira_en (epoch en segundos) o hasta el ttl por
+        defecto; tamano (bytes, opcional) se suma a la memoria reportada
+        """
+        if expira_en is None and self.ttl is not None:
+            expira_en = time.time() + self.ttl
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[2]
+            self._entradas[clave] = (valor, expira_en, tamano)
+            self.bytes += tamano
+            while len(self._entradas) > self.max_entradas:
+                _, descartada = self._entradas.popitem(last=False)
+                self.bytes -= descartada[2]
+
+    def invalidar(self, clave):
+        """Elimina una entrada si existe"""
+        with self._lock:
+            entrada = self._entradas.pop(clave, None)
+            if entrada is not None:
+                self.bytes -= entrada[2]
+
+    def limpiar(self):
+        """Vacía el cache y reinicia los contadores"""
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def estadisticas(self):
+        """Contadores de aciertos/fallos y ocupación"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0,
+            'entradas': len(self._entradas),
+            'max_entradas': self.max_entradas,
+            'bytes': self.bytes
+        }
@@ -0,0 +1,115 @@
+import os
+import threading
+from datetime import datetime, timezone
+
+# Códigos de compra ordenables (estilo ULID): COM-U + 10 caracteres con los
+# milisegundos desde epoch + 16 de aleatoriedad, en base32 de Crockford. El
+# orden lexicográfico de codigo_compra (sort key de la tabla) es el orden de
+# creación, así que un rango de códigos equivale a un rango de fechas
+PREFIJO = 'COM-'
+MARCA_ORDENADO = 'U'
+
+# Los códigos anteriores (COM-{segundos}-{8 hex}) empiezan con un dígito
+# después del prefijo; la marca los ordena a todos antes que los nuevos
+PREFIJO_ORDENADO = PREFIJO + MARCA_ORDENADO
+
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+VALORES = {caracter: valor for valor, caracter in enumerate(ALFABETO)}
+CARACTERES_TIEMPO = 10
+CARACTERES_ALEATORIOS = 16
+BITS_ALEATORIOS = 80
+TIEMPO_MAXIMO = (1 << 48) - 1
+ALEATORIO_MAXIMO = (1 << BITS_ALEATORIOS) - 1
+
+# Segundos del formato anterior: se comparan como texto, así que los rangos
+# se acotan a los de 10 dígitos (2001-09-09 a 2286-11-20)
+SEGUNDOS_ANTERIOR_MINIMO = 1000000000
+SEGUNDOS_ANTERIOR_MAXIMO = 9999999999
+
+_ultimo_ms = -1
+_ultimo_aleatorio = 0
+_lock = threading.Lock()
+
+def codificar(valor, caracteres):
+    """Entero en base32 de Crockford con ancho fijo"""
+    texto = []
+    for _ in range(caracteres):
+        valor, resto = divmod(valor, 32)
+        texto.append(ALFABETO[resto])
+    return ''.join(reversed(texto))
+
+def decodificar(texto):
+    """Entero desde base32 de Crockford"""
+    valor = 0
+    for caracter in texto:
+        valor = valor * 32 + VALORES[caracter]
+    return valor
+
+def milisegundos(fecha):
+    """Milisegundos desde epoch de un datetime o fecha ISO (naive = UTC, la hora de Lambda en fecha_compra)"""
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha)
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return int(fecha.timestamp() * 1000)
+
+def componer(ms, aleatorio):
+    """Código ordenado con el tiempo y la parte aleatoria dados"""
+    return PREFIJO_ORDENADO + codificar(ms, CARACTERES_TIEMPO) + codificar(aleatorio, CARACTERES_ALEATORIOS)
+
+def generar(ahora=None):
+    """
+    Código ordenado para una compra creada en `ahora`. Monótono en el proceso:
+    en el mismo milisegundo (o si el reloj retrocede) se incrementa la parte
+    aleatoria del anterior en lugar de sortear una nueva.
+    """
+    global _ultimo_ms, _ultimo_aleatorio
+    ms = milisegundos(ahora or datetime.now(timezone.utc))
+    with _lock:
+        if ms <= _ultimo_ms:
+            ms = _ultimo_ms
+            aleatorio = _ultimo_aleatorio + 1
+            # Desborde de la parte aleatoria: se pasa al milisegundo siguiente
+            if aleatorio > ALEATORIO_MAXIMO:
+                ms += 1
+                aleatorio = int.from_bytes(os.urandom(BITS_ALEATORIOS // 8), 'big')
+        else:
+            aleatorio = int.from_bytes(os.urandom(BITS_ALEATORIOS // 8), 'big')
+        _ultimo_ms, _ultimo_aleatorio = ms, aleatorio
+    return componer(ms, aleatorio)
+
+def es_ordenado(codigo):
+    """Indica si el código tiene el formato ordenable"""
+    return (codigo.startswith(PREFIJO_ORDENADO)
+            and len(codigo) == len(PREFIJO_ORDENADO) + CARACTERES_TIEMPO + CARACTERES_ALEATORIOS)
+
+def fecha_de_codigo(codigo):
+    """Fecha de creación (UTC, naive como fecha_compra) codificada en un código de cualquiera de los dos formatos"""
+    if es_ordenado(codigo):
+        inicio = len(PREFIJO_ORDENADO)
+        segundos = decodificar(codigo[inicio:inicio + CARACTERES_TIEMPO]) / 1000
+        return datetime.fromtimestamp(segundos, timezone.utc).replace(tzinfo=None)
+    segundos = codigo[len(PREFIJO):].split('-', 1)[0]
+    if not codigo.startswith(PREFIJO) or not segundos.isdigit():
+        raise ValueError(f"Código de compra sin fecha: {codigo}")
+    return datetime.fromtimestamp(int(segundos), timezone.utc).replace(tzinfo=None)
+
+def rangos_codigos(desde=None, hasta=None):
+    """
+    Rangos (inicio, fin) de codigo_compra, en orden ascendente, con las compras
+    creadas entre dos fechas (datetime o ISO, inclusivas, con precisión de
+    milisegundos): uno para los códigos anteriores y otro para los ordenados.
+    Cada rango sirve como condición BETWEEN de un Query por tenant_id.
+    """
+    segundos_desde = max(SEGUNDOS_ANTERIOR_MINIMO, milisegundos(desde) // 1000) if desde else SEGUNDOS_ANTERIOR_MINIMO
+    segundos_hasta = min(SEGUNDOS_ANTERIOR_MAXIMO, milisegundos(hasta) // 1000) if hasta else SEGUNDOS_ANTERIOR_MAXIMO
+    ms_desde = max(0, milisegundos(desde)) if desde else 0
+    ms_hasta = min(TIEMPO_MAXIMO, milisegundos(hasta)) if hasta else TIEMPO_MAXIMO
+
+    rangos = []
+    # '~' ordena después de cualquier sufijo hexadecimal del formato anterior
+    if segundos_desde <= segundos_hasta:
+        rangos.append((f"{PREFIJO}{segundos_desde}-", f"{PREFIJO}{segundos_hasta}-~"))
+    if ms_desde <= ms_hasta:
+        rangos.append((componer(ms_desde, 0), componer(ms_hasta, ALEATORIO_MAXIMO)))
+    return rangos
@@ -0,0 +1,98 @@
+import base64
+import json
+import os
+import zlib
+from decimal import Decimal
+
+import dynamo
+
+# Guardar los productos de las compras nuevas comprimidos en productos_z; las
+# lecturas aceptan siempre los dos formatos
+PRODUCTOS_COMPACTOS = os.environ.get('PRODUCTOS_COMPACTOS', 'false').lower() == 'true'
+
+# Primer byte de productos_z: versión del formato. Se leen todas las de
+# VERSIONES_LEGIBLES; se escribe VERSION_FORMATO
+VERSION_FORMATO = 2
+VERSIONES_LEGIBLES = frozenset((1, 2))
+ZLIB_NIVEL = 6
+
+# Formato: zlib de un array JSON con una fila por línea. Cada fila lleva estas
+# columnas en orden y, si la línea trae otros atributos, un último elemento con
+# ellos en formato tipado de DynamoDB. Una celda es null si la línea no tiene
+# el atributo, string si el valor tiene el tipo esperado de la columna (número
+# como string decimal exacto en las numéricas, texto en las demás) y, desde la
+# v2, el valor tipado de DynamoDB ({"N": ...}, {"S": ...}, {"NULL": true}) si
+# tiene otro tipo. La v1 guardaba cualquier valor como string y perdía su tipo
+COLUMNAS = ('codigo', 'nombre', 'precio', 'cantidad', 'subtotal')
+COLUMNAS_NUMERICAS = frozenset(('precio', 'cantidad', 'subtotal'))
+
+def _columna(producto, columna):
+    """Celda de una columna: null, string (tipo esperado) o valor tipado de DynamoDB"""
+    if columna not in producto:
+        return None
+    valor = producto[columna]
+    if columna in COLUMNAS_NUMERICAS:
+        if isinstance(valor, (int, Decimal)) and not isinstance(valor, bool):
+            return str(valor)
+    elif isinstance(valor, str):
+        return valor
+    return dynamo.serializar(valor)
+
+def _valor(columna, celda):
+    """Valor de una celda, con los tipos de una lectura de DynamoDB"""
+    if isinstance(celda, dict):
+        return dynamo.deserializar(celda)
+    return Decimal(celda) if columna in COLUMNAS_NUMERICAS else celda
+
+def empaquetar(productos):
+    """Comprime la lista de productos en el binario versionado de productos_z"""
+    filas = []
+    for producto in productos:
+        fila = [_columna(producto, columna) for columna in COLUMNAS]
+        extras = {clave: valor for clave, valor in producto.items() if clave not in COLUMNAS}
+        if extras:
+            fila.append(dynamo.serializar(extras))
+        filas.append(fila)
+    datos = json.dumps(filas, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return bytes((VERSION_FORMATO,)) + zlib.compress(datos, ZLIB_NIVEL)
+
+def desempaquetar(datos):
+    """Lista de productos (números como Decimal, igual que una lectura de DynamoDB) desde productos_z"""
+    # En las imágenes de DynamoDB Streams los binarios llegan en base64
+    if isinstance(datos, str):
+        datos = base64.b64decode(datos)
+    if not datos or datos[0] not in VERSIONES_LEGIBLES:
+        raise ValueError(f"Versión de productos_z no soportada: {datos[0] if datos else None}")
+
+    productos = []
+    for fila in json.loads(zlib.decompress(datos[1:])):
+        producto = {}
+        for columna, celda in zip(COLUMNAS, fila):
+            if celda is not None:
+                producto[columna] = _valor(columna, celda)
+        if len(fila) > len(COLUMNAS):
+            producto.update(dynamo.deserializar(fila[-1]))
+        productos.append(producto)
+    return productos
+
+def leer_productos(item):
+    """Productos de un item de compra en cualquiera de los dos formatos"""
+    if 'productos_z' in item:
+        return desempaquetar(item['productos_z'])
+    return item.get('productos')
+
+def expandir(item):
+    """Item con productos decodificado; sin copia si no está comprimido"""
+    if 'productos_z' not in item:
+        return item
+    expandido = {clave: valor for clave, valor in item.items() if clave != 'productos_z'}
+    expandido['productos'] = desempaquetar(item['productos_z'])
+    return expandido
+
+def compactar(item):
+    """Copia del item con productos comprimido en productos_z"""
+    if 'productos' not in item:
+        return item
+    compacto = {clave: valor for clave, valor in item.items() if clave != 'productos'}
+    compacto['productos_z'] = empaquetar(item['productos'])
+    return compacto
@@ -1,32 +1,223 @@
+import base64
+import hashlib
+import hmac
 import json
-import boto3
 import jwt
 import os
-import uuid
-from datetime import datetime, timezone
-from decimal import Decimal
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
 
-# Clientes AWS
-dynamodb = boto3.resource('dynamodb')
+import codigos
+import compactacion
+import compresion
+import dynamo
+import metricas
+from cache import CacheLRU, tamano_aproximado
+from repositorio import ATRIBUTOS_INTERNOS, clave_usuario, crear_repositorio
+
+# Tablas DynamoDB (el cliente de bajo nivel se crea en la primera llamada)
 table_name = os.environ['TABLE_NAME']
 jwt_secret = os.environ['JWT_SECRET']
-table = dynamodb.Table(table_name)
+table = dynamo.Tabla(table_name)
+agregados_table_name = os.environ.get('AGREGADOS_TABLE_NAME', f"{table_name}_agregados")
+agregados_table = dynamo.Tabla(agregados_table_name)
 
-def lambda_response(status_code, body):
-    """Función helper para respuestas consistentes"""
-    return {
+# Acceso a datos de los handlers: DynamoDB en producción; memoria o SQLite
+# (REPOSITORIO=memoria|sqlite) para pruebas de carga y perfiles locales
+repositorio = crear_repositorio(
+    os.environ.get('REPOSITORIO', 'dynamodb'), table, agregados_table,
+    os.environ.get('REPOSITORIO_SQLITE', ':memory:')
+)
+
+LIMIT_MAXIMO = 100
+
+# Código de compra en rutas como /{stage}/compras/buscar/{codigo}; no acepta la
+# plantilla literal ({codigo}) que API Gateway pone en `resource`
+RUTA_BUSCAR = re.compile(r'/compras/buscar/([^/{}?]+)')
+
+# Atributos seleccionables con ?fields= en listar_compras y campos de ?vista=resumen
+CAMPOS_COMPRA = (
+    'codigo_compra', 'tenant_id', 'email_usuario', 'nombre_usuario', 'productos',
+    'total_productos', 'total_monto', 'fecha_compra', 'estado', 'metodo_pago',
+    'direccion_entrega', 'observaciones'
+)
+VISTAS = {
+    'resumen': ('codigo_compra', 'fecha_compra', 'total_monto', 'total_productos', 'estado')
+}
+
+# Reportes de productos del tenant (acumulados diarios del stream)
+TOP_MAXIMO = 100
+DIAS_REPORTE_MAXIMO = 366
+# Solo los tokens con el claim rol igual a este valor ven los reportes; sin
+# rol configurado nadie los ve
+REPORTES_ROL = os.environ.get('REPORTES_ROL', 'gerente')
+
+# Registro por lotes
+LOTE_MAXIMO = int(os.environ.get('LOTE_MAXIMO', '500'))
+
+# Búsqueda de varios códigos en una llamada (BatchGetItem en bloques de 100)
+CODIGOS_MAXIMO = int(os.environ.get('CODIGOS_MAXIMO', '200'))
+
+# Montos Decimal como string exacto en las respuestas (en lugar de float)
+MONTOS_EXACTOS = os.environ.get('MONTOS_EXACTOS', 'false').lower() == 'true'
+
+# Payloads JWT ya verificados (reutilizados entre invocaciones del contenedor)
+JWT_CACHE_TTL_SIN_EXP = 300
+jwt_cache = CacheLRU(int(os.environ.get('JWT_CACHE_MAX', '1024')))
+
+# Compras leídas por (tenant_id, codigo_compra, versión), incluidas las no
+# encontradas (TTL corto). El consumidor del stream incrementa la versión de
+# compras del tenant al modificar o eliminar compras; cada contenedor la relee
+# como máximo cada VERSION_CACHE_TTL segundos
+COMPRA_CACHE_TTL = int(os.environ.get('COMPRA_CACHE_TTL', '300'))
+COMPRA_CACHE_NEGATIVO_TTL = int(os.environ.get('COMPRA_CACHE_NEGATIVO_TTL', '5'))
+VERSION_CACHE_TTL = int(os.environ.get('VERSION_CACHE_TTL', '10'))
+CLAVE_VERSION_COMPRAS = 'VERSION#COMPRAS'
+SIN_ENTRADA = object()
+compra_cache = CacheLRU(int(os.environ.get('COMPRA_CACHE_MAX', '1000')), ttl=COMPRA_CACHE_TTL)
+version_cache = CacheLRU(1024, ttl=VERSION_CACHE_TTL)
+
+# Idempotency-Key de registrar_compra: la respuesta queda en la tabla de
+# agregados (IDEMPOTENCIA#{email}#{clave}, expirada por el TTL de DynamoDB en
+# expira_en) y se repite sin volver a validar ni escribir. Una reserva en curso
+# que no se completa (invocación caída) se libera a los IDEMPOTENCIA_EN_CURSO_TTL
+# segundos, más que el timeout de la función
+IDEMPOTENCIA_TTL = int(os.environ.get('IDEMPOTENCIA_TTL', '86400'))
+IDEMPOTENCIA_EN_CURSO_TTL = 60
+IDEMPOTENCIA_CLAVE_MAXIMA = 255
+idempotencia_cache = CacheLRU(int(os.environ.get('IDEMPOTENCIA_CACHE_MAX', '512')), ttl=IDEMPOTENCIA_TTL)
+
+# Atributos con montos de dinero: con montos_exactos salen siempre como string decimal
+CAMPOS_MONTO = frozenset(('precio', 'subtotal', 'total_monto', 'total_gastado', 'monto'))
+
+class DecimalEncoder(json.JSONEncoder):
+    """
+    Encoder JSON que serializa Decimal en la misma pasada que json.dumps,
+    sin construir una copia del documento. Por defecto emite float (igual que
+    la conversión anterior); con montos_exactos los atributos de CAMPOS_MONTO
+    salen como string decimal en notación fija ("12.50", "100") y los demás
+    números como número JSON exacto (enteros como int).
+    """
+
+    def __init__(self, *args, montos_exactos=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.montos_exactos = montos_exactos
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return str(obj)
+
+    def iterencode(self, o, _one_shot=False):
+        if not self.montos_exactos:
+            return super().iterencode(o, _one_shot)
+        partes = []
+        self._codificar_exacto(o, False, partes.append)
+        return partes
+
+    def _codificar_exacto(self, o, es_monto, escribir):
+        """Recorrido único del documento que conoce el atributo de cada valor (sin indent)"""
+        cadena = json.encoder.encode_basestring_ascii if self.ensure_ascii else json.encoder.encode_basestring
+        separador_items, separador_clave = self.item_separator, self.key_separator
+
+        def valor(o, es_monto):
+            if isinstance(o, str):
+                escribir(cadena(o))
+            elif isinstance(o, Decimal):
+                texto = format(o, 'f')
+                if es_monto:
+                    escribir('"' + texto + '"')
+                elif o == o.to_integral_value():
+                    escribir(str(int(o)))
+                else:
+                    escribir(texto)
+            elif isinstance(o, dict):
+                escribir('{')
+                primero = True
+                for clave, v in (sorted(o.items()) if self.sort_keys else o.items()):
+                    if primero:
+                        primero = False
+                    else:
+                        escribir(separador_items)
+                    escribir(cadena(str(clave)))
+                    escribir(separador_clave)
+                    valor(v, clave in CAMPOS_MONTO)
+                escribir('}')
+            elif isinstance(o, (list, tuple)):
+                escribir('[')
+                for i, v in enumerate(o):
+                    if i:
+                        escribir(separador_items)
+                    valor(v, es_monto)
+                escribir(']')
+            elif o is None:
+                escribir('null')
+            elif o is True:
+                escribir('true')
+            elif o is False:
+                escribir('false')
+            elif isinstance(o, int):
+                escribir('"' + str(o) + '"' if es_monto else str(o))
+            elif isinstance(o, float):
+                escribir(float.__repr__(o))
+            else:
+                valor(self.default(o), es_monto)
+
+        valor(o, es_monto)
+
+def lambda_response(status_code, body, event=None):
+    """
+    Función helper para respuestas consistentes. Con el evento de una
+    integración lambda-proxy negocia Accept-Encoding y comprime los cuerpos
+    que superan COMPRESION_UMBRAL_BYTES.
+    """
+    with metricas.fase('serializacion'):
+        body_json = json.dumps(body, cls=DecimalEncoder, ensure_ascii=False, montos_exactos=MONTOS_EXACTOS)
+    metricas.contar('bytes_respuesta', len(body_json))
+    response = {
         'statusCode': status_code,
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key',
             'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
         },
-        'body': json.dumps(body, default=str, ensure_ascii=False)
+        'body': body_json
     }
+    
+    # Con la integración lambda API Gateway no decodifica base64 ni propaga
+    # Content-Encoding: solo se comprime en lambda-proxy
+    if event is None or not compresion.COMPRESION_HABILITADA or forma_evento(event) != 'lambda-proxy':
+        return response
+    
+    response['headers']['Vary'] = 'Accept-Encoding'
+    datos = body_json.encode('utf-8')
+    if len(datos) < compresion.COMPRESION_UMBRAL_BYTES:
+        return response
+    
+    codificacion = compresion.elegir_codificacion(event.get('headers'))
+    if codificacion is None:
+        return response
+    
+    with metricas.fase('compresion'):
+        comprimido = compresion.comprimir(datos, codificacion)
+    metricas.contar('bytes_comprimidos', len(comprimido))
+    metricas.fijar('ratio_compresion', round(len(datos) / len(comprimido), 2))
+    
+    response['headers']['Content-Encoding'] = codificacion
+    response['body'] = compresion.cuerpo_base64(comprimido)
+    response['isBase64Encoded'] = True
+    return response
 
 def extract_user_from_token(event):
     """Extrae información del usuario desde el token JWT"""
+    with metricas.fase('auth'):
+        return _extract_user_from_token(event)
+
+def _extract_user_from_token(event):
+    """Verificación del token (con cache de payloads) sin instrumentar"""
     try:
         auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization')
         
@@ -35,36 +226,505 @@ def extract_user_from_token(event):
         
         token = auth_header.split(' ')[1]
         
+        # La clave incluye el secreto vigente: si cambia, el token se vuelve a verificar
+        cache_key = hashlib.sha256(f"{jwt_secret}.{token}".encode('utf-8')).digest()
+        payload = jwt_cache.obtener(cache_key)
+        if payload is not None:
+            metricas.contar('jwt_cache_hit')
+            return payload, None
+        metricas.contar('jwt_cache_miss')
+        
         try:
             payload = jwt.decode(token, jwt_secret, algorithms=['HS256'])
-            return payload, None
         except jwt.ExpiredSignatureError:
             return None, 'Token expirado'
         except jwt.InvalidTokenError:
             return None, 'Token inválido'
+        
+        # Se conserva solo hasta el exp del token
+        expira_en = payload.get('exp')
+        if not isinstance(expira_en, (int, float)):
+            expira_en = time.time() + JWT_CACHE_TTL_SIN_EXP
+        jwt_cache.guardar(cache_key, payload, expira_en)
+        
+        return payload, None
             
     except Exception as e:
         print(f"Error extrayendo usuario del token: {str(e)}")
         return None, 'Error procesando token'
 
-def generar_codigo_compra():
-    """Genera un código único para la compra"""
-    timestamp = int(datetime.now().timestamp())
-    random_part = str(uuid.uuid4()).replace('-', '')[:8].upper()
-    return f"COM-{timestamp}-{random_part}"
-
-def decimal_to_float(obj):
-    """Convierte Decimal a float para serialización JSON"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: decimal_to_float(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [decimal_to_float(item) for item in obj]
-    return obj
+def clave_producto_dia(dia, codigo):
+    """Clave del acumulado de ventas de un producto en un día (YYYY-MM-DD)"""
+    return f"PRODUCTO#{dia}#{codigo}"
+
+def clave_ventas_dia(dia):
+    """Clave del acumulado de ventas del tenant en un día (YYYY-MM-DD)"""
+    return f"VENTAS#{dia}"
+
+def obtener_query_params(event):
+    """Parámetros de query para integración lambda-proxy (queryStringParameters) o lambda (query)"""
+    return event.get('queryStringParameters') or event.get('query') or {}
+
+def obtener_body(event):
+    """Body del evento: texto (lambda-proxy, decodificado si llega en base64 por binaryMediaTypes) u objeto ya parseado"""
+    body = event.get('body')
+    if event.get('isBase64Encoded') and isinstance(body, str):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+def forma_evento(event):
+    """Forma del evento según la integración de API Gateway: lambda, lambda-proxy u otra"""
+    if isinstance(event.get('path'), dict):
+        return 'lambda'
+    if 'httpMethod' in event or 'requestContext' in event:
+        return 'lambda-proxy'
+    return 'otra'
+
+def _codigo_desde_ruta(event):
+    """Código al final de la ruta (path como string, requestPath, resource o resourcePath)"""
+    path = event.get('path')
+    candidatos = (
+        path if isinstance(path, str) else None,
+        event.get('requestPath'),
+        event.get('resource'),
+        (event.get('requestContext') or {}).get('resourcePath')
+    )
+    for ruta in candidatos:
+        if ruta:
+            coincidencia = RUTA_BUSCAR.search(ruta)
+            if coincidencia:
+                return coincidencia.group(1)
+    return None
+
+def resolver_codigo_compra(event):
+    """Extrae el código de compra según la forma del evento (pathParameters, path, ruta o query)"""
+    # pathParameters solo llega en lambda-proxy y resuelve el caso habitual sin más búsquedas
+    parametros = event.get('pathParameters')
+    if parametros and parametros.get('codigo'):
+        return parametros['codigo']
+    
+    forma = forma_evento(event)
+    if forma == 'lambda':
+        return event['path'].get('codigo') or (event.get('query') or {}).get('codigo')
+    if forma == 'lambda-proxy':
+        return _codigo_desde_ruta(event) or (event.get('queryStringParameters') or {}).get('codigo')
+    return obtener_query_params(event).get('codigo') or _codigo_desde_ruta(event)
+
+def proyeccion_campos(query_params):
+    """
+    Atributos a leer para ?fields=a,b o ?vista=resumen; None si se piden los
+    items completos. fields tiene prioridad sobre vista.
+    """
+    if query_params.get('fields'):
+        campos = [campo.strip() for campo in query_params['fields'].split(',') if campo.strip()]
+        desconocidos = [campo for campo in campos if campo not in CAMPOS_COMPRA]
+        if desconocidos:
+            raise ValueError(f"Campos no válidos: {', '.join(desconocidos)}")
+    elif query_params.get('vista') and query_params['vista'] != 'completa':
+        if query_params['vista'] not in VISTAS:
+            raise ValueError(f"Vista no válida: {query_params['vista']}")
+        campos = VISTAS[query_params['vista']]
+    else:
+        return None
+    
+    # productos puede estar guardado comprimido en productos_z
+    if 'productos' in campos:
+        campos = [*campos, 'productos_z']
+    return list(dict.fromkeys(campos))
+
+def firmar_cursor(payload):
+    """Firma HMAC-SHA256 de un cursor con el secreto del servicio"""
+    firma = hmac.new(jwt_secret.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(firma[:18]).decode('ascii')
+
+def codificar_cursor(last_evaluated_key):
+    """Convierte un LastEvaluatedKey en un token opaco y firmado"""
+    data = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True, default=str)
+    payload = base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+    return f"{payload}.{firmar_cursor(payload)}"
+
+def decodificar_cursor(token, tenant_usuario):
+    """Valida la firma de un cursor y devuelve el ExclusiveStartKey que contiene"""
+    try:
+        payload, firma = token.split('.', 1)
+        if not hmac.compare_digest(firma, firmar_cursor(payload)):
+            raise ValueError('firma')
+        data = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+        start_key = json.loads(data)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Parámetro lastKey inválido')
+    
+    # El cursor solo es válido para el usuario que lo recibió
+    if not isinstance(start_key, dict) or start_key.get('tenant_usuario') != tenant_usuario:
+        raise ValueError('Parámetro lastKey inválido')
+    return start_key
+
+def version_compras(tenant_id):
+    """Versión de las compras del tenant (la incrementa el stream al modificar o eliminar)"""
+    version = version_cache.obtener(tenant_id)
+    if version is None:
+        item = repositorio.obtener_agregado(tenant_id, CLAVE_VERSION_COMPRAS)
+        version = int((item or {}).get('version', 0))
+        version_cache.guardar(tenant_id, version)
+    return version
+
+def compra_en_cache(tenant_id, codigo_compra, version):
+    """(True, item o None si no existe) si hay una lectura vigente para la versión; (False, None) si no"""
+    # Las entradas de versiones anteriores quedan huérfanas y las descarta el LRU
+    item = compra_cache.obtener((tenant_id, codigo_compra, version), SIN_ENTRADA)
+    if item is SIN_ENTRADA:
+        metricas.contar('cache_miss')
+        return False, None
+    metricas.contar('cache_hit')
+    return True, item
+
+def guardar_compra_en_cache(tenant_id, codigo_compra, version, item):
+    """Guarda una lectura (item o None) con la versión vigente al leerla"""
+    clave = (tenant_id, codigo_compra, version)
+    if item is None:
+        compra_cache.guardar(clave, None, time.time() + COMPRA_CACHE_NEGATIVO_TTL)
+    else:
+        compra_cache.guardar(clave, item, tamano=tamano_aproximado(item))
+
+def obtener_compra(tenant_id, codigo_compra):
+    """get_item con cache de lectura en el contenedor; None si la compra no existe"""
+    # La versión se lee antes que la compra: una modificación concurrente
+    # deja la entrada con una versión vieja, que se descarta en la próxima lectura
+    version = version_compras(tenant_id)
+    encontrada, item = compra_en_cache(tenant_id, codigo_compra, version)
+    if encontrada:
+        return item
+    
+    item = repositorio.obtener_compra(tenant_id, codigo_compra)
+    guardar_compra_en_cache(tenant_id, codigo_compra, version, item)
+    return item
+
+def con_productos(items):
+    """Decodifica productos_z solo en los items que se devuelven (el resto no se toca)"""
+    if not any('productos_z' in item for item in items):
+        return items
+    with metricas.fase('descompresion'):
+        return [compactacion.expandir(item) for item in items]
+
+def sin_internos(item):
+    """Copia del item sin los atributos internos (claves del índice); el original puede estar en cache"""
+    if not any(atributo in item for atributo in ATRIBUTOS_INTERNOS):
+        return item
+    return {k: v for k, v in item.items() if k not in ATRIBUTOS_INTERNOS}
+
+def para_respuesta(items):
+    """Items tal como se devuelven: productos decodificados y sin atributos internos"""
+    return [sin_internos(item) for item in con_productos(items)]
+
+def item_para_guardar(compra_item):
+    """Item a escribir: con PRODUCTOS_COMPACTOS los productos van comprimidos en productos_z"""
+    if not compactacion.PRODUCTOS_COMPACTOS:
+        return compra_item
+    return compactacion.compactar(compra_item)
+
+def registrar_estado_cache():
+    """Hit ratio y memoria del cache de compras en las métricas de la invocación"""
+    estadisticas = compra_cache.estadisticas()
+    metricas.fijar('cache_hit_ratio', estadisticas['hit_ratio'])
+    metricas.fijar('cache_entradas', estadisticas['entradas'])
+    metricas.fijar('bytes_cache', estadisticas['bytes'])
+
+def clave_idempotencia(email, idempotency_key):
+    """Clave (sort key) del registro de una Idempotency-Key del usuario"""
+    return f"IDEMPOTENCIA#{email}#{idempotency_key}"
+
+def huella_solicitud(body):
+    """Hash del body recibido, para detectar una Idempotency-Key reutilizada con otro contenido"""
+    if not isinstance(body, str):
+        body = json.dumps(body, sort_keys=True, separators=(',', ':'), cls=DecimalEncoder)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+def reservar_idempotencia(usuario, idempotency_key, huella):
+    """
+    Busca la respuesta guardada de la clave (cache del contenedor y luego
+    DynamoDB) y, si no existe, la reserva con un put condicional. Devuelve None
+    si la solicitud debe ejecutarse o el registro existente (completado o en curso).
+    """
+    cache_key = (usuario['tenant_id'], usuario['email'], idempotency_key)
+    registro = idempotencia_cache.obtener(cache_key)
+    if registro is not None:
+        metricas.contar('idempotencia_cache_hit')
+        return registro
+    
+    ahora = int(time.time())
+    registro = repositorio.reservar_agregado({
+        'tenant_id': usuario['tenant_id'],
+        'clave': clave_idempotencia(usuario['email'], idempotency_key),
+        'estado': 'en_curso',
+        'huella': huella,
+        'expira_en': ahora + IDEMPOTENCIA_EN_CURSO_TTL
+    }, ahora)
+    
+    if registro and registro['estado'] == 'completada':
+        idempotencia_cache.guardar(cache_key, registro, int(registro['expira_en']))
+    return registro
+
+def completar_idempotencia(usuario, idempotency_key, huella, status_code, body):
+    """Guarda la respuesta de la clave por IDEMPOTENCIA_TTL (DynamoDB y cache del contenedor)"""
+    registro = {
+        'estado': 'completada',
+        'huella': huella,
+        'status': status_code,
+        # Serializada como se envió: la repetición devuelve el mismo cuerpo
+        'respuesta': json.dumps(body, cls=DecimalEncoder, ensure_ascii=False, montos_exactos=MONTOS_EXACTOS),
+        'expira_en': int(time.time()) + IDEMPOTENCIA_TTL
+    }
+    repositorio.guardar_agregado({
+        'tenant_id': usuario['tenant_id'],
+        'clave': clave_idempotencia(usuario['email'], idempotency_key),
+        **registro
+    })
+    idempotencia_cache.guardar((usuario['tenant_id'], usuario['email'], idempotency_key),
+                               registro, registro['expira_en'])
+
+def liberar_idempotencia(usuario, idempotency_key):
+    """Elimina la reserva en curso para que un reintento pueda ejecutarse"""
+    try:
+        repositorio.eliminar_agregado(usuario['tenant_id'], clave_idempotencia(usuario['email'], idempotency_key),
+                                      estado='en_curso')
+    except Exception as e:
+        print(f"Error liberando Idempotency-Key: {str(e)}")
+
+def repetir_respuesta(registro, huella):
+    """Respuesta para una Idempotency-Key ya usada: la guardada, 409 si está en curso o 422 si cambió el body"""
+    if registro['huella'] != huella:
+        return lambda_response(422, {'error': 'Idempotency-Key ya usada con otro contenido'})
+    if registro['estado'] != 'completada':
+        return lambda_response(409, {'error': 'Hay una solicitud en curso con la misma Idempotency-Key'})
+    
+    metricas.contar('idempotencia_repetida')
+    response = lambda_response(int(registro['status']), json.loads(registro['respuesta']))
+    response['headers']['Idempotent-Replayed'] = 'true'
+    return response
+
+def generar_codigo_compra(ahora=None):
+    """Genera un código único para la compra, ordenable por fecha de creación (ver codigos.py)"""
+    return codigos.generar(ahora)
+
+def convertir_precio(valor):
+    """Precio como Decimal exacto (sin pasar por float); devuelve (precio, error)"""
+    if isinstance(valor, Decimal):
+        precio = valor
+    elif isinstance(valor, bool):
+        return None, 'Precio inválido'
+    elif isinstance(valor, int):
+        precio = Decimal(valor)
+    elif isinstance(valor, (float, str)):
+        # Un float ya parseado se toma por su representación más corta, como antes
+        try:
+            precio = Decimal(str(valor).strip())
+        except InvalidOperation:
+            return None, 'Precio inválido'
+    else:
+        return None, 'Precio inválido'
+    
+    if not precio.is_finite():
+        return None, 'Precio inválido'
+    if precio <= 0:
+        return None, 'Precio debe ser mayor a 0'
+    return precio, None
+
+def compilar_validador_productos(campos_requeridos=('codigo', 'nombre', 'precio', 'cantidad')):
+    """
+    Arma (una vez, al importar) el validador de productos: en una sola pasada
+    por línea comprueba campos, convierte precio a Decimal, calcula el subtotal
+    y acumula los totales, registrando todos los errores en lugar del primero.
+    """
+    cero = Decimal('0')
+    
+    def validar(productos):
+        """Valida, convierte y totaliza los productos; devuelve (totales, errores)"""
+        errores = []
+        total_productos = 0
+        total_monto = cero
+        
+        for i, producto in enumerate(productos, 1):
+            if not isinstance(producto, dict):
+                errores.append(f'Producto {i} inválido')
+                continue
+            
+            # Los campos presentes se validan aunque falten otros
+            errores_linea = len(errores)
+            for campo in campos_requeridos:
+                if producto.get(campo) is None:
+                    errores.append(f'Campo requerido en producto {i}: {campo}')
+            
+            cantidad = producto.get('cantidad')
+            if cantidad is not None and (not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0):
+                errores.append(f'Cantidad debe ser un número entero mayor a 0 en producto {i}')
+            
+            precio = producto.get('precio')
+            if precio is not None:
+                precio, error = convertir_precio(precio)
+                if error:
+                    errores.append(f'{error} en producto {i}')
+            
+            if len(errores) > errores_linea:
+                continue
+            
+            subtotal = precio * cantidad
+            producto['precio'] = precio
+            producto['subtotal'] = subtotal
+            total_productos += cantidad
+            total_monto += subtotal
+        
+        if errores:
+            return None, errores
+        return (total_productos, total_monto), []
+    
+    return validar
+
+validar_productos = compilar_validador_productos()
+
+def errores_validacion(errores):
+    """Body de error con el primer mensaje (compatibilidad) y la lista completa"""
+    return {'error': errores[0], 'errores': errores}
+
+def construir_compra(usuario, body):
+    """Valida el body de una compra y arma el item a guardar; devuelve (item, errores)"""
+    # Validar campos requeridos
+    if not isinstance(body, dict) or 'productos' not in body or not body['productos']:
+        return None, ['Lista de productos requerida']
+    
+    productos = body['productos']
+    if not isinstance(productos, list):
+        return None, ['Lista de productos inválida']
+    
+    totales, errores = validar_productos(productos)
+    if errores:
+        return None, errores
+    total_productos, total_monto = totales
+    
+    # Generar código de compra (con el mismo instante que fecha_compra, en UTC
+    # como en Lambda aunque el proceso corra con otra zona horaria)
+    ahora = datetime.now(timezone.utc)
+    codigo_compra = generar_codigo_compra(ahora)
+    
+    # Crear item de compra
+    return {
+        'tenant_id': usuario['tenant_id'],
+        'codigo_compra': codigo_compra,
+        'tenant_usuario': clave_usuario(usuario['tenant_id'], usuario['email']),
+        'email_usuario': usuario['email'],
+        'nombre_usuario': usuario['nombre'],
+        'productos': productos,
+        'total_productos': total_productos,
+        'total_monto': total_monto,
+        'fecha_compra': ahora.replace(tzinfo=None).isoformat(),
+        'estado': 'completada',
+        'metodo_pago': body.get('metodo_pago', 'online'),
+        'direccion_entrega': body.get('direccion_entrega', ''),
+        'observaciones': body.get('observaciones', '')
+    }, []
+
+def preparar_para_guardar(compra_item):
+    """Item en el formato almacenado, ya validado contra los tipos de DynamoDB; devuelve (item, error)"""
+    try:
+        item = item_para_guardar(compra_item)
+        dynamo.serializar_item(item)
+    except TypeError as e:
+        # Por ejemplo floats en atributos extra de un body parseado por la plantilla de integración lambda
+        return None, f'Valor no soportado en la compra: {str(e)}'
+    return item, None
+
+def escribir_lote(items, context=None):
+    """
+    Guarda items ya preparados en lote (en DynamoDB, BatchWriteItem en bloques de 25 con
+    reintentos de UnprocessedItems). Devuelve los codigo_compra que no se pudieron guardar.
+    """
+    return repositorio.guardar_compras(items, context)
 
+def obtener_codigos(event):
+    """Códigos pedidos en ?codigos=A,B,C o en el body {"codigos": [...]}, sin duplicados y en orden"""
+    codigos = obtener_query_params(event).get('codigos')
+    if codigos:
+        codigos = codigos.split(',')
+    else:
+        body = obtener_body(event)
+        if isinstance(body, str) and body:
+            body = json.loads(body)
+        codigos = body.get('codigos') if isinstance(body, dict) else None
+        if not isinstance(codigos, list):
+            return []
+    
+    # BatchGetItem rechaza claves repetidas en la misma solicitud
+    return list(dict.fromkeys(str(codigo).strip() for codigo in codigos if str(codigo).strip()))
+
+def procesar_registro(usuario, event):
+    """Valida y guarda la compra del evento; devuelve (status_code, body)"""
+    # Parsear body (los números decimales llegan como Decimal, sin float)
+    try:
+        with metricas.fase('parse'):
+            body = obtener_body(event)
+            if isinstance(body, str):
+                body = json.loads(body, parse_float=Decimal)
+    except json.JSONDecodeError:
+        return 400, {'error': 'JSON inválido'}
+    
+    # Validar productos y calcular totales
+    with metricas.fase('validacion'):
+        compra_item, errores = construir_compra(usuario, body)
+    if errores:
+        return 400, errores_validacion(errores)
+    item, error = preparar_para_guardar(compra_item)
+    if error:
+        return 400, errores_validacion([error])
+    
+    # Guardar en DynamoDB
+    repositorio.guardar_compra(item)
+    
+    return 201, {
+        'message': 'Compra registrada exitosamente',
+        'compra': sin_internos(compra_item)
+    }
+
+@metricas.instrumentado
 def registrar_compra(event, context):
-    """Función para registrar una nueva compra"""
+    """Función para registrar una nueva compra (con Idempotency-Key opcional para reintentos)"""
+    try:
+        # Validar token y extraer usuario
+        usuario, error = extract_user_from_token(event)
+        if error:
+            return lambda_response(401, {'error': error})
+        
+        idempotency_key = compresion.obtener_header(event.get('headers'), 'Idempotency-Key')
+        if idempotency_key is None:
+            return lambda_response(*procesar_registro(usuario, event))
+        if not 0 < len(idempotency_key) <= IDEMPOTENCIA_CLAVE_MAXIMA:
+            return lambda_response(400, {'error': 'Idempotency-Key inválida'})
+        
+        # Un reintento con la misma clave repite la respuesta guardada
+        huella = huella_solicitud(obtener_body(event))
+        registro = reservar_idempotencia(usuario, idempotency_key, huella)
+        if registro is not None:
+            return repetir_respuesta(registro, huella)
+        
+        try:
+            status_code, body = procesar_registro(usuario, event)
+        except Exception:
+            liberar_idempotencia(usuario, idempotency_key)
+            raise
+        
+        # La compra ya está guardada: si falla el registro se responde igual
+        try:
+            completar_idempotencia(usuario, idempotency_key, huella, status_code, body)
+        except Exception as e:
+            print(f"Error guardando respuesta de Idempotency-Key: {str(e)}")
+        
+        return lambda_response(status_code, body)
+        
+    except Exception as e:
+        print(f"Error registrando compra: {str(e)}")
+        return lambda_response(500, {'error': 'Error interno del servidor'})
+
+@metricas.instrumentado
+def registrar_compras_lote(event, context):
+    """Función para registrar un lote de compras (sincronización offline de POS)"""
     try:
         # Validar token y extraer usuario
         usuario, error = extract_user_from_token(event)
@@ -72,87 +732,61 @@ def registrar_compra(event, context):
             return lambda_response(401, {'error': error})
         
         # Parsear body
-        body = event.get('body')
-        if isinstance(body, str):
-            body = json.loads(body)
+        with metricas.fase('parse'):
+            body = obtener_body(event)
+            if isinstance(body, str):
+                body = json.loads(body, parse_float=Decimal)
         
-        # Validar campos requeridos
-        if 'productos' not in body or not body['productos']:
-            return lambda_response(400, {'error': 'Lista de productos requerida'})
+        compras = body.get('compras') if isinstance(body, dict) else None
+        if not compras or not isinstance(compras, list):
+            return lambda_response(400, {'error': 'Lista de compras requerida'})
         
-        productos = body['productos']
+        if len(compras) > LOTE_MAXIMO:
+            return lambda_response(400, {
+                'error': f'El lote admite como máximo {LOTE_MAXIMO} compras'
+            })
         
-        # Validar estructura de productos
-        for i, producto in enumerate(productos):
-            required_fields = ['codigo', 'nombre', 'precio', 'cantidad']
-            for field in required_fields:
-                if field not in producto or producto[field] is None:
-                    return lambda_response(400, {
-                        'error': f'Campo requerido en producto {i+1}: {field}'
-                    })
-            
-            # Validar tipos de datos
-            try:
-                if not isinstance(producto['cantidad'], int) or producto['cantidad'] <= 0:
-                    return lambda_response(400, {
-                        'error': f'Cantidad debe ser un número entero mayor a 0 en producto {i+1}'
-                    })
-                
-                precio = float(producto['precio'])
-                if precio <= 0:
-                    return lambda_response(400, {
-                        'error': f'Precio debe ser mayor a 0 en producto {i+1}'
-                    })
-                
-                # Convertir a Decimal para DynamoDB
-                producto['precio'] = Decimal(str(precio))
-                producto['subtotal'] = Decimal(str(precio * producto['cantidad']))
-                
-            except (ValueError, TypeError):
-                return lambda_response(400, {
-                    'error': f'Precio inválido en producto {i+1}'
-                })
-        
-        # Calcular totales
-        total_productos = sum(p['cantidad'] for p in productos)
-        total_monto = sum(p['subtotal'] for p in productos)
-        
-        # Generar código de compra
-        codigo_compra = generar_codigo_compra()
-        
-        # Crear item de compra
-        compra_item = {
-            'tenant_id': usuario['tenant_id'],
-            'codigo_compra': codigo_compra,
-            'email_usuario': usuario['email'],
-            'nombre_usuario': usuario['nombre'],
-            'productos': productos,
-            'total_productos': total_productos,
-            'total_monto': total_monto,
-            'fecha_compra': datetime.now().isoformat(),
-            'estado': 'completada',
-            'metodo_pago': body.get('metodo_pago', 'online'),
-            'direccion_entrega': body.get('direccion_entrega', ''),
-            'observaciones': body.get('observaciones', '')
-        }
+        # Validar cada compra con la misma lógica que registrar_compra; todas
+        # se serializan antes del primer BatchWriteItem
+        resultados = []
+        items = []
+        with metricas.fase('validacion'):
+            for i, compra_body in enumerate(compras):
+                compra_item, errores = construir_compra(usuario, compra_body)
+                if not errores:
+                    item, error = preparar_para_guardar(compra_item)
+                    errores = [error] if error else []
+                if errores:
+                    resultados.append({'indice': i, **errores_validacion(errores)})
+                else:
+                    resultados.append({'indice': i, 'codigo_compra': compra_item['codigo_compra']})
+                    items.append(item)
+        metricas.contar('items', len(items))
         
         # Guardar en DynamoDB
-        table.put_item(Item=compra_item)
+        fallidos = set(escribir_lote(items, context)) if items else set()
         
-        # Preparar respuesta (convertir Decimals a float)
-        compra_respuesta = decimal_to_float(compra_item)
+        for resultado in resultados:
+            if resultado.get('codigo_compra') in fallidos:
+                resultado['error'] = 'No se pudo guardar la compra, reintente'
+                del resultado['codigo_compra']
         
-        return lambda_response(201, {
-            'message': 'Compra registrada exitosamente',
-            'compra': compra_respuesta
-        })
+        registradas = sum(1 for r in resultados if 'codigo_compra' in r)
+        
+        return lambda_response(201 if registradas == len(resultados) else 207, {
+            'message': f'{registradas} de {len(resultados)} compras registradas',
+            'registradas': registradas,
+            'fallidas': len(resultados) - registradas,
+            'resultados': resultados
+        }, event)
         
     except json.JSONDecodeError:
         return lambda_response(400, {'error': 'JSON inválido'})
     except Exception as e:
-        print(f"Error registrando compra: {str(e)}")
+        print(f"Error registrando lote de compras: {str(e)}")
         return lambda_response(500, {'error': 'Error interno del servidor'})
 
+@metricas.instrumentado
 def listar_compras(event, context):
     """
     Lista las compras del usuario autenticado con limit real
@@ -164,48 +798,41 @@ def listar_compras(event, context):
             return lambda_response(401, {'error': error})
         
         # Obtener parámetros de query
-        query_params = event.get('queryStringParameters') or {}
+        query_params = obtener_query_params(event)
         
         # Parámetros de paginación
         limit = int(query_params.get('limit', 10))
+        if limit <= 0:
+            raise ValueError('limit debe ser mayor a 0')
+        limit = min(limit, LIMIT_MAXIMO)
         
         # Parámetros de filtro (opcionales)
         fecha_desde = query_params.get('fecha_desde')
         fecha_hasta = query_params.get('fecha_hasta')
         
-        # Consultar compras del usuario específico usando query
-        response = table.query(
-            KeyConditionExpression='tenant_id = :tenant_id',
-            FilterExpression='email_usuario = :email',
-            ExpressionAttributeValues={
-                ':tenant_id': usuario['tenant_id'],
-                ':email': usuario['email']
-            }
-        )
-        
-        items = response.get('Items', [])
-        
-        # Aplicar filtros de fecha SI se especifican
-        if fecha_desde:
-            items = [item for item in items if item.get('fecha_compra', '') >= fecha_desde]
-            
-        if fecha_hasta:
-            items = [item for item in items if item.get('fecha_compra', '') <= fecha_hasta]
+        # Solo se leen, convierten y serializan los atributos pedidos
+        campos = proyeccion_campos(query_params)
         
-        # Ordenar por fecha de compra (más reciente primero)
-        items.sort(key=lambda x: x.get('fecha_compra', ''), reverse=True)
+        # Cursor de la página anterior (opcional)
+        tenant_usuario = clave_usuario(usuario['tenant_id'], usuario['email'])
+        start_key = None
+        if query_params.get('lastKey'):
+            start_key = decodificar_cursor(query_params['lastKey'], tenant_usuario)
         
-        # APLICAR LIMIT DIRECTAMENTE
-        items = items[:limit]
+        # Más reciente primero; en DynamoDB el rango de fechas se resuelve en
+        # la condición de clave del índice por usuario
+        items, start_key = repositorio.listar_por_usuario(
+            tenant_usuario, fecha_desde, fecha_hasta, limit, start_key, campos
+        )
         
-        # Convertir Decimal a float para JSON
-        items = decimal_to_float(items)
+        metricas.contar('items', len(items))
         
         # Preparar respuesta
         result = {
-            'compras': items,
+            'compras': para_respuesta(items),
             'count': len(items),
-            'hasMore': False,  # Para simplificar, sin paginación compleja
+            'nextKey': codificar_cursor(start_key) if start_key else None,
+            'hasMore': start_key is not None,
             'usuario': {
                 'email': usuario['email'],
                 'nombre': usuario['nombre'],
@@ -213,7 +840,7 @@ def listar_compras(event, context):
             }
         }
         
-        return lambda_response(200, result)
+        return lambda_response(200, result, event)
         
     except ValueError as e:
         return lambda_response(400, {
@@ -225,9 +852,10 @@ def listar_compras(event, context):
         print(f"Error en listar_compras: {str(e)}")
         return lambda_response(500, {'error': 'Error interno del servidor'})
 
+@metricas.instrumentado
 def buscar_compra(event, context):
     """Función para buscar una compra específica por código"""
-    print('Evento completo:', json.dumps(event, indent=2, default=str))  # Debug
+    metricas.debug('Evento completo', event)
     
     try:
         # Validar token y extraer usuario
@@ -235,57 +863,19 @@ def buscar_compra(event, context):
         if error:
             return lambda_response(401, {'error': error})
         
-        # CORRECCIÓN: Múltiples formas de obtener el código
-        codigo_compra = None
-        
-        # Opción 1: Desde pathParameters (estructura estándar de API Gateway)
-        if event.get('pathParameters') and event['pathParameters'].get('codigo'):
-            codigo_compra = event['pathParameters']['codigo']
-        
-        # Opción 2: Desde path como objeto (ESTE ES TU CASO)
-        elif event.get('path') and isinstance(event['path'], dict) and event['path'].get('codigo'):
-            codigo_compra = event['path']['codigo']
-        
-        # Opción 3: Desde queryStringParameters (fallback)
-        elif event.get('queryStringParameters') and event['queryStringParameters'].get('codigo'):
-            codigo_compra = event['queryStringParameters']['codigo']
-        
-        # Opción 4: Desde resource path parsing (backup)
-        elif event.get('resource'):
-            import re
-            matches = re.search(r'/compras/buscar/([^/]+)', event['resource'])
-            if matches:
-                codigo_compra = matches.group(1)
-        
-        # Opción 5: Desde requestPath parsing
-        elif event.get('requestPath'):
-            import re
-            matches = re.search(r'/compras/buscar/([^/]+)', event['requestPath'])
-            if matches:
-                codigo_compra = matches.group(1)
-        
-        # Opción 6: Desde requestContext (otro fallback)
-        elif event.get('requestContext') and event['requestContext'].get('resourcePath'):
-            import re
-            matches = re.search(r'/compras/buscar/([^/]+)', event['requestContext']['resourcePath'])
-            if matches:
-                codigo_compra = matches.group(1)
-        
-        # Opción 7: Parsing manual del path como string
-        elif event.get('path') and isinstance(event['path'], str):
-            import re
-            matches = re.search(r'/compras/buscar/([^/]+)', str(event['path']))
-            if matches:
-                codigo_compra = matches.group(1)
-        
-        print(f'Código extraído: {codigo_compra}')  # Debug
+        # Código de compra según la forma del evento (lambda o lambda-proxy)
+        codigo_compra = resolver_codigo_compra(event)
+        
+        metricas.debug(f'Código extraído: {codigo_compra}')
         
         if not codigo_compra:
-            print('PathParameters:', event.get('pathParameters'))
-            print('Path:', event.get('path'))
-            print('Resource:', event.get('resource'))
-            print('RequestPath:', event.get('requestPath'))
-            print('RequestContext:', event.get('requestContext'))
+            metricas.debug('Evento sin código de compra', {
+                'pathParameters': event.get('pathParameters'),
+                'path': event.get('path'),
+                'resource': event.get('resource'),
+                'requestPath': event.get('requestPath'),
+                'requestContext': event.get('requestContext')
+            })
             return lambda_response(400, {
                 'error': 'Código de compra requerido',
                 'debug': {
@@ -298,30 +888,22 @@ def buscar_compra(event, context):
         
         # Buscar compra
         try:
-            print(f'Buscando compra con tenant_id: {usuario["tenant_id"]}, codigo_compra: {codigo_compra}')  # Debug
+            metricas.debug(f'Buscando compra con tenant_id: {usuario["tenant_id"]}, codigo_compra: {codigo_compra}')
             
-            response = table.get_item(
-                Key={
-                    'tenant_id': usuario['tenant_id'],
-                    'codigo_compra': codigo_compra
-                }
-            )
+            compra = obtener_compra(usuario['tenant_id'], codigo_compra)
+            registrar_estado_cache()
             
-            if 'Item' not in response:
+            if compra is None:
                 return lambda_response(404, {'error': 'Compra no encontrada'})
             
-            compra = response['Item']
-            
             # Verificar que la compra pertenece al usuario
             if compra.get('email_usuario') != usuario['email']:
                 return lambda_response(404, {'error': 'Compra no encontrada'})
             
-            # Convertir Decimals y responder
-            compra_respuesta = decimal_to_float(compra)
-            
+            # Los Decimal se serializan directamente en lambda_response
             return lambda_response(200, {
-                'compra': compra_respuesta
-            })
+                'compra': para_respuesta([compra])[0]
+            }, event)
             
         except Exception as e:
             print(f"Error buscando compra en DynamoDB: {str(e)}")
@@ -331,27 +913,181 @@ def buscar_compra(event, context):
         print(f"Error en buscar_compra: {str(e)}")
         return lambda_response(500, {'error': 'Error interno del servidor'})
 
-def obtener_estadisticas_compras(event, context):
-    """Función para obtener estadísticas de compras del usuario"""
+@metricas.instrumentado
+def buscar_compras(event, context):
+    """Función para buscar varias compras por código en una sola llamada"""
     try:
         # Validar token y extraer usuario
         usuario, error = extract_user_from_token(event)
         if error:
             return lambda_response(401, {'error': error})
         
-        # Consultar todas las compras del usuario
-        response = table.query(
-            KeyConditionExpression='tenant_id = :tenant_id',
-            FilterExpression='email_usuario = :email',
-            ExpressionAttributeValues={
-                ':tenant_id': usuario['tenant_id'],
-                ':email': usuario['email']
+        with metricas.fase('parse'):
+            codigos = obtener_codigos(event)
+        
+        if not codigos:
+            return lambda_response(400, {'error': 'Parámetro codigos requerido'})
+        
+        if len(codigos) > CODIGOS_MAXIMO:
+            return lambda_response(400, {
+                'error': f'Se admiten como máximo {CODIGOS_MAXIMO} códigos por búsqueda'
+            })
+        
+        # Primero el cache del contenedor; BatchGetItem solo para el resto
+        tenant_id = usuario['tenant_id']
+        version = version_compras(tenant_id)
+        items = []
+        pendientes = []
+        for codigo in codigos:
+            encontrada, item = compra_en_cache(tenant_id, codigo, version)
+            if not encontrada:
+                pendientes.append(codigo)
+            elif item is not None:
+                items.append(item)
+        
+        no_procesadas = []
+        if pendientes:
+            leidos, no_procesadas = repositorio.obtener_compras(tenant_id, pendientes, context)
+            leidos_por_codigo = {item['codigo_compra']: item for item in leidos}
+            sin_procesar = set(no_procesadas)
+            for codigo in pendientes:
+                if codigo not in sin_procesar:
+                    guardar_compra_en_cache(tenant_id, codigo, version, leidos_por_codigo.get(codigo))
+            items.extend(leidos)
+        registrar_estado_cache()
+        
+        # Misma verificación de pertenencia que buscar_compra: las ajenas cuentan como no encontradas
+        encontradas = {
+            item['codigo_compra']: item
+            for item in items
+            if item.get('email_usuario') == usuario['email']
+        }
+        no_procesados = set(no_procesadas)
+        metricas.contar('items', len(encontradas))
+        
+        compras = [encontradas[codigo] for codigo in codigos if codigo in encontradas]
+        no_encontrados = [
+            codigo for codigo in codigos
+            if codigo not in encontradas and codigo not in no_procesados
+        ]
+        
+        return lambda_response(200 if not no_procesados else 207, {
+            'compras': para_respuesta(compras),
+            'no_encontrados': no_encontrados,
+            'no_procesados': [codigo for codigo in codigos if codigo in no_procesados],
+            'total': len(compras)
+        }, event)
+        
+    except json.JSONDecodeError:
+        return lambda_response(400, {'error': 'JSON inválido'})
+    except Exception as e:
+        print(f"Error en buscar_compras: {str(e)}")
+        return lambda_response(500, {'error': 'Error interno del servidor'})
+
+@metricas.instrumentado
+def top_productos(event, context):
+    """Productos más vendidos y serie de ventas diarias del tenant entre dos fechas"""
+    try:
+        # Validar token y extraer usuario
+        usuario, error = extract_user_from_token(event)
+        if error:
+            return lambda_response(401, {'error': error})
+        
+        if not REPORTES_ROL or usuario.get('rol') != REPORTES_ROL:
+            return lambda_response(403, {'error': 'No autorizado para ver reportes del tenant'})
+        
+        query_params = obtener_query_params(event)
+        
+        # Rango de días (por defecto los últimos 30)
+        hasta = date.fromisoformat(query_params['hasta']) if query_params.get('hasta') else datetime.now(timezone.utc).date()
+        desde = date.fromisoformat(query_params['desde']) if query_params.get('desde') else hasta - timedelta(days=29)
+        if desde > hasta:
+            raise ValueError('desde debe ser anterior o igual a hasta')
+        if (hasta - desde).days >= DIAS_REPORTE_MAXIMO:
+            raise ValueError(f'El rango admite como máximo {DIAS_REPORTE_MAXIMO} días')
+        
+        top = int(query_params.get('top', 10))
+        if top <= 0:
+            raise ValueError('top debe ser mayor a 0')
+        top = min(top, TOP_MAXIMO)
+        
+        orden = query_params.get('orden', 'monto')
+        if orden not in ('monto', 'unidades'):
+            raise ValueError('orden debe ser monto o unidades')
+        
+        tenant_id = usuario['tenant_id']
+        
+        # Serie diaria: un item VENTAS# por día con ventas
+        ventas = {
+            item['dia']: item
+            for item in repositorio.consultar_agregados(tenant_id, clave_ventas_dia(desde), clave_ventas_dia(hasta))
+        }
+        serie = []
+        total = {'compras': 0, 'unidades': Decimal('0'), 'monto': Decimal('0')}
+        for i in range((hasta - desde).days + 1):
+            dia = (desde + timedelta(days=i)).isoformat()
+            item = ventas.get(dia, {})
+            punto = {
+                'dia': dia,
+                'compras': int(item.get('compras', 0)),
+                'unidades': item.get('unidades', Decimal('0')),
+                'monto': item.get('monto', Decimal('0'))
             }
+            serie.append(punto)
+            for campo in total:
+                total[campo] += punto[campo]
+        
+        # Productos: items PRODUCTO#{dia}#{codigo} del rango (el día siguiente
+        # con código vacío acota el último día sin incluir otros)
+        productos = {}
+        for item in repositorio.consultar_agregados(tenant_id, clave_producto_dia(desde, ''),
+                                                    clave_producto_dia(hasta + timedelta(days=1), '')):
+            acumulado = productos.setdefault(item['codigo'], {
+                'codigo': item['codigo'],
+                'nombre': item.get('nombre', ''),
+                'unidades': Decimal('0'),
+                'monto': Decimal('0')
+            })
+            acumulado['unidades'] += item.get('unidades', Decimal('0'))
+            acumulado['monto'] += item.get('monto', Decimal('0'))
+        metricas.contar('items', len(ventas) + len(productos))
+        
+        ranking = sorted(
+            (p for p in productos.values() if p['unidades'] > 0 or p['monto'] > 0),
+            key=lambda p: (-p[orden], p['codigo'])
         )
         
-        compras = response.get('Items', [])
+        return lambda_response(200, {
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'orden': orden,
+            'productos': ranking[:top],
+            'serie': serie,
+            'total': total
+        }, event)
         
-        if not compras:
+    except ValueError as e:
+        return lambda_response(400, {
+            'error': 'Parámetros inválidos',
+            'message': str(e)
+        })
+    except Exception as e:
+        print(f"Error en top_productos: {str(e)}")
+        return lambda_response(500, {'error': 'Error interno del servidor'})
+
+@metricas.instrumentado
+def obtener_estadisticas_compras(event, context):
+    """Función para obtener estadísticas de compras del usuario"""
+    try:
+        # Validar token y extraer usuario
+        usuario, error = extract_user_from_token(event)
+        if error:
+            return lambda_response(401, {'error': error})
+        
+        # En DynamoDB, item agregado mantenido por el consumidor del stream
+        estadisticas = repositorio.estadisticas_usuario(usuario['tenant_id'], usuario['email'])
+        
+        if not estadisticas or not estadisticas.get('total_compras'):
             return lambda_response(200, {
                 'total_compras': 0,
                 'total_gastado': 0,
@@ -361,24 +1097,17 @@ def obtener_estadisticas_compras(event, context):
                 'ultima_compra': None
             })
         
-        # Calcular estadísticas
-        total_compras = len(compras)
-        total_gastado = sum(float(compra.get('total_monto', 0)) for compra in compras)
-        total_productos = sum(compra.get('total_productos', 0) for compra in compras)
-        promedio_por_compra = total_gastado / total_compras if total_compras > 0 else 0
-        
-        # Ordenar por fecha para obtener primera y última compra
-        compras_ordenadas = sorted(compras, key=lambda x: x.get('fecha_compra', ''))
-        primera_compra = compras_ordenadas[0].get('fecha_compra') if compras_ordenadas else None
-        ultima_compra = compras_ordenadas[-1].get('fecha_compra') if compras_ordenadas else None
+        total_compras = int(estadisticas['total_compras'])
+        total_gastado = estadisticas.get('total_gastado', Decimal('0'))
+        promedio_por_compra = total_gastado / total_compras
         
         return lambda_response(200, {
             'total_compras': total_compras,
-            'total_gastado': round(total_gastado, 2),
-            'total_productos_comprados': total_productos,
-            'promedio_por_compra': round(promedio_por_compra, 2),
-            'primera_compra': primera_compra,
-            'ultima_compra': ultima_compra
+            'total_gastado': round(float(total_gastado), 2),
+            'total_productos_comprados': int(estadisticas.get('total_productos_comprados', 0)),
+            'promedio_por_compra': round(float(promedio_por_compra), 2),
+            'primera_compra': estadisticas.get('primera_compra'),
+            'ultima_compra': estadisticas.get('ultima_compra')
         })
         
     except Exception as e:
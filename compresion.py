@@ -0,0 +1,68 @@
+import base64
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respuestas comprimidas (requiere binaryMediaTypes en API Gateway)
+COMPRESION_HABILITADA = os.environ.get('COMPRESION_HABILITADA', 'false').lower() == 'true'
+
+# Por debajo de este tamaño la compresión no compensa el costo de CPU
+COMPRESION_UMBRAL_BYTES = int(os.environ.get('COMPRESION_UMBRAL_BYTES', '1024'))
+
+# Niveles para contenido dinámico: buena relación sin el costo de los máximos
+GZIP_NIVEL = 6
+BROTLI_CALIDAD = 5
+
+def obtener_header(headers, nombre):
+    """Busca un header sin distinguir mayúsculas/minúsculas"""
+    if not headers:
+        return None
+    valor = headers.get(nombre)
+    if valor is None:
+        nombre = nombre.lower()
+        for clave, v in headers.items():
+            if clave.lower() == nombre:
+                return v
+    return valor
+
+def codificaciones_aceptadas(headers):
+    """Codificaciones de Accept-Encoding con q > 0"""
+    aceptadas = set()
+    for parte in (obtener_header(headers, 'Accept-Encoding') or '').split(','):
+        nombre, _, parametros = parte.partition(';')
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        parametros = parametros.strip().lower()
+        if parametros.startswith('q='):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            aceptadas.add(nombre)
+    return aceptadas
+
+def elegir_codificacion(headers):
+    """br si el cliente lo acepta y brotli está instalado; si no gzip; None sin compresión"""
+    aceptadas = codificaciones_aceptadas(headers)
+    if brotli is not None and 'br' in aceptadas:
+        return 'br'
+    if 'gzip' in aceptadas or '*' in aceptadas:
+        return 'gzip'
+    return None
+
+def comprimir(datos, codificacion):
+    """Comprime bytes con la codificación indicada"""
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=BROTLI_CALIDAD)
+    return gzip.compress(datos, compresslevel=GZIP_NIVEL, mtime=0)
+
+def cuerpo_base64(datos):
+    """Cuerpo binario para lambda-proxy (isBase64Encoded)"""
+    return base64.b64encode(datos).decode('ascii')
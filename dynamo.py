@@ -0,0 +1,247 @@
+import math
+import os
+import random
+import threading
+import time
+from decimal import Decimal
+
+import metricas
+
+# El cliente de bajo nivel se crea en la primera llamada y se reutiliza en el
+# contenedor; boto3 no se importa al cargar los handlers y no se carga el
+# modelo de recursos (boto3.resource)
+_cliente = None
+_lock = threading.Lock()
+
+# Conexiones HTTP del cliente; el default de botocore (10) alcanza en Lambda,
+# donde cada contenedor atiende una invocación a la vez (ver servidor.py)
+MAX_CONEXIONES = int(os.environ.get('DYNAMO_MAX_CONEXIONES', '10'))
+
+# BatchWriteItem admite hasta 25 solicitudes por llamada y BatchGetItem hasta 100 claves
+BATCH_WRITE_MAX = 25
+BATCH_GET_MAX = 100
+BATCH_MAX_REINTENTOS = 8
+BATCH_BACKOFF_BASE = 0.05
+BATCH_BACKOFF_MAX = 2.0
+
+def obtener_cliente():
+    """Cliente DynamoDB de bajo nivel, creado una sola vez por contenedor"""
+    global _cliente
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                import boto3
+                from botocore.config import Config
+                _cliente = boto3.client('dynamodb', config=Config(max_pool_connections=MAX_CONEXIONES))
+    return _cliente
+
+def codigo_error(error):
+    """Código de error de DynamoDB (ClientError) o None"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+def serializar(valor):
+    """Convierte un valor Python al formato tipado de DynamoDB"""
+    if valor is None:
+        return {'NULL': True}
+    if isinstance(valor, bool):
+        return {'BOOL': valor}
+    if isinstance(valor, str):
+        return {'S': valor}
+    if isinstance(valor, (int, Decimal)):
+        return {'N': str(valor)}
+    if isinstance(valor, (bytes, bytearray)):
+        return {'B': bytes(valor)}
+    if isinstance(valor, dict):
+        return {'M': {k: serializar(v) for k, v in valor.items()}}
+    if isinstance(valor, (list, tuple)):
+        return {'L': [serializar(v) for v in valor]}
+    if isinstance(valor, float):
+        raise TypeError('Float no soportado por DynamoDB; use Decimal')
+    raise TypeError(f'Tipo no soportado por DynamoDB: {type(valor).__name__}')
+
+def deserializar(tipado):
+    """Convierte un valor tipado de DynamoDB a Python (números como Decimal)"""
+    tipo, valor = next(iter(tipado.items()))
+    if tipo == 'S':
+        return valor
+    if tipo == 'N':
+        return Decimal(valor)
+    if tipo == 'M':
+        return {k: deserializar(v) for k, v in valor.items()}
+    if tipo == 'L':
+        return [deserializar(v) for v in valor]
+    if tipo == 'BOOL':
+        return valor
+    if tipo == 'NULL':
+        return None
+    if tipo == 'B':
+        return valor
+    if tipo == 'SS':
+        return set(valor)
+    if tipo == 'NS':
+        return {Decimal(v) for v in valor}
+    if tipo == 'BS':
+        return set(valor)
+    raise TypeError(f'Tipo DynamoDB desconocido: {tipo}')
+
+def serializar_item(item):
+    """Serializa un item (dict de atributos)"""
+    return {k: serializar(v) for k, v in item.items()}
+
+def deserializar_item(item):
+    """Deserializa un item (dict de atributos tipados)"""
+    if item is None:
+        return None
+    return {k: deserializar(v) for k, v in item.items()}
+
+def tamano_numero(valor):
+    """Bytes de un número en DynamoDB: ~1 por cada dos dígitos significativos, más 1"""
+    digitos = len(Decimal(valor).normalize().as_tuple().digits)
+    return 1 + math.ceil(digitos / 2)
+
+def tamano_valor(valor):
+    """Bytes de un valor según las reglas de tamaño de item de DynamoDB"""
+    if valor is None or isinstance(valor, bool):
+        return 1
+    if isinstance(valor, str):
+        return len(valor.encode('utf-8'))
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, (int, Decimal)):
+        return tamano_numero(valor)
+    if isinstance(valor, dict):
+        return 3 + sum(len(k.encode('utf-8')) + tamano_valor(v) + 1 for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return 3 + sum(tamano_valor(v) + 1 for v in valor)
+    raise TypeError(f'Tipo no soportado: {type(valor).__name__}')
+
+def tamano_item(item):
+    """Bytes de un item (nombres de atributo más valores), base de las RCU/WCU cobradas"""
+    return sum(len(nombre.encode('utf-8')) + tamano_valor(valor) for nombre, valor in item.items())
+
+# Parámetros de entrada y campos de respuesta que llevan items/keys tipados
+_PARAMETROS_ITEM = ('Item', 'Key', 'ExclusiveStartKey', 'ExpressionAttributeValues')
+_RESPUESTA_ITEM = ('Item', 'Attributes', 'LastEvaluatedKey')
+
+class Tabla:
+    """Tabla DynamoDB sobre el cliente de bajo nivel, con la interfaz de boto3 Table"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def _llamar(self, operacion, kwargs):
+        for parametro in _PARAMETROS_ITEM:
+            if parametro in kwargs:
+                kwargs[parametro] = serializar_item(kwargs[parametro])
+        kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        with metricas.fase('dynamodb'):
+            response = getattr(obtener_cliente(), operacion)(TableName=self.nombre, **kwargs)
+        metricas.registrar_capacidad(response)
+        for campo in _RESPUESTA_ITEM:
+            if campo in response:
+                response[campo] = deserializar_item(response[campo])
+        if 'Items' in response:
+            response['Items'] = [deserializar_item(item) for item in response['Items']]
+        return response
+
+    def put_item(self, **kwargs):
+        return self._llamar('put_item', kwargs)
+
+    def get_item(self, **kwargs):
+        return self._llamar('get_item', kwargs)
+
+    def update_item(self, **kwargs):
+        return self._llamar('update_item', kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._llamar('delete_item', kwargs)
+
+    def query(self, **kwargs):
+        return self._llamar('query', kwargs)
+
+    def scan(self, **kwargs):
+        return self._llamar('scan', kwargs)
+
+    def _llamar_lote(self, operacion, pendientes, campo_pendientes, context, al_responder=None):
+        """
+        Llama a una operación batch con las solicitudes pendientes (tipadas) de
+        la tabla y reintenta las que vuelven en `campo_pendientes` con backoff
+        exponencial y full jitter. Devuelve las que quedan sin procesar.
+        """
+        for intento in range(BATCH_MAX_REINTENTOS):
+            with metricas.fase('dynamodb'):
+                response = getattr(obtener_cliente(), operacion)(
+                    RequestItems={self.nombre: pendientes},
+                    ReturnConsumedCapacity='TOTAL'
+                )
+            metricas.registrar_capacidad(response)
+            if al_responder:
+                al_responder(response)
+            pendientes = response.get(campo_pendientes, {}).get(self.nombre)
+            if not pendientes:
+                return pendientes
+
+            # No se reintenta si no queda tiempo en la invocación
+            espera = random.uniform(0, min(BATCH_BACKOFF_MAX, BATCH_BACKOFF_BASE * (2 ** intento)))
+            if context and context.get_remaining_time_in_millis() < (espera + 1) * 1000:
+                break
+            time.sleep(espera)
+        return pendientes
+
+    def batch_write(self, solicitudes, context=None):
+        """
+        Ejecuta solicitudes PutRequest/DeleteRequest (en formato Python) en
+        bloques de 25, reintentando los UnprocessedItems con backoff
+        exponencial y jitter. Devuelve las solicitudes que no se procesaron.
+        """
+        no_procesadas = []
+
+        for inicio in range(0, len(solicitudes), BATCH_WRITE_MAX):
+            bloque = [serializar_solicitud(solicitud) for solicitud in solicitudes[inicio:inicio + BATCH_WRITE_MAX]]
+            pendientes = self._llamar_lote('batch_write_item', bloque, 'UnprocessedItems', context)
+            if pendientes:
+                no_procesadas.extend(deserializar_solicitud(p) for p in pendientes)
+
+        return no_procesadas
+
+    def batch_get(self, claves, context=None, **opciones):
+        """
+        Lee claves (en formato Python) con BatchGetItem en bloques de 100,
+        reintentando las UnprocessedKeys con el mismo backoff que batch_write.
+        Las opciones (ConsistentRead, ProjectionExpression,
+        ExpressionAttributeNames) se aplican a cada bloque. Devuelve los items
+        encontrados (sin orden garantizado) y las claves que no se procesaron.
+        """
+        items = []
+        no_procesadas = []
+
+        for inicio in range(0, len(claves), BATCH_GET_MAX):
+            bloque = {
+                'Keys': [serializar_item(clave) for clave in claves[inicio:inicio + BATCH_GET_MAX]],
+                **opciones
+            }
+            pendientes = self._llamar_lote(
+                'batch_get_item', bloque, 'UnprocessedKeys', context,
+                lambda response: items.extend(
+                    deserializar_item(item) for item in response.get('Responses', {}).get(self.nombre, [])
+                )
+            )
+            if pendientes:
+                no_procesadas.extend(deserializar_item(clave) for clave in pendientes['Keys'])
+
+        return items, no_procesadas
+
+def serializar_solicitud(solicitud):
+    """Serializa una solicitud de BatchWriteItem"""
+    if 'PutRequest' in solicitud:
+        return {'PutRequest': {'Item': serializar_item(solicitud['PutRequest']['Item'])}}
+    return {'DeleteRequest': {'Key': serializar_item(solicitud['DeleteRequest']['Key'])}}
+
+def deserializar_solicitud(solicitud):
+    """Deserializa una solicitud de BatchWriteItem"""
+    if 'PutRequest' in solicitud:
+        return {'PutRequest': {'Item': deserializar_item(solicitud['PutRequest']['Item'])}}
+    return {'DeleteRequest': {'Key': deserializar_item(solicitud['DeleteRequest']['Key'])}}
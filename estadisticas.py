@@ -0,0 +1,519 @@
+import argparse
+from decimal import Decimal
+
+import compactacion
+import dynamo
+from compras import (
+    CLAVE_VERSION_COMPRAS,
+    agregados_table,
+    agregados_table_name,
+    clave_producto_dia,
+    clave_ventas_dia,
+    table
+)
+from repositorio import USUARIO_INDEX, clave_estadisticas, clave_usuario
+
+# Reintentos ante escrituras concurrentes sobre el mismo marcador
+MAX_REINTENTOS = 5
+
+# Escrituras acumuladas antes de enviarlas en la reconstrucción
+REBUILD_LOTE = 500
+
+# Productos distintos por compra en los acumulados diarios; el resto se suma
+# en OTROS. Con 45, los productos de la contribución anterior y la nueva, los
+# dos usuarios, los dos días y el marcador caben en una transacción (máx. 100)
+PRODUCTOS_ROLLUP_MAX = 45
+PRODUCTO_OTROS = 'OTROS'
+
+def clave_marcador(codigo_compra):
+    """Clave del marcador que guarda la contribución ya aplicada de una compra"""
+    return f"COMPRA#{codigo_compra}"
+
+def deserializar_imagen(imagen):
+    """Convierte una imagen de DynamoDB Streams (formato tipado) a dict Python"""
+    if not imagen:
+        return None
+    return dynamo.deserializar_item(imagen)
+
+def tipar(valores):
+    """Serializa un dict Python al formato tipado del cliente de bajo nivel"""
+    return dynamo.serializar_item(valores)
+
+def productos_de(compra):
+    """Unidades y monto por código de producto (los marcadores ya los guardan agrupados)"""
+    productos = compra.get('productos')
+    if isinstance(productos, dict):
+        return productos
+    if 'productos_z' in compra:
+        productos = compactacion.desempaquetar(compra['productos_z'])
+
+    agrupados = {}
+    for producto in productos or []:
+        if not isinstance(producto, dict) or not producto.get('codigo'):
+            continue
+        acumulado = agrupados.setdefault(str(producto['codigo']), {
+            'nombre': producto.get('nombre', ''),
+            'unidades': Decimal('0'),
+            'monto': Decimal('0')
+        })
+        acumulado['unidades'] += Decimal(str(producto.get('cantidad', 0)))
+        acumulado['monto'] += Decimal(str(producto.get('subtotal', 0)))
+
+    if len(agrupados) > PRODUCTOS_ROLLUP_MAX:
+        ordenados = sorted(agrupados.items(), key=lambda par: (-par[1]['monto'], par[0]))
+        agrupados = dict(ordenados[:PRODUCTOS_ROLLUP_MAX - 1])
+        resto = [acumulado for _, acumulado in ordenados[PRODUCTOS_ROLLUP_MAX - 1:]]
+        agrupados[PRODUCTO_OTROS] = {
+            'nombre': 'Otros productos',
+            'unidades': sum((a['unidades'] for a in resto), Decimal('0')),
+            'monto': sum((a['monto'] for a in resto), Decimal('0'))
+        }
+    return agrupados
+
+def contribucion_de(compra):
+    """Lo que una compra aporta a las estadísticas de su usuario y a los acumulados diarios"""
+    if not compra or not compra.get('email_usuario'):
+        return None
+    return {
+        'email_usuario': compra['email_usuario'],
+        'total_monto': Decimal(str(compra.get('total_monto', 0))),
+        'total_productos': Decimal(str(compra.get('total_productos', 0))),
+        'fecha_compra': compra.get('fecha_compra', ''),
+        'productos': productos_de(compra)
+    }
+
+def operacion_agregado(tenant_id, email, compras, monto, productos):
+    """Update transaccional que suma (o resta) deltas al item agregado del usuario"""
+    return {
+        'Update': {
+            'TableName': agregados_table_name,
+            'Key': tipar({'tenant_id': tenant_id, 'clave': clave_estadisticas(email)}),
+            'UpdateExpression': 'SET email_usuario = :email '
+                                'ADD total_compras :compras, total_gastado :monto, '
+                                'total_productos_comprados :productos',
+            'ExpressionAttributeValues': tipar({
+                ':email': email,
+                ':compras': compras,
+                ':monto': monto,
+                ':productos': productos
+            })
+        }
+    }
+
+def operacion_producto_dia(tenant_id, dia, codigo, unidades, monto, nombre):
+    """Update transaccional del acumulado de un producto en un día"""
+    valores = {':dia': dia, ':codigo': codigo, ':unidades': unidades, ':monto': monto}
+    asignaciones = 'SET dia = :dia, codigo = :codigo'
+    if nombre:
+        asignaciones += ', nombre = :nombre'
+        valores[':nombre'] = nombre
+    return {
+        'Update': {
+            'TableName': agregados_table_name,
+            'Key': tipar({'tenant_id': tenant_id, 'clave': clave_producto_dia(dia, codigo)}),
+            'UpdateExpression': f'{asignaciones} ADD unidades :unidades, monto :monto',
+            'ExpressionAttributeValues': tipar(valores)
+        }
+    }
+
+def operacion_ventas_dia(tenant_id, dia, compras, unidades, monto):
+    """Update transaccional del acumulado de ventas del tenant en un día"""
+    return {
+        'Update': {
+            'TableName': agregados_table_name,
+            'Key': tipar({'tenant_id': tenant_id, 'clave': clave_ventas_dia(dia)}),
+            'UpdateExpression': 'SET dia = :dia ADD compras :compras, unidades :unidades, monto :monto',
+            'ExpressionAttributeValues': tipar({
+                ':dia': dia,
+                ':compras': compras,
+                ':unidades': unidades,
+                ':monto': monto
+            })
+        }
+    }
+
+def deltas_diarios(anterior, nueva):
+    """Deltas por (día, producto) y por día entre la contribución aplicada y la nueva"""
+    productos = {}
+    dias = {}
+    for contribucion, signo in ((anterior, -1), (nueva, 1)):
+        if not contribucion or not contribucion['fecha_compra']:
+            continue
+        dia = contribucion['fecha_compra'][:10]
+
+        delta = dias.setdefault(dia, [0, Decimal('0'), Decimal('0')])
+        delta[0] += signo
+        delta[1] += signo * contribucion['total_productos']
+        delta[2] += signo * contribucion['total_monto']
+
+        for codigo, producto in contribucion.get('productos', {}).items():
+            delta = productos.setdefault((dia, codigo), [Decimal('0'), Decimal('0'), None])
+            delta[0] += signo * producto['unidades']
+            delta[1] += signo * producto['monto']
+            if signo > 0:
+                delta[2] = producto.get('nombre')
+
+    # Sin cambios netos no hace falta escribir
+    productos = {clave: d for clave, d in productos.items() if d[0] or d[1]}
+    dias = {dia: d for dia, d in dias.items() if any(d)}
+    return productos, dias
+
+def operacion_marcador(tenant_id, codigo_compra, marcador, nueva):
+    """Put/Delete del marcador condicionado a la versión leída"""
+    key = {'tenant_id': tenant_id, 'clave': clave_marcador(codigo_compra)}
+
+    if marcador:
+        condicion = {
+            'ConditionExpression': 'version = :version',
+            'ExpressionAttributeValues': tipar({':version': marcador['version']})
+        }
+        version = marcador['version'] + 1
+    else:
+        condicion = {'ConditionExpression': 'attribute_not_exists(clave)'}
+        version = 1
+
+    if nueva is None:
+        return {'Delete': {'TableName': agregados_table_name, 'Key': tipar(key), **condicion}}
+
+    item = {**key, **nueva, 'codigo_compra': codigo_compra, 'version': version}
+    return {'Put': {'TableName': agregados_table_name, 'Item': tipar(item), **condicion}}
+
+def aplicar_compra(tenant_id, codigo_compra, compra):
+    """
+    Aplica de forma idempotente el estado actual de una compra a las estadísticas.
+
+    El marcador de la compra guarda la contribución ya aplicada; el delta se
+    calcula contra él (no contra OldImage), por lo que reprocesar un registro
+    del stream no altera los totales.
+    """
+    nueva = contribucion_de(compra)
+
+    for _ in range(MAX_REINTENTOS):
+        response = agregados_table.get_item(
+            Key={'tenant_id': tenant_id, 'clave': clave_marcador(codigo_compra)},
+            ConsistentRead=True
+        )
+        marcador = response.get('Item')
+        anterior = contribucion_de(marcador)
+
+        if anterior == nueva:
+            # Reentrega de un registro cuya transacción ya se aplicó: la
+            # invocación pudo terminar antes de ajustar las fechas, y las
+            # actualizaciones condicionales son idempotentes
+            if nueva:
+                actualizar_fechas(tenant_id, nueva['email_usuario'], nueva['fecha_compra'])
+            return
+
+        # Deltas por usuario (una sola operación por item dentro de la transacción)
+        deltas = {}
+        for contribucion, signo in ((anterior, -1), (nueva, 1)):
+            if not contribucion:
+                continue
+            delta = deltas.setdefault(contribucion['email_usuario'], [0, Decimal('0'), Decimal('0')])
+            delta[0] += signo
+            delta[1] += signo * contribucion['total_monto']
+            delta[2] += signo * contribucion['total_productos']
+
+        operaciones = [operacion_marcador(tenant_id, codigo_compra, marcador, nueva)]
+        for email, (compras, monto, productos) in deltas.items():
+            operaciones.append(operacion_agregado(tenant_id, email, compras, monto, productos))
+
+        # Acumulados por día y producto en la misma transacción que el marcador
+        deltas_productos, deltas_dias = deltas_diarios(anterior, nueva)
+        for (dia, codigo), (unidades, monto, nombre) in deltas_productos.items():
+            operaciones.append(operacion_producto_dia(tenant_id, dia, codigo, unidades, monto, nombre))
+        for dia, (compras, unidades, monto) in deltas_dias.items():
+            operaciones.append(operacion_ventas_dia(tenant_id, dia, compras, unidades, monto))
+
+        try:
+            dynamo.obtener_cliente().transact_write_items(TransactItems=operaciones)
+        except Exception as e:
+            if dynamo.codigo_error(e) == 'TransactionCanceledException':
+                continue
+            raise
+
+        # Primera/última compra: min/max condicional al insertar, recálculo al quitar un extremo
+        if nueva:
+            actualizar_fechas(tenant_id, nueva['email_usuario'], nueva['fecha_compra'])
+        if anterior and (not nueva or anterior['email_usuario'] != nueva['email_usuario']
+                         or anterior['fecha_compra'] != nueva['fecha_compra']):
+            mismo_usuario = nueva and nueva['email_usuario'] == anterior['email_usuario']
+            recalcular_fechas(tenant_id, anterior['email_usuario'], codigo_compra, anterior['fecha_compra'],
+                              nueva['fecha_compra'] if mismo_usuario else None)
+        return
+
+    raise RuntimeError(f"No se pudo aplicar la compra {codigo_compra} tras {MAX_REINTENTOS} intentos")
+
+def actualizar_fechas(tenant_id, email, fecha_compra):
+    """Ajusta primera_compra/ultima_compra si la fecha las extiende"""
+    key = {'tenant_id': tenant_id, 'clave': clave_estadisticas(email)}
+    condiciones = (
+        ('primera_compra', 'attribute_not_exists(primera_compra) OR primera_compra > :fecha'),
+        ('ultima_compra', 'attribute_not_exists(ultima_compra) OR ultima_compra < :fecha')
+    )
+    for campo, condicion in condiciones:
+        try:
+            agregados_table.update_item(
+                Key=key,
+                UpdateExpression=f'SET {campo} = :fecha',
+                ConditionExpression=condicion,
+                ExpressionAttributeValues={':fecha': fecha_compra}
+            )
+        except Exception as e:
+            if dynamo.codigo_error(e) != 'ConditionalCheckFailedException':
+                raise
+
+def recalcular_fechas(tenant_id, email, codigo_compra, fecha_quitada, fecha_actual=None):
+    """
+    Recalcula los extremos desde el índice por usuario si se quitó uno de ellos.
+    El índice es eventualmente consistente y puede devolver todavía la versión
+    anterior de la compra: se la descarta y, si sigue siendo del usuario, se
+    usa su fecha actual (fecha_actual).
+    """
+    key = {'tenant_id': tenant_id, 'clave': clave_estadisticas(email)}
+    estadisticas = agregados_table.get_item(Key=key, ConsistentRead=True).get('Item') or {}
+
+    if fecha_quitada not in (estadisticas.get('primera_compra'), estadisticas.get('ultima_compra')):
+        return
+
+    extremos = {}
+    for campo, ascendente in (('primera_compra', True), ('ultima_compra', False)):
+        # Con Limit=2 queda un candidato aunque el primero sea la compra quitada
+        response = table.query(
+            IndexName=USUARIO_INDEX,
+            KeyConditionExpression='tenant_usuario = :tenant_usuario',
+            ExpressionAttributeValues={':tenant_usuario': clave_usuario(tenant_id, email)},
+            ProjectionExpression='codigo_compra, fecha_compra',
+            ScanIndexForward=ascendente,
+            Limit=2
+        )
+        fechas = [item['fecha_compra'] for item in response.get('Items', [])
+                  if item['codigo_compra'] != codigo_compra][:1]
+        if fecha_actual:
+            fechas.append(fecha_actual)
+        extremos[campo] = (min if ascendente else max)(fechas) if fechas else None
+
+    if extremos['primera_compra'] is None:
+        agregados_table.update_item(Key=key, UpdateExpression='REMOVE primera_compra, ultima_compra')
+    else:
+        agregados_table.update_item(
+            Key=key,
+            UpdateExpression='SET primera_compra = :primera, ultima_compra = :ultima',
+            ExpressionAttributeValues={
+                ':primera': extremos['primera_compra'],
+                ':ultima': extremos['ultima_compra']
+            }
+        )
+
+def invalidar_cache_compras(tenant_id):
+    """Incrementa la versión de compras del tenant: los caches de buscar_compra descartan sus entradas"""
+    agregados_table.update_item(
+        Key={'tenant_id': tenant_id, 'clave': CLAVE_VERSION_COMPRAS},
+        UpdateExpression='ADD version :uno',
+        ExpressionAttributeValues={':uno': 1}
+    )
+
+def procesar_stream(event, context):
+    """Consumidor de DynamoDB Streams que mantiene las estadísticas por usuario"""
+    procesados = 0
+    tenants_modificados = set()
+
+    for record in event.get('Records', []):
+        dynamodb_data = record.get('dynamodb', {})
+        keys = deserializar_imagen(dynamodb_data.get('Keys'))
+
+        if record.get('eventName') == 'REMOVE':
+            compra = None
+        else:
+            compra = deserializar_imagen(dynamodb_data.get('NewImage'))
+
+        aplicar_compra(keys['tenant_id'], keys['codigo_compra'], compra)
+        procesados += 1
+
+        # Las inserciones no invalidan: el cache negativo tiene TTL corto
+        if record.get('eventName') in ('MODIFY', 'REMOVE'):
+            tenants_modificados.add(keys['tenant_id'])
+
+    # Una sola actualización de versión por tenant y lote
+    for tenant_id in tenants_modificados:
+        invalidar_cache_compras(tenant_id)
+
+    print(f"Registros del stream procesados: {procesados}")
+    return {'procesados': procesados}
+
+def iterar_compras(tenant_id, email=None):
+    """Recorre (paginando) las compras de un tenant o de un usuario"""
+    if email:
+        query_kwargs = {
+            'IndexName': USUARIO_INDEX,
+            'KeyConditionExpression': 'tenant_usuario = :tenant_usuario',
+            'ExpressionAttributeValues': {':tenant_usuario': clave_usuario(tenant_id, email)}
+        }
+    else:
+        query_kwargs = {
+            'KeyConditionExpression': 'tenant_id = :tenant_id',
+            'ExpressionAttributeValues': {':tenant_id': tenant_id}
+        }
+
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def iterar_marcadores(tenant_id):
+    """Recorre los marcadores de compras aplicadas de un tenant"""
+    query_kwargs = {
+        'KeyConditionExpression': 'tenant_id = :tenant_id AND begins_with(clave, :prefijo)',
+        'ExpressionAttributeValues': {':tenant_id': tenant_id, ':prefijo': clave_marcador('')}
+    }
+    while True:
+        response = agregados_table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def iterar_acumulados_diarios(tenant_id):
+    """Recorre los acumulados por día (PRODUCTO# y VENTAS#) de un tenant"""
+    for prefijo in ('PRODUCTO#', 'VENTAS#'):
+        query_kwargs = {
+            'KeyConditionExpression': 'tenant_id = :tenant_id AND begins_with(clave, :prefijo)',
+            'ExpressionAttributeValues': {':tenant_id': tenant_id, ':prefijo': prefijo},
+            'ProjectionExpression': 'clave'
+        }
+        while True:
+            response = agregados_table.query(**query_kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def reconstruir_estadisticas(tenant_id, email=None):
+    """
+    Recalcula desde cero agregados y marcadores de un tenant (o de un usuario).
+    Los acumulados por día y producto son del tenant: solo se reconstruyen sin
+    email; al reconstruir un usuario sus marcadores conservan la contribución
+    a productos ya aplicada, para no descuadrar esos acumulados.
+    """
+    agregados = {}
+    diarios = {}
+    codigos = set()
+    solicitudes = []
+
+    def encolar(solicitud, forzar=False):
+        if solicitud:
+            solicitudes.append(solicitud)
+        if solicitudes and (forzar or len(solicitudes) >= REBUILD_LOTE):
+            no_procesadas = agregados_table.batch_write(solicitudes)
+            if no_procesadas:
+                raise RuntimeError(f"{len(no_procesadas)} escrituras no procesadas durante la reconstrucción")
+            solicitudes.clear()
+
+    marcadores = {
+        marcador.get('codigo_compra'): marcador
+        for marcador in iterar_marcadores(tenant_id)
+        if not email or marcador.get('email_usuario') == email
+    }
+
+    for compra in iterar_compras(tenant_id, email):
+        contribucion = contribucion_de(compra)
+        if not contribucion:
+            continue
+        codigos.add(compra['codigo_compra'])
+
+        if email:
+            previo = marcadores.get(compra['codigo_compra'])
+            contribucion['productos'] = productos_de(previo) if previo else {}
+        else:
+            deltas_productos, deltas_dias = deltas_diarios(None, contribucion)
+            for (dia, codigo), (unidades, monto, nombre) in deltas_productos.items():
+                acumulado = diarios.setdefault(clave_producto_dia(dia, codigo), {
+                    'tenant_id': tenant_id,
+                    'clave': clave_producto_dia(dia, codigo),
+                    'dia': dia,
+                    'codigo': codigo,
+                    'nombre': nombre,
+                    'unidades': Decimal('0'),
+                    'monto': Decimal('0')
+                })
+                acumulado['unidades'] += unidades
+                acumulado['monto'] += monto
+            for dia, (compras, unidades, monto) in deltas_dias.items():
+                acumulado = diarios.setdefault(clave_ventas_dia(dia), {
+                    'tenant_id': tenant_id,
+                    'clave': clave_ventas_dia(dia),
+                    'dia': dia,
+                    'compras': 0,
+                    'unidades': Decimal('0'),
+                    'monto': Decimal('0')
+                })
+                acumulado['compras'] += compras
+                acumulado['unidades'] += unidades
+                acumulado['monto'] += monto
+
+        encolar({'PutRequest': {'Item': {
+            'tenant_id': tenant_id,
+            'clave': clave_marcador(compra['codigo_compra']),
+            'codigo_compra': compra['codigo_compra'],
+            'version': 1,
+            **contribucion
+        }}})
+
+        agregado = agregados.setdefault(contribucion['email_usuario'], {
+            'tenant_id': tenant_id,
+            'clave': clave_estadisticas(contribucion['email_usuario']),
+            'email_usuario': contribucion['email_usuario'],
+            'total_compras': 0,
+            'total_gastado': Decimal('0'),
+            'total_productos_comprados': Decimal('0'),
+            'primera_compra': contribucion['fecha_compra'],
+            'ultima_compra': contribucion['fecha_compra']
+        })
+        agregado['total_compras'] += 1
+        agregado['total_gastado'] += contribucion['total_monto']
+        agregado['total_productos_comprados'] += contribucion['total_productos']
+        agregado['primera_compra'] = min(agregado['primera_compra'], contribucion['fecha_compra'])
+        agregado['ultima_compra'] = max(agregado['ultima_compra'], contribucion['fecha_compra'])
+
+    for agregado in agregados.values():
+        encolar({'PutRequest': {'Item': agregado}})
+
+    # Acumulados diarios: se reescriben y se borran los que ya no tienen compras
+    if not email:
+        for acumulado in diarios.values():
+            encolar({'PutRequest': {'Item': acumulado}})
+        for acumulado in iterar_acumulados_diarios(tenant_id):
+            if acumulado['clave'] not in diarios:
+                encolar({'DeleteRequest': {'Key': {'tenant_id': tenant_id, 'clave': acumulado['clave']}}})
+
+    # Marcadores de compras que ya no existen
+    for codigo_compra, marcador in marcadores.items():
+        if codigo_compra not in codigos:
+            encolar({'DeleteRequest': {'Key': {'tenant_id': tenant_id, 'clave': marcador['clave']}}})
+
+    # Usuarios que ya no tienen compras
+    if email and email not in agregados:
+        encolar({'DeleteRequest': {'Key': {'tenant_id': tenant_id, 'clave': clave_estadisticas(email)}}})
+
+    encolar(None, forzar=True)
+    return {'usuarios': len(agregados), 'compras': len(codigos), 'acumulados_diarios': len(diarios)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Estadísticas de compras por usuario')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    reconstruir = subparsers.add_parser('reconstruir', help='Backfill de agregados y marcadores')
+    reconstruir.add_argument('--tenant', required=True, help='tenant_id a reconstruir')
+    reconstruir.add_argument('--email', help='Reconstruir solo este usuario')
+
+    args = parser.parse_args()
+
+    if args.comando == 'reconstruir':
+        resultado = reconstruir_estadisticas(args.tenant, args.email)
+        print(f"Reconstruidas estadísticas de {resultado['usuarios']} usuarios "
+              f"({resultado['compras']} compras) en {args.tenant}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import codigos
+import compactacion
+from compras import DecimalEncoder, table
+from repositorio import ATRIBUTOS_INTERNOS, USUARIO_INDEX, clave_usuario
+
+# Bytes acumulados antes de escribir un bloque (S3 exige partes de al menos 5 MiB)
+CHUNK_BYTES = 8 * 1024 * 1024
+S3_PARTE_MINIMA = 5 * 1024 * 1024
+
+# Items por página de Query; la memoria queda acotada por página + bloque
+PAGINA = 1000
+
+def clave_reanudacion(item, email=None):
+    """ExclusiveStartKey para continuar justo después de un item (tabla o índice por usuario)"""
+    clave = {'tenant_id': item['tenant_id'], 'codigo_compra': item['codigo_compra']}
+    if email:
+        clave['tenant_usuario'] = item['tenant_usuario']
+        clave['fecha_compra'] = item['fecha_compra']
+    return clave
+
+def iterar_compras(tenant_id, email=None, desde=None, hasta=None, start_key=None):
+    """Recorre perezosamente (página a página) las compras de un tenant o de un usuario"""
+    if email:
+        key_condition = 'tenant_usuario = :tenant_usuario'
+        valores = {':tenant_usuario': clave_usuario(tenant_id, email)}
+        if desde and hasta:
+            key_condition += ' AND fecha_compra BETWEEN :desde AND :hasta'
+            valores.update({':desde': desde, ':hasta': hasta})
+        elif desde:
+            key_condition += ' AND fecha_compra >= :desde'
+            valores[':desde'] = desde
+        elif hasta:
+            key_condition += ' AND fecha_compra <= :hasta'
+            valores[':hasta'] = hasta
+        consultas = [({'IndexName': USUARIO_INDEX}, key_condition, valores)]
+    elif desde or hasta:
+        # codigo_compra se ordena por fecha de creación: el rango de fechas se
+        # resuelve con rangos de códigos (formato anterior y ordenado) en la
+        # condición de clave de la tabla
+        consultas = []
+        for inicio, fin in codigos.rangos_codigos(desde, hasta):
+            # Al reanudar se omiten los rangos ya exportados
+            if start_key and start_key['codigo_compra'] > fin:
+                continue
+            consultas.append(({}, 'tenant_id = :tenant_id AND codigo_compra BETWEEN :inicio AND :fin',
+                              {':tenant_id': tenant_id, ':inicio': inicio, ':fin': fin}))
+    else:
+        consultas = [({}, 'tenant_id = :tenant_id', {':tenant_id': tenant_id})]
+
+    for query_kwargs, key_condition, valores in consultas:
+        query_kwargs.update({
+            'KeyConditionExpression': key_condition,
+            'ExpressionAttributeValues': valores,
+            'Limit': PAGINA
+        })
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+            start_key = None
+
+        while True:
+            response = table.query(**query_kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+class SumideroArchivo:
+    """Archivo NDJSON local; al reanudar se descarta lo escrito después del checkpoint"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.bytes = 0
+        self._archivo = None
+
+    def abrir(self, estado=None):
+        if estado:
+            self._archivo = open(self.ruta, 'r+b')
+            self._archivo.truncate(estado['bytes'])
+            self._archivo.seek(estado['bytes'])
+            self.bytes = estado['bytes']
+        else:
+            self._archivo = open(self.ruta, 'wb')
+
+    def escribir(self, bloque):
+        self._archivo.write(bloque)
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self.bytes += len(bloque)
+
+    def estado(self):
+        return {'bytes': self.bytes}
+
+    def cerrar(self):
+        self._archivo.close()
+
+class SumideroS3:
+    """Objeto en S3 (o compatible, con endpoint_url) escrito con multipart upload; cada bloque es una parte"""
+
+    def __init__(self, bucket, clave, endpoint_url=None):
+        self.bucket = bucket
+        self.clave = clave
+        self.endpoint_url = endpoint_url
+        self.bytes = 0
+        self.upload_id = None
+        self.partes = []
+        self._cliente = None
+
+    def abrir(self, estado=None):
+        import boto3
+        self._cliente = boto3.client('s3', endpoint_url=self.endpoint_url)
+        if estado:
+            self.upload_id = estado['upload_id']
+            self.partes = estado['partes']
+            self.bytes = estado['bytes']
+        else:
+            response = self._cliente.create_multipart_upload(
+                Bucket=self.bucket, Key=self.clave, ContentType='application/x-ndjson'
+            )
+            self.upload_id = response['UploadId']
+
+    def escribir(self, bloque):
+        numero = len(self.partes) + 1
+        response = self._cliente.upload_part(
+            Bucket=self.bucket, Key=self.clave, UploadId=self.upload_id,
+            PartNumber=numero, Body=bloque
+        )
+        self.partes.append({'PartNumber': numero, 'ETag': response['ETag']})
+        self.bytes += len(bloque)
+
+    def estado(self):
+        return {'upload_id': self.upload_id, 'partes': self.partes, 'bytes': self.bytes}
+
+    def cerrar(self):
+        if not self.partes:
+            # Exportación vacía: multipart no admite cero partes
+            self._cliente.abort_multipart_upload(Bucket=self.bucket, Key=self.clave, UploadId=self.upload_id)
+            self._cliente.put_object(Bucket=self.bucket, Key=self.clave, Body=b'',
+                                     ContentType='application/x-ndjson')
+            return
+        self._cliente.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.clave, UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.partes}
+        )
+
+def leer_checkpoint(ruta):
+    """Checkpoint guardado por una exportación anterior, o None"""
+    if not ruta or not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_checkpoint(ruta, checkpoint):
+    """Escribe el checkpoint de forma atómica (archivo temporal + rename)"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, cls=DecimalEncoder, montos_exactos=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+def exportar(tenant_id, sumidero, email=None, desde=None, hasta=None, ruta_checkpoint=None,
+             chunk_bytes=CHUNK_BYTES, montos_exactos=True):
+    """
+    Exporta las compras como NDJSON en bloques de chunk_bytes. Tras cada
+    bloque escrito se guarda un checkpoint con la clave del último item, desde
+    el que una nueva ejecución continúa sin duplicar ni perder líneas.
+    """
+    # Un checkpoint solo sirve para reanudar la misma consulta (tenant, usuario y rango de fechas)
+    parametros = {
+        'tenant_id': tenant_id,
+        'email': email,
+        'desde': desde.isoformat() if isinstance(desde, datetime) else desde,
+        'hasta': hasta.isoformat() if isinstance(hasta, datetime) else hasta
+    }
+    checkpoint = leer_checkpoint(ruta_checkpoint)
+    if checkpoint and {campo: checkpoint.get(campo) for campo in parametros} != parametros:
+        raise ValueError('El checkpoint corresponde a otra exportación')
+
+    sumidero.abrir(checkpoint['sumidero'] if checkpoint else None)
+    exportadas = checkpoint['exportadas'] if checkpoint else 0
+    start_key = checkpoint['start_key'] if checkpoint else None
+
+    encoder = DecimalEncoder(ensure_ascii=False, separators=(',', ':'), montos_exactos=montos_exactos)
+    bloque = bytearray()
+    ultimo = None
+
+    def escribir_bloque():
+        sumidero.escribir(bytes(bloque))
+        bloque.clear()
+        if ruta_checkpoint:
+            guardar_checkpoint(ruta_checkpoint, {
+                **parametros,
+                'start_key': clave_reanudacion(ultimo, email),
+                'exportadas': exportadas,
+                'sumidero': sumidero.estado()
+            })
+
+    for item in iterar_compras(tenant_id, email, desde, hasta, start_key):
+        linea = {k: v for k, v in compactacion.expandir(item).items() if k not in ATRIBUTOS_INTERNOS}
+        bloque += encoder.encode(linea).encode('utf-8')
+        bloque += b'\n'
+        exportadas += 1
+        ultimo = item
+        if len(bloque) >= chunk_bytes:
+            escribir_bloque()
+
+    if bloque:
+        escribir_bloque()
+    sumidero.cerrar()
+
+    # Exportación completa: el checkpoint ya no sirve
+    if ruta_checkpoint and os.path.exists(ruta_checkpoint):
+        os.remove(ruta_checkpoint)
+
+    return {'exportadas': exportadas, 'bytes': sumidero.bytes}
+
+def main():
+    parser = argparse.ArgumentParser(description='Exportación NDJSON de compras de un tenant o usuario')
+    parser.add_argument('--tenant', required=True, help='tenant_id a exportar')
+    parser.add_argument('--email', help='Exportar solo este usuario (índice por usuario)')
+    parser.add_argument('--desde', help='Fecha ISO mínima')
+    parser.add_argument('--hasta', help='Fecha ISO máxima')
+    parser.add_argument('--salida', help='Archivo NDJSON local')
+    parser.add_argument('--s3', help='Destino s3://bucket/clave')
+    parser.add_argument('--endpoint-url', help='Endpoint S3 compatible (MinIO, LocalStack)')
+    parser.add_argument('--checkpoint', help='Archivo de checkpoint para reanudar')
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // (1024 * 1024), help='Tamaño de bloque en MiB')
+    parser.add_argument('--montos-float', action='store_true',
+                        help='Montos como float en lugar de string decimal exacto')
+    args = parser.parse_args()
+
+    if bool(args.salida) == bool(args.s3):
+        parser.error('Indique exactamente un destino: --salida o --s3')
+
+    chunk_bytes = args.chunk_mb * 1024 * 1024
+    if args.s3:
+        if not args.s3.startswith('s3://') or '/' not in args.s3[5:]:
+            parser.error('--s3 debe tener la forma s3://bucket/clave')
+        if chunk_bytes < S3_PARTE_MINIMA:
+            parser.error('S3 exige bloques de al menos 5 MiB')
+        bucket, clave = args.s3[5:].split('/', 1)
+        sumidero = SumideroS3(bucket, clave, args.endpoint_url)
+    else:
+        sumidero = SumideroArchivo(args.salida)
+
+    resultado = exportar(args.tenant, sumidero, args.email, args.desde, args.hasta, args.checkpoint,
+                         chunk_bytes, not args.montos_float)
+    print(f"Exportadas {resultado['exportadas']} compras ({resultado['bytes']} bytes)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import math
+import statistics
+
+import compactacion
+from compras import table
+from dynamo import tamano_item
+
+# Compras por página de listar_compras para estimar el costo de lectura
+PAGINA_LISTAR = 10
+
+def wcu(tamano):
+    """WCU de escribir un item en la tabla y en el índice por usuario (proyección ALL)"""
+    return 2 * math.ceil(tamano / 1024)
+
+def rcu_pagina(tamanos):
+    """RCU (lectura eventual) de una página de Query: la suma de tamaños se redondea a 4 KB"""
+    return math.ceil(sum(tamanos) / 4096) / 2
+
+def muestrear(tenant_id=None, muestra=1000):
+    """Items de compra reales: las de un tenant (Query) o de toda la tabla (Scan)"""
+    if tenant_id:
+        kwargs = {'KeyConditionExpression': 'tenant_id = :tenant_id',
+                  'ExpressionAttributeValues': {':tenant_id': tenant_id}}
+        operacion = table.query
+    else:
+        kwargs = {}
+        operacion = table.scan
+
+    items = []
+    while len(items) < muestra:
+        kwargs['Limit'] = muestra - len(items)
+        response = operacion(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items
+
+def resumen(tamanos):
+    """Media, p50, p99 y máximo de una lista de tamaños"""
+    ordenados = sorted(tamanos)
+    return {
+        'media': round(statistics.fmean(ordenados), 1),
+        'p50': ordenados[len(ordenados) // 2],
+        'p99': ordenados[min(len(ordenados) - 1, math.ceil(len(ordenados) * 0.99) - 1)],
+        'maximo': ordenados[-1]
+    }
+
+def medir(items):
+    """Compara tamaño y capacidad de cada item con productos como lista de maps y en productos_z"""
+    legado = []
+    compacto = []
+    for item in items:
+        expandido = compactacion.expandir(item)
+        legado.append(tamano_item(expandido))
+        compacto.append(tamano_item(compactacion.compactar(expandido)))
+
+    paginas = range(0, len(items), PAGINA_LISTAR)
+    wcu_legado = sum(wcu(t) for t in legado)
+    wcu_compacto = sum(wcu(t) for t in compacto)
+    rcu_legado = sum(rcu_pagina(legado[i:i + PAGINA_LISTAR]) for i in paginas)
+    rcu_compacto = sum(rcu_pagina(compacto[i:i + PAGINA_LISTAR]) for i in paginas)
+
+    return {
+        'items': len(items),
+        'bytes_legado': resumen(legado),
+        'bytes_compacto': resumen(compacto),
+        'ahorro_bytes': round(1 - sum(compacto) / sum(legado), 3),
+        'wcu_por_compra_legado': round(wcu_legado / len(items), 2),
+        'wcu_por_compra_compacto': round(wcu_compacto / len(items), 2),
+        'ahorro_wcu': round(1 - wcu_compacto / wcu_legado, 3),
+        f'rcu_por_pagina_{PAGINA_LISTAR}_legado': round(rcu_legado / len(paginas), 2),
+        f'rcu_por_pagina_{PAGINA_LISTAR}_compacto': round(rcu_compacto / len(paginas), 2),
+        'ahorro_rcu': round(1 - rcu_compacto / rcu_legado, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Ahorro de tamaño y capacidad de productos_z sobre compras reales')
+    parser.add_argument('--tenant', help='Muestrear solo este tenant_id (Query en lugar de Scan)')
+    parser.add_argument('--muestra', type=int, default=1000, help='Compras a leer')
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    items = muestrear(args.tenant, args.muestra)
+    if not items:
+        parser.error('No se encontraron compras')
+
+    texto = json.dumps(medir(items), indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+
+# Una línea en Embedded Metric Format (EMF) por invocación; CloudWatch la
+# convierte en métricas sin llamadas a PutMetricData
+NAMESPACE = os.environ.get('METRICAS_NAMESPACE', 'ApiCompras')
+METRICAS_HABILITADAS = os.environ.get('METRICAS_HABILITADAS', 'true').lower() == 'true'
+
+# Volcados de depuración: siempre con LOG_LEVEL=DEBUG, o en una muestra de invocaciones
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+DEBUG_MUESTREO = float(os.environ.get('DEBUG_MUESTREO', '0'))
+
+_medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+class Medicion:
+    """Tiempos por fase, contadores y capacidad consumida de una invocación"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.inicio = time.perf_counter()
+        self.fases = {}
+        self.contadores = {}
+        self.capacidad = 0.0
+        self.debug = LOG_LEVEL == 'DEBUG' or (DEBUG_MUESTREO > 0 and random.random() < DEBUG_MUESTREO)
+
+    @contextmanager
+    def fase(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases[nombre] = self.fases.get(nombre, 0.0) + (time.perf_counter() - inicio) * 1000
+
+    def contar(self, nombre, valor=1):
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + valor
+
+    def fijar(self, nombre, valor):
+        self.contadores[nombre] = valor
+
+    def registrar_capacidad(self, response):
+        consumida = response.get('ConsumedCapacity') if isinstance(response, dict) else None
+        if isinstance(consumida, dict):
+            consumida = [consumida]
+        for entrada in consumida or []:
+            self.capacidad += entrada.get('CapacityUnits', 0)
+
+    def documento(self, status_code):
+        """Documento EMF con dimensión por handler"""
+        total_ms = (time.perf_counter() - self.inicio) * 1000
+        valores = {f'{fase}_ms': round(ms, 3) for fase, ms in self.fases.items()}
+        valores['total_ms'] = round(total_ms, 3)
+        valores['capacidad_consumida'] = round(self.capacidad, 3)
+        valores.update(self.contadores)
+
+        metricas = [{'Name': nombre, 'Unit': unidad(nombre)} for nombre in valores]
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['handler']],
+                    'Metrics': metricas
+                }]
+            },
+            'handler': self.handler,
+            'statusCode': status_code,
+            **valores
+        }
+
+def unidad(nombre):
+    """Unidad CloudWatch según la convención de nombres (_ms, bytes_)"""
+    if nombre.endswith('_ms'):
+        return 'Milliseconds'
+    if nombre.startswith('bytes_'):
+        return 'Bytes'
+    return 'Count'
+
+def medicion_actual():
+    """Medición de la invocación en curso (None fuera de un handler instrumentado)"""
+    return _medicion_actual.get()
+
+@contextmanager
+def fase(nombre):
+    """Mide una fase de la invocación en curso; no hace nada fuera de un handler"""
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        yield
+        return
+    with medicion.fase(nombre):
+        yield
+
+def contar(nombre, valor=1):
+    """Suma a un contador de la invocación en curso"""
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.contar(nombre, valor)
+
+def fijar(nombre, valor):
+    """Fija el valor de una métrica de la invocación en curso (p. ej. un ratio)"""
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.fijar(nombre, valor)
+
+def registrar_capacidad(response):
+    """Acumula el ConsumedCapacity de una respuesta de DynamoDB"""
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.registrar_capacidad(response)
+
+def debug(mensaje, datos=None):
+    """Volcado de depuración solo si la invocación está muestreada o LOG_LEVEL=DEBUG"""
+    medicion = _medicion_actual.get()
+    if medicion is None or not medicion.debug:
+        return
+    if datos is None:
+        print(mensaje)
+    else:
+        print(f"{mensaje}: {json.dumps(datos, default=str, ensure_ascii=False)}")
+
+def instrumentado(handler):
+    """Decorador de handlers Lambda: mide la invocación y emite una línea EMF al final"""
+    @functools.wraps(handler)
+    def envoltura(event, context):
+        medicion = Medicion(handler.__name__)
+        token = _medicion_actual.set(medicion)
+        status_code = 500
+        try:
+            response = handler(event, context)
+            if isinstance(response, dict):
+                status_code = response.get('statusCode', 200)
+            return response
+        finally:
+            _medicion_actual.reset(token)
+            if METRICAS_HABILITADAS:
+                print(json.dumps(medicion.documento(status_code), separators=(',', ':')))
+    return envoltura
@@ -0,0 +1,586 @@
+import base64
+import bisect
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+import dynamo
+
+# Índice secundario global: compras de un usuario ordenadas por fecha
+USUARIO_INDEX = 'tenant-usuario-fecha-index'
+
+# Atributos internos de los items (claves del índice) que no se devuelven ni se exportan
+ATRIBUTOS_INTERNOS = ('tenant_usuario',)
+
+# Claves por bloque en las lecturas por lote de SQLite (límite de variables por sentencia)
+SQLITE_BLOQUE = 100
+
+def clave_usuario(tenant_id, email):
+    """Construye la clave de partición del índice por usuario (tenant#email)"""
+    return f"{tenant_id}#{email}"
+
+def clave_estadisticas(email):
+    """Clave (sort key) del item agregado de estadísticas de un usuario"""
+    return f"USUARIO#{email}"
+
+def clave_cursor(item):
+    """Clave de reanudación de listar_por_usuario, con la forma del LastEvaluatedKey del índice"""
+    return {
+        'tenant_id': item['tenant_id'],
+        'codigo_compra': item['codigo_compra'],
+        'tenant_usuario': item['tenant_usuario'],
+        'fecha_compra': item['fecha_compra']
+    }
+
+def proyectar(item, campos):
+    """Solo los atributos pedidos (todos si campos es None)"""
+    if campos is None:
+        return item
+    return {campo: item[campo] for campo in campos if campo in item}
+
+def normalizar(item):
+    """Copia del item con los tipos que devuelve DynamoDB (números como Decimal)"""
+    return dynamo.deserializar_item(dynamo.serializar_item(item))
+
+class Repositorio(ABC):
+    """
+    Operaciones de datos de los handlers de compras. Las implementaciones
+    devuelven items con los tipos de DynamoDB (números Decimal, binarios bytes)
+    y cursores con la forma del LastEvaluatedKey del índice por usuario, para
+    que los handlers no dependan del backend.
+    """
+
+    @abstractmethod
+    def guardar_compra(self, item):
+        """Guarda (o reemplaza) una compra"""
+
+    @abstractmethod
+    def guardar_compras(self, items, context=None):
+        """
+        Guarda varias compras; devuelve los codigo_compra que no se pudieron
+        guardar. Un bloque o item que falla no interrumpe el resto.
+        """
+
+    @abstractmethod
+    def obtener_compra(self, tenant_id, codigo_compra):
+        """Compra por clave, o None"""
+
+    @abstractmethod
+    def obtener_compras(self, tenant_id, codigos, context=None):
+        """Compras por código (sin orden garantizado) y códigos que no se pudieron leer"""
+
+    @abstractmethod
+    def listar_por_usuario(self, tenant_usuario, desde=None, hasta=None, limit=10, start_key=None, campos=None):
+        """Compras del usuario de la más reciente a la más antigua y cursor de la página siguiente (o None)"""
+
+    @abstractmethod
+    def estadisticas_usuario(self, tenant_id, email):
+        """Totales de compras del usuario (total_compras, total_gastado, ...), o None"""
+
+    @abstractmethod
+    def obtener_agregado(self, tenant_id, clave):
+        """Item de agregados por clave, o None"""
+
+    @abstractmethod
+    def consultar_agregados(self, tenant_id, desde, hasta):
+        """Items de agregados del tenant con clave entre desde y hasta (inclusive), en orden"""
+
+    @abstractmethod
+    def reservar_agregado(self, item, ahora):
+        """Crea el item si no existe o si su expira_en es anterior a ahora; si no, devuelve el existente"""
+
+    @abstractmethod
+    def guardar_agregado(self, item):
+        """Guarda (o reemplaza) un item de agregados"""
+
+    @abstractmethod
+    def eliminar_agregado(self, tenant_id, clave, estado=None):
+        """Elimina un item de agregados (solo si su estado coincide, cuando se indica)"""
+
+class RepositorioDynamo(Repositorio):
+    """Backend de producción: tabla de compras, índice por usuario y tabla de agregados en DynamoDB"""
+
+    def __init__(self, tabla, agregados):
+        self.tabla = tabla
+        self.agregados = agregados
+
+    def guardar_compra(self, item):
+        self.tabla.put_item(Item=item)
+
+    def guardar_compras(self, items, context=None):
+        # BatchWriteItem en bloques de 25 con reintentos de UnprocessedItems;
+        # si un bloque lanza, los ya escritos quedan guardados y sus compras
+        # se informan como no guardadas en lugar de abortar el lote
+        no_guardadas = []
+        for inicio in range(0, len(items), dynamo.BATCH_WRITE_MAX):
+            bloque = [{'PutRequest': {'Item': item}} for item in items[inicio:inicio + dynamo.BATCH_WRITE_MAX]]
+            try:
+                no_procesadas = self.tabla.batch_write(bloque, context)
+            except Exception as e:
+                print(f"Error guardando bloque de compras: {str(e)}")
+                no_procesadas = bloque
+            no_guardadas.extend(solicitud['PutRequest']['Item']['codigo_compra'] for solicitud in no_procesadas)
+        return no_guardadas
+
+    def obtener_compra(self, tenant_id, codigo_compra):
+        response = self.tabla.get_item(Key={'tenant_id': tenant_id, 'codigo_compra': codigo_compra})
+        return response.get('Item')
+
+    def obtener_compras(self, tenant_id, codigos, context=None):
+        items, no_procesadas = self.tabla.batch_get(
+            [{'tenant_id': tenant_id, 'codigo_compra': codigo} for codigo in codigos],
+            context
+        )
+        return items, [clave['codigo_compra'] for clave in no_procesadas]
+
+    def listar_por_usuario(self, tenant_usuario, desde=None, hasta=None, limit=10, start_key=None, campos=None):
+        # El rango de fechas se resuelve en la condición de clave: solo se leen las compras de la página
+        key_condition = 'tenant_usuario = :tenant_usuario'
+        valores = {':tenant_usuario': tenant_usuario}
+        if desde and hasta:
+            key_condition += ' AND fecha_compra BETWEEN :desde AND :hasta'
+            valores.update({':desde': desde, ':hasta': hasta})
+        elif desde:
+            key_condition += ' AND fecha_compra >= :desde'
+            valores[':desde'] = desde
+        elif hasta:
+            key_condition += ' AND fecha_compra <= :hasta'
+            valores[':hasta'] = hasta
+
+        # Nombres con placeholder: algunos atributos pueden ser palabras reservadas
+        proyeccion = None
+        if campos is not None:
+            nombres = {f'#c{i}': campo for i, campo in enumerate(dict.fromkeys(campos))}
+            proyeccion = ', '.join(nombres), nombres
+
+        # Se siguen leyendo páginas (límite de 1 MB por respuesta) hasta completar el limit
+        items = []
+        while True:
+            query_kwargs = {
+                'IndexName': USUARIO_INDEX,
+                'KeyConditionExpression': key_condition,
+                'ExpressionAttributeValues': valores,
+                'ScanIndexForward': False,
+                'Limit': limit - len(items)
+            }
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            if proyeccion:
+                query_kwargs['ProjectionExpression'], query_kwargs['ExpressionAttributeNames'] = proyeccion
+
+            response = self.tabla.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            start_key = response.get('LastEvaluatedKey')
+
+            if not start_key or len(items) >= limit:
+                return items, start_key
+
+    def estadisticas_usuario(self, tenant_id, email):
+        # Item agregado mantenido por el consumidor de DynamoDB Streams
+        return self.obtener_agregado(tenant_id, clave_estadisticas(email))
+
+    def obtener_agregado(self, tenant_id, clave):
+        return self.agregados.get_item(Key={'tenant_id': tenant_id, 'clave': clave}).get('Item')
+
+    def consultar_agregados(self, tenant_id, desde, hasta):
+        query_kwargs = {
+            'KeyConditionExpression': 'tenant_id = :tenant_id AND clave BETWEEN :desde AND :hasta',
+            'ExpressionAttributeValues': {':tenant_id': tenant_id, ':desde': desde, ':hasta': hasta}
+        }
+        while True:
+            response = self.agregados.query(**query_kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def reservar_agregado(self, item, ahora):
+        try:
+            self.agregados.put_item(
+                Item=item,
+                # El TTL de DynamoDB borra con retraso: un item vencido se reutiliza
+                ConditionExpression='attribute_not_exists(clave) OR expira_en < :ahora',
+                ExpressionAttributeValues={':ahora': ahora},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return None
+        except Exception as e:
+            if dynamo.codigo_error(e) != 'ConditionalCheckFailedException':
+                raise
+            # El item existente viene en el error: no hace falta un get_item
+            return dynamo.deserializar_item(e.response.get('Item'))
+
+    def guardar_agregado(self, item):
+        self.agregados.put_item(Item=item)
+
+    def eliminar_agregado(self, tenant_id, clave, estado=None):
+        condicion = {}
+        if estado is not None:
+            condicion = {
+                'ConditionExpression': 'estado = :estado',
+                'ExpressionAttributeValues': {':estado': estado}
+            }
+        try:
+            self.agregados.delete_item(Key={'tenant_id': tenant_id, 'clave': clave}, **condicion)
+        except Exception as e:
+            if dynamo.codigo_error(e) != 'ConditionalCheckFailedException':
+                raise
+
+class RepositorioMemoria(Repositorio):
+    """
+    Backend en memoria para pruebas de carga y perfiles locales. El índice
+    por usuario es una lista ordenada (fecha_compra, tenant_id, codigo_compra)
+    por tenant_usuario, recorrida con búsqueda binaria como el GSI.
+    """
+
+    def __init__(self):
+        self.compras = {}
+        self._por_usuario = {}
+        self.agregados = {}
+        self._claves_agregados = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entrada(item):
+        return item['fecha_compra'], item['tenant_id'], item['codigo_compra']
+
+    def _guardar(self, item):
+        clave = (item['tenant_id'], item['codigo_compra'])
+        anterior = self.compras.get(clave)
+        if anterior is not None and anterior.get('tenant_usuario'):
+            entradas = self._por_usuario[anterior['tenant_usuario']]
+            posicion = bisect.bisect_left(entradas, self._entrada(anterior))
+            if posicion < len(entradas) and entradas[posicion] == self._entrada(anterior):
+                entradas.pop(posicion)
+        self.compras[clave] = item
+        if item.get('tenant_usuario') and item.get('fecha_compra'):
+            bisect.insort(self._por_usuario.setdefault(item['tenant_usuario'], []), self._entrada(item))
+
+    def guardar_compra(self, item):
+        item = normalizar(item)
+        with self._lock:
+            self._guardar(item)
+
+    def guardar_compras(self, items, context=None):
+        normalizados = []
+        no_guardadas = []
+        for item in items:
+            try:
+                normalizados.append(normalizar(item))
+            except TypeError as e:
+                print(f"Error guardando compra {item.get('codigo_compra')}: {str(e)}")
+                no_guardadas.append(item.get('codigo_compra'))
+        with self._lock:
+            for item in normalizados:
+                self._guardar(item)
+        return no_guardadas
+
+    def obtener_compra(self, tenant_id, codigo_compra):
+        return self.compras.get((tenant_id, codigo_compra))
+
+    def obtener_compras(self, tenant_id, codigos, context=None):
+        items = [self.compras.get((tenant_id, codigo)) for codigo in codigos]
+        return [item for item in items if item is not None], []
+
+    def _rango_usuario(self, tenant_usuario, desde, hasta):
+        entradas = self._por_usuario.get(tenant_usuario, [])
+        inicio = bisect.bisect_left(entradas, (desde,)) if desde else 0
+        # Tupla de un elemento: queda antes de todas las entradas con fecha posterior a hasta
+        fin = bisect.bisect_left(entradas, (hasta + '\x00',)) if hasta else len(entradas)
+        return entradas, inicio, fin
+
+    def listar_por_usuario(self, tenant_usuario, desde=None, hasta=None, limit=10, start_key=None, campos=None):
+        with self._lock:
+            entradas, inicio, fin = self._rango_usuario(tenant_usuario, desde, hasta)
+            if start_key:
+                fin = min(fin, bisect.bisect_left(entradas, self._entrada(start_key)))
+            pagina = [self.compras[(t, c)] for _, t, c in reversed(entradas[max(inicio, fin - limit):fin])]
+            hay_mas = fin - limit > inicio
+        siguiente = clave_cursor(pagina[-1]) if hay_mas else None
+        return [proyectar(item, campos) for item in pagina], siguiente
+
+    def estadisticas_usuario(self, tenant_id, email):
+        with self._lock:
+            entradas = list(self._por_usuario.get(clave_usuario(tenant_id, email), []))
+        if not entradas:
+            return None
+        estadisticas = {
+            'total_compras': len(entradas),
+            'total_gastado': Decimal('0'),
+            'total_productos_comprados': Decimal('0'),
+            'primera_compra': entradas[0][0],
+            'ultima_compra': entradas[-1][0]
+        }
+        for _, t, c in entradas:
+            compra = self.compras[(t, c)]
+            estadisticas['total_gastado'] += compra.get('total_monto', 0)
+            estadisticas['total_productos_comprados'] += compra.get('total_productos', 0)
+        return estadisticas
+
+    def obtener_agregado(self, tenant_id, clave):
+        return self.agregados.get((tenant_id, clave))
+
+    def consultar_agregados(self, tenant_id, desde, hasta):
+        with self._lock:
+            claves = self._claves_agregados.get(tenant_id, [])
+            seleccion = claves[bisect.bisect_left(claves, desde):bisect.bisect_right(claves, hasta)]
+            return [self.agregados[(tenant_id, clave)] for clave in seleccion]
+
+    def _guardar_agregado(self, item):
+        clave = (item['tenant_id'], item['clave'])
+        if clave not in self.agregados:
+            bisect.insort(self._claves_agregados.setdefault(item['tenant_id'], []), item['clave'])
+        self.agregados[clave] = normalizar(item)
+
+    def reservar_agregado(self, item, ahora):
+        with self._lock:
+            existente = self.agregados.get((item['tenant_id'], item['clave']))
+            if existente is not None and existente.get('expira_en', 0) >= ahora:
+                return existente
+            self._guardar_agregado(item)
+            return None
+
+    def guardar_agregado(self, item):
+        with self._lock:
+            self._guardar_agregado(item)
+
+    def eliminar_agregado(self, tenant_id, clave, estado=None):
+        with self._lock:
+            existente = self.agregados.get((tenant_id, clave))
+            if existente is None or (estado is not None and existente.get('estado') != estado):
+                return
+            del self.agregados[(tenant_id, clave)]
+            claves = self._claves_agregados[tenant_id]
+            claves.pop(bisect.bisect_left(claves, clave))
+
+def _codificar(item):
+    """Item como JSON del formato tipado de DynamoDB (binarios en base64)"""
+    return json.dumps(dynamo.serializar_item(item), ensure_ascii=False, separators=(',', ':'),
+                      default=lambda binario: base64.b64encode(binario).decode('ascii'))
+
+def _restaurar_binarios(tipado):
+    """Vuelve a bytes los valores B codificados en base64 por _codificar"""
+    tipo, valor = next(iter(tipado.items()))
+    if tipo == 'B':
+        return {'B': base64.b64decode(valor)}
+    if tipo == 'M':
+        return {'M': {k: _restaurar_binarios(v) for k, v in valor.items()}}
+    if tipo == 'L':
+        return {'L': [_restaurar_binarios(v) for v in valor]}
+    return tipado
+
+def _decodificar(texto):
+    """Item desde el JSON guardado por _codificar"""
+    return {k: dynamo.deserializar(_restaurar_binarios(v)) for k, v in json.loads(texto).items()}
+
+class SumaDecimal:
+    """Agregado SQLite que suma números guardados como texto con Decimal exacto"""
+
+    def __init__(self):
+        self.total = Decimal('0')
+
+    def step(self, valor):
+        if valor is not None:
+            self.total += Decimal(valor)
+
+    def finalize(self):
+        return str(self.total)
+
+class RepositorioSQLite(Repositorio):
+    """
+    Backend SQLite para experimentos locales reproducibles. Las columnas e
+    índices replican los patrones de acceso de DynamoDB (clave primaria
+    tenant_id + codigo_compra, índice tenant_usuario + fecha_compra, agregados
+    por tenant_id + clave); el item completo se guarda como JSON tipado.
+    explicar() devuelve el plan de cada consulta para compararlo con el acceso
+    equivalente en DynamoDB.
+    """
+
+    ESQUEMA = (
+        """CREATE TABLE IF NOT EXISTS compras (
+            tenant_id TEXT NOT NULL,
+            codigo_compra TEXT NOT NULL,
+            tenant_usuario TEXT,
+            fecha_compra TEXT,
+            total_monto TEXT,
+            total_productos TEXT,
+            item TEXT NOT NULL,
+            PRIMARY KEY (tenant_id, codigo_compra)
+        ) WITHOUT ROWID""",
+        # Equivalente al GSI; incluye los totales para resolver estadísticas solo con el índice
+        """CREATE INDEX IF NOT EXISTS compras_usuario_fecha
+            ON compras (tenant_usuario, fecha_compra, tenant_id, codigo_compra, total_monto, total_productos)""",
+        """CREATE TABLE IF NOT EXISTS agregados (
+            tenant_id TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            expira_en INTEGER,
+            item TEXT NOT NULL,
+            PRIMARY KEY (tenant_id, clave)
+        ) WITHOUT ROWID"""
+    )
+
+    SQL_GUARDAR = """INSERT OR REPLACE INTO compras
+        (tenant_id, codigo_compra, tenant_usuario, fecha_compra, total_monto, total_productos, item)
+        VALUES (?, ?, ?, ?, ?, ?, ?)"""
+    SQL_OBTENER = 'SELECT item FROM compras WHERE tenant_id = ? AND codigo_compra = ?'
+    SQL_LISTAR = """SELECT item FROM compras
+        WHERE tenant_usuario = ? AND fecha_compra >= ? AND fecha_compra <= ?
+          AND (fecha_compra, tenant_id, codigo_compra) < (?, ?, ?)
+        ORDER BY fecha_compra DESC, tenant_id DESC, codigo_compra DESC
+        LIMIT ?"""
+    SQL_ESTADISTICAS = """SELECT COUNT(*), suma_decimal(total_monto), suma_decimal(total_productos),
+            MIN(fecha_compra), MAX(fecha_compra)
+        FROM compras WHERE tenant_usuario = ?"""
+    SQL_AGREGADO = 'SELECT item, expira_en FROM agregados WHERE tenant_id = ? AND clave = ?'
+    SQL_AGREGADOS_RANGO = """SELECT item FROM agregados
+        WHERE tenant_id = ? AND clave BETWEEN ? AND ? ORDER BY clave"""
+    SQL_GUARDAR_AGREGADO = 'INSERT OR REPLACE INTO agregados (tenant_id, clave, expira_en, item) VALUES (?, ?, ?, ?)'
+
+    # Límites abiertos para listar sin rango ni cursor (mayores que cualquier fecha ISO o código)
+    SIN_LIMITE = '\U0010ffff'
+
+    def __init__(self, ruta=':memory:'):
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.create_aggregate('suma_decimal', 1, SumaDecimal)
+        self._lock = threading.Lock()
+        with self._lock, self._conexion:
+            if ruta != ':memory:':
+                self._conexion.execute('PRAGMA journal_mode=WAL')
+            for sentencia in self.ESQUEMA:
+                self._conexion.execute(sentencia)
+
+    @staticmethod
+    def _fila(item):
+        item = normalizar(item)
+        total_monto = item.get('total_monto')
+        total_productos = item.get('total_productos')
+        return (
+            item['tenant_id'], item['codigo_compra'], item.get('tenant_usuario'), item.get('fecha_compra'),
+            None if total_monto is None else str(total_monto),
+            None if total_productos is None else str(total_productos),
+            _codificar(item)
+        )
+
+    def guardar_compra(self, item):
+        with self._lock, self._conexion:
+            self._conexion.execute(self.SQL_GUARDAR, self._fila(item))
+
+    def guardar_compras(self, items, context=None):
+        filas = []
+        no_guardadas = []
+        for item in items:
+            try:
+                filas.append(self._fila(item))
+            except TypeError as e:
+                print(f"Error guardando compra {item.get('codigo_compra')}: {str(e)}")
+                no_guardadas.append(item.get('codigo_compra'))
+        with self._lock, self._conexion:
+            self._conexion.executemany(self.SQL_GUARDAR, filas)
+        return no_guardadas
+
+    def obtener_compra(self, tenant_id, codigo_compra):
+        with self._lock:
+            fila = self._conexion.execute(self.SQL_OBTENER, (tenant_id, codigo_compra)).fetchone()
+        return _decodificar(fila[0]) if fila else None
+
+    def obtener_compras(self, tenant_id, codigos, context=None):
+        items = []
+        for inicio in range(0, len(codigos), SQLITE_BLOQUE):
+            bloque = codigos[inicio:inicio + SQLITE_BLOQUE]
+            sql = (f"SELECT item FROM compras WHERE tenant_id = ? "
+                   f"AND codigo_compra IN ({', '.join('?' * len(bloque))})")
+            with self._lock:
+                filas = self._conexion.execute(sql, (tenant_id, *bloque)).fetchall()
+            items.extend(_decodificar(fila[0]) for fila in filas)
+        return items, []
+
+    def _parametros_listar(self, tenant_usuario, desde, hasta, limit, start_key):
+        cursor = (start_key['fecha_compra'], start_key['tenant_id'], start_key['codigo_compra']) if start_key \
+            else (self.SIN_LIMITE,) * 3
+        # Una fila más que el limit indica si hay página siguiente
+        return (tenant_usuario, desde or '', hasta or self.SIN_LIMITE, *cursor, limit + 1)
+
+    def listar_por_usuario(self, tenant_usuario, desde=None, hasta=None, limit=10, start_key=None, campos=None):
+        parametros = self._parametros_listar(tenant_usuario, desde, hasta, limit, start_key)
+        with self._lock:
+            filas = self._conexion.execute(self.SQL_LISTAR, parametros).fetchall()
+        items = [_decodificar(fila[0]) for fila in filas[:limit]]
+        siguiente = clave_cursor(items[-1]) if len(filas) > limit else None
+        return [proyectar(item, campos) for item in items], siguiente
+
+    def estadisticas_usuario(self, tenant_id, email):
+        with self._lock:
+            fila = self._conexion.execute(self.SQL_ESTADISTICAS, (clave_usuario(tenant_id, email),)).fetchone()
+        total_compras, total_gastado, total_productos, primera, ultima = fila
+        if not total_compras:
+            return None
+        return {
+            'total_compras': total_compras,
+            'total_gastado': Decimal(total_gastado),
+            'total_productos_comprados': Decimal(total_productos),
+            'primera_compra': primera,
+            'ultima_compra': ultima
+        }
+
+    def obtener_agregado(self, tenant_id, clave):
+        with self._lock:
+            fila = self._conexion.execute(self.SQL_AGREGADO, (tenant_id, clave)).fetchone()
+        return _decodificar(fila[0]) if fila else None
+
+    def consultar_agregados(self, tenant_id, desde, hasta):
+        with self._lock:
+            filas = self._conexion.execute(self.SQL_AGREGADOS_RANGO, (tenant_id, desde, hasta)).fetchall()
+        return [_decodificar(fila[0]) for fila in filas]
+
+    def _fila_agregado(self, item):
+        expira_en = item.get('expira_en')
+        return item['tenant_id'], item['clave'], None if expira_en is None else int(expira_en), _codificar(item)
+
+    def reservar_agregado(self, item, ahora):
+        with self._lock, self._conexion:
+            fila = self._conexion.execute(self.SQL_AGREGADO, (item['tenant_id'], item['clave'])).fetchone()
+            if fila and (fila[1] or 0) >= ahora:
+                return _decodificar(fila[0])
+            self._conexion.execute(self.SQL_GUARDAR_AGREGADO, self._fila_agregado(item))
+            return None
+
+    def guardar_agregado(self, item):
+        with self._lock, self._conexion:
+            self._conexion.execute(self.SQL_GUARDAR_AGREGADO, self._fila_agregado(item))
+
+    def eliminar_agregado(self, tenant_id, clave, estado=None):
+        with self._lock, self._conexion:
+            if estado is not None:
+                fila = self._conexion.execute(self.SQL_AGREGADO, (tenant_id, clave)).fetchone()
+                if not fila or _decodificar(fila[0]).get('estado') != estado:
+                    return
+            self._conexion.execute('DELETE FROM agregados WHERE tenant_id = ? AND clave = ?', (tenant_id, clave))
+
+    def explicar(self):
+        """EXPLAIN QUERY PLAN de cada patrón de acceso, con su equivalente en DynamoDB"""
+        consultas = {
+            'obtener_compra (GetItem)': (self.SQL_OBTENER, ('t', 'c')),
+            'listar_por_usuario (Query al GSI)': (
+                self.SQL_LISTAR, self._parametros_listar('t#e', '2025-01-01', '2025-12-31', 10, None)
+            ),
+            'estadisticas_usuario (en DynamoDB, GetItem del agregado del stream)': (self.SQL_ESTADISTICAS, ('t#e',)),
+            'consultar_agregados (Query por rango de clave)': (self.SQL_AGREGADOS_RANGO, ('t', 'A', 'B'))
+        }
+        planes = {}
+        with self._lock:
+            for nombre, (sql, parametros) in consultas.items():
+                filas = self._conexion.execute(f'EXPLAIN QUERY PLAN {sql}', parametros).fetchall()
+                planes[nombre] = [fila[-1] for fila in filas]
+        return planes
+
+def crear_repositorio(tipo, tabla=None, agregados=None, ruta_sqlite=':memory:'):
+    """Repositorio según REPOSITORIO: dynamodb (tablas dadas), memoria o sqlite"""
+    if tipo == 'dynamodb':
+        return RepositorioDynamo(tabla, agregados)
+    if tipo == 'memoria':
+        return RepositorioMemoria()
+    if tipo == 'sqlite':
+        return RepositorioSQLite(ruta_sqlite)
+    raise ValueError(f"Repositorio desconocido: {tipo}")
@@ -0,0 +1,312 @@
+import argparse
+import base64
+import json
+import os
+import re
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import compras
+import compresion
+import dynamo
+import swagger
+from repositorio import RepositorioDynamo
+
+# Servidor HTTP de larga duración que monta los handlers de serverless.yml: el
+# proceso se inicia una vez y los clientes y caches del módulo se comparten
+# entre solicitudes (sin cold start por invocación)
+SERVIDOR_HOST = os.environ.get('SERVIDOR_HOST', '0.0.0.0')
+SERVIDOR_PUERTO = int(os.environ.get('SERVIDOR_PUERTO', '8080'))
+SERVIDOR_HILOS = int(os.environ.get('SERVIDOR_HILOS', '16'))
+SERVIDOR_STAGE = os.environ.get('SERVIDOR_STAGE', 'dev')
+
+# Conexiones aceptadas en espera de un worker; con la cola llena se deja de
+# aceptar y las nuevas esperan en el backlog del socket
+SERVIDOR_COLA = int(os.environ.get('SERVIDOR_COLA', str(SERVIDOR_HILOS)))
+
+# Segundos que una conexión keep-alive inactiva ocupa un worker
+SERVIDOR_KEEPALIVE = float(os.environ.get('SERVIDOR_KEEPALIVE', '5'))
+
+# Tiempo por solicitud que ven los handlers en get_remaining_time_in_millis (timeout de serverless.yml)
+SERVIDOR_TIMEOUT = float(os.environ.get('SERVIDOR_TIMEOUT', '30'))
+
+# Sin API Gateway no hace falta binaryMediaTypes: el servidor comprime según
+# Accept-Encoding las respuestas que el handler no comprimió
+SERVIDOR_COMPRESION = os.environ.get('SERVIDOR_COMPRESION', 'true').lower() == 'true'
+
+# Máximo de API Gateway para el payload de una solicitud
+BODY_MAXIMO = 10 * 1024 * 1024
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
+# Rutas de serverless.yml: (método, ruta, handler, integración)
+RUTAS = (
+    ('POST', '/compras/registrar', compras.registrar_compra, 'lambda'),
+    ('POST', '/compras/registrar-lote', compras.registrar_compras_lote, 'lambda'),
+    ('GET', '/compras/listar', compras.listar_compras, 'lambda'),
+    ('GET', '/compras/buscar/{codigo}', compras.buscar_compra, 'lambda'),
+    ('GET', '/compras/buscar', compras.buscar_compras, 'lambda'),
+    ('POST', '/compras/buscar', compras.buscar_compras, 'lambda'),
+    ('GET', '/compras/estadisticas', compras.obtener_estadisticas_compras, 'lambda'),
+    ('GET', '/compras/productos/top', compras.top_productos, 'lambda'),
+    ('GET', '/docs', swagger.serve_swagger_ui, 'lambda-proxy'),
+    ('GET', '/docs/{proxy+}', swagger.serve_swagger_ui, 'lambda-proxy'),
+    ('GET', '/swagger.json', swagger.get_swagger_json, 'lambda-proxy')
+)
+
+def compilar_ruta(ruta):
+    """Expresión regular de una ruta con parámetros {nombre} o {nombre+} (resto de la ruta)"""
+    patron = re.escape(ruta)
+    patron = re.sub(r'\\\{(\w+)\\\+\\\}', r'(?P<\1>.+)', patron)
+    patron = re.sub(r'\\\{(\w+)\\\}', r'(?P<\1>[^/]+)', patron)
+    return re.compile(f'^{patron}$')
+
+RUTAS_COMPILADAS = tuple((metodo, compilar_ruta(ruta), ruta, handler, integracion)
+                         for metodo, ruta, handler, integracion in RUTAS)
+
+def resolver_ruta(metodo, path):
+    """(handler, integración, ruta, parámetros) de la solicitud; acepta el prefijo /{stage} de API Gateway"""
+    prefijo = f"/{SERVIDOR_STAGE}"
+    if path.startswith(prefijo + '/'):
+        path = path[len(prefijo):]
+
+    metodo_permitido = False
+    for metodo_ruta, patron, ruta, handler, integracion in RUTAS_COMPILADAS:
+        coincidencia = patron.match(path)
+        if coincidencia is None:
+            continue
+        if metodo_ruta == metodo:
+            return handler, integracion, ruta, coincidencia.groupdict()
+        metodo_permitido = True
+    return None, 'metodo' if metodo_permitido else None, None, None
+
+class Contexto:
+    """Contexto con la interfaz que usan los handlers del context de Lambda"""
+
+    def __init__(self, handler):
+        self.function_name = handler.__name__
+        self.aws_request_id = str(uuid.uuid4())
+        self._limite = time.monotonic() + SERVIDOR_TIMEOUT
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._limite - time.monotonic()) * 1000))
+
+def evento_lambda(metodo, ruta, parametros, query, headers, body, ip):
+    """Evento de la plantilla de integración lambda de serverless (path y query como objetos)"""
+    return {
+        'body': body if body else {},
+        'method': metodo,
+        'headers': headers,
+        'query': query,
+        'path': parametros,
+        'identity': {'sourceIp': ip},
+        'stageVariables': {},
+        'stage': SERVIDOR_STAGE,
+        'requestPath': ruta
+    }
+
+def evento_proxy(metodo, ruta, path, parametros, query, headers, body, ip, request_id):
+    """Evento de la integración lambda-proxy"""
+    return {
+        'resource': ruta,
+        'path': path,
+        'httpMethod': metodo,
+        'headers': headers,
+        'queryStringParameters': query or None,
+        'pathParameters': parametros or None,
+        'requestContext': {
+            'stage': SERVIDOR_STAGE,
+            'resourcePath': ruta,
+            'httpMethod': metodo,
+            'requestId': request_id,
+            'identity': {'sourceIp': ip}
+        },
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def comprimir_respuesta(headers_solicitud, status_code, headers, cuerpo):
+    """Cuerpo y headers con la codificación negociada por Accept-Encoding, si el handler no la aplicó"""
+    # Las representaciones con ETag (Swagger) manejan sus propias variantes gzip
+    if (compresion.obtener_header(headers, 'Content-Encoding') or compresion.obtener_header(headers, 'ETag')
+            or status_code in (204, 304)):
+        return headers, cuerpo
+    if len(cuerpo) < compresion.COMPRESION_UMBRAL_BYTES:
+        return headers, cuerpo
+
+    headers = {**headers, 'Vary': 'Accept-Encoding'}
+    codificacion = compresion.elegir_codificacion(headers_solicitud)
+    if codificacion is None:
+        return headers, cuerpo
+    return {**headers, 'Content-Encoding': codificacion}, compresion.comprimir(cuerpo, codificacion)
+
+class Manejador(BaseHTTPRequestHandler):
+    """Traduce cada solicitud HTTP al evento de API Gateway y la respuesta del handler a HTTP"""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = SERVIDOR_KEEPALIVE
+
+    def do_GET(self):
+        self.atender('GET')
+
+    def do_POST(self):
+        self.atender('POST')
+
+    def do_OPTIONS(self):
+        # Preflight CORS (en AWS lo responde API Gateway con cors: true)
+        self.responder(204, CORS_HEADERS, b'')
+
+    def atender(self, metodo):
+        url = urlsplit(self.path)
+        if url.path == '/salud':
+            self.responder(200, {'Content-Type': 'application/json'}, b'{"estado":"ok"}')
+            return
+
+        handler, integracion, ruta, parametros = resolver_ruta(metodo, url.path)
+        if handler is None:
+            status_code, error = (405, 'Método no permitido') if integracion == 'metodo' else (404, 'Ruta no encontrada')
+            self.responder_error(status_code, error)
+            return
+
+        longitud = int(self.headers.get('Content-Length') or 0)
+        if longitud > BODY_MAXIMO:
+            self.close_connection = True
+            self.responder_error(413, 'Body demasiado grande')
+            return
+        try:
+            body = self.rfile.read(longitud).decode('utf-8') if longitud else None
+        except UnicodeDecodeError:
+            self.responder_error(400, 'Body inválido')
+            return
+
+        headers = dict(self.headers.items())
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        contexto = Contexto(handler)
+        if integracion == 'lambda-proxy':
+            event = evento_proxy(metodo, ruta, url.path, parametros, query, headers, body,
+                                 self.client_address[0], contexto.aws_request_id)
+        else:
+            event = evento_lambda(metodo, ruta, parametros, query, headers, body, self.client_address[0])
+
+        try:
+            response = handler(event, contexto)
+        except Exception as e:
+            print(f"Error en {handler.__name__}: {str(e)}")
+            self.responder_error(500, 'Error interno del servidor')
+            return
+
+        cuerpo = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            cuerpo = base64.b64decode(cuerpo)
+        elif isinstance(cuerpo, str):
+            cuerpo = cuerpo.encode('utf-8')
+        status_code = response.get('statusCode', 200)
+        headers = response.get('headers') or {}
+        if SERVIDOR_COMPRESION:
+            headers, cuerpo = comprimir_respuesta(self.headers, status_code, headers, cuerpo)
+        self.responder(status_code, headers, cuerpo)
+
+    def responder(self, status_code, headers, cuerpo):
+        self.send_response(status_code)
+        for nombre, valor in headers.items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        # Durante el apagado no se retienen conexiones keep-alive
+        if self.server.drenando:
+            self.close_connection = True
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def responder_error(self, status_code, error):
+        cuerpo = json.dumps({'error': error}, ensure_ascii=False).encode('utf-8')
+        self.responder(status_code, {'Content-Type': 'application/json', **CORS_HEADERS}, cuerpo)
+
+    def log_message(self, format, *args):
+        # Cada invocación ya emite su línea EMF; el access log es opcional
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+class Servidor(HTTPServer):
+    """HTTPServer que atiende las conexiones en un pool fijo de workers con cola acotada"""
+
+    def __init__(self, direccion, hilos=SERVIDOR_HILOS, cola=SERVIDOR_COLA, access_log=False):
+        super().__init__(direccion, Manejador)
+        self.access_log = access_log
+        self.drenando = False
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='servidor')
+        self._cupos = threading.BoundedSemaphore(hilos + cola)
+
+    def process_request(self, request, client_address):
+        self._cupos.acquire()
+        try:
+            self._pool.submit(self._atender, request, client_address)
+        except RuntimeError:
+            # Pool ya cerrado por el apagado
+            self._cupos.release()
+            self.shutdown_request(request)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._cupos.release()
+
+    def detener(self):
+        """Deja de aceptar conexiones (llamar desde otro hilo que serve_forever)"""
+        self.drenando = True
+        self.shutdown()
+
+    def drenar(self):
+        """Espera a que terminen las solicitudes en curso y en cola, y cierra el socket"""
+        self.drenando = True
+        self._pool.shutdown(wait=True)
+        self.server_close()
+
+def calentar(hilos):
+    """Crea el cliente DynamoDB antes de la primera solicitud, con una conexión por worker"""
+    if isinstance(compras.repositorio, RepositorioDynamo):
+        dynamo.MAX_CONEXIONES = max(dynamo.MAX_CONEXIONES, hilos)
+        dynamo.obtener_cliente()
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor HTTP con los handlers de la API de compras')
+    parser.add_argument('--host', default=SERVIDOR_HOST)
+    parser.add_argument('--puerto', type=int, default=SERVIDOR_PUERTO)
+    parser.add_argument('--hilos', type=int, default=SERVIDOR_HILOS, help='Workers del pool')
+    parser.add_argument('--cola', type=int, default=SERVIDOR_COLA,
+                        help='Conexiones aceptadas en espera de un worker')
+    parser.add_argument('--access-log', action='store_true', help='Línea de log por solicitud')
+    args = parser.parse_args()
+
+    calentar(args.hilos)
+    servidor = Servidor((args.host, args.puerto), args.hilos, args.cola, args.access_log)
+
+    # SIGTERM (docker stop, ECS) y Ctrl+C: se deja de aceptar y se drenan las solicitudes en curso
+    def apagar(signum, frame):
+        print(f"Señal {signal.Signals(signum).name}: deteniendo servidor")
+        threading.Thread(target=servidor.detener).start()
+
+    signal.signal(signal.SIGTERM, apagar)
+    signal.signal(signal.SIGINT, apagar)
+
+    print(f"Escuchando en http://{args.host}:{args.puerto} con {args.hilos} workers "
+          f"(repositorio {type(compras.repositorio).__name__})")
+    servidor.serve_forever()
+    servidor.drenar()
+    print('Servidor detenido')
+
+if __name__ == '__main__':
+    main()
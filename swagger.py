@@ -1,15 +1,104 @@
+import base64
+import gzip
+import hashlib
 import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
 
-def serve_swagger_ui(event, context):
-    """Sirve la interfaz de Swagger UI"""
+from cache import CacheLRU
+from compresion import COMPRESION_HABILITADA, codificaciones_aceptadas, obtener_header
+
+# Spec serializada por (host, stage), reutilizada entre invocaciones del contenedor
+SPEC_CACHE_CONTROL = 'public, max-age=300'
+spec_cache = CacheLRU(32)
+
+def acepta_gzip(headers):
+    """Indica si el cliente acepta gzip y la compresión está habilitada"""
+    if not COMPRESION_HABILITADA:
+        return False
+    aceptadas = codificaciones_aceptadas(headers)
+    return 'gzip' in aceptadas or '*' in aceptadas
+
+def etag_coincide(headers, etag):
+    """Evalúa If-None-Match (comparación débil, como indica RFC 9110)"""
+    if_none_match = obtener_header(headers, 'If-None-Match')
+    if not if_none_match:
+        return False
+    base = etag.strip('"')
+    for candidato in if_none_match.split(','):
+        candidato = candidato.strip()
+        if candidato == '*':
+            return True
+        if candidato.startswith('W/'):
+            candidato = candidato[2:]
+        candidato = candidato.strip('"')
+        if candidato == base or candidato == f"{base}-gzip":
+            return True
+    return False
+
+def no_modificado_desde(headers, last_modified_ts):
+    """Evalúa If-Modified-Since contra la fecha de la representación"""
+    if_modified_since = obtener_header(headers, 'If-Modified-Since')
+    if not if_modified_since or last_modified_ts is None:
+        return False
     try:
-        # Obtener la URL base de la API desde el evento
-        headers = event.get('headers', {})
-        host = headers.get('Host') or headers.get('host', 'localhost')
-        stage = event.get('requestContext', {}).get('stage', 'dev')
-        swagger_json_url = f"https://{host}/{stage}/swagger.json"
-        
-        html = f'''<!DOCTYPE html>
+        return parsedate_to_datetime(if_modified_since).timestamp() >= last_modified_ts
+    except (TypeError, ValueError):
+        return False
+
+def construir_representacion(texto):
+    """Cuerpo listo para servir: texto, ETag fuerte y variante gzip opcional"""
+    body_bytes = texto.encode('utf-8')
+    return {
+        'body': texto,
+        'etag': '"' + hashlib.sha256(body_bytes).hexdigest()[:32] + '"',
+        'gzip': base64.b64encode(gzip.compress(body_bytes, mtime=0)).decode('ascii') if COMPRESION_HABILITADA else None
+    }
+
+def respuesta_condicional(headers, representacion, response_headers, last_modified_ts=None):
+    """Respuesta lambda-proxy 200/304 según If-None-Match / If-Modified-Since y Accept-Encoding"""
+    usar_gzip = representacion['gzip'] is not None and acepta_gzip(headers)
+    etag = representacion['etag']
+    if usar_gzip:
+        etag = etag[:-1] + '-gzip"'
+    
+    response_headers = {**response_headers, 'ETag': etag, 'Vary': 'Accept-Encoding'}
+    
+    # If-None-Match tiene prioridad sobre If-Modified-Since
+    if obtener_header(headers, 'If-None-Match'):
+        no_modificado = etag_coincide(headers, representacion['etag'])
+    else:
+        no_modificado = no_modificado_desde(headers, last_modified_ts)
+    
+    # El cliente ya tiene esta versión
+    if no_modificado:
+        response_headers.pop('Content-Type', None)
+        return {
+            'statusCode': 304,
+            'headers': response_headers,
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if usar_gzip:
+        response_headers['Content-Encoding'] = 'gzip'
+        return {
+            'statusCode': 200,
+            'headers': response_headers,
+            'body': representacion['gzip'],
+            'isBase64Encoded': True
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': representacion['body'],
+        'isBase64Encoded': False
+    }
+
+# Plantilla de Swagger UI: se parte una sola vez en prefijo/sufijo alrededor
+# de la URL del swagger.json, que es lo único que varía entre hosts/stages
+SWAGGER_UI_TEMPLATE = '''<!DOCTYPE html>
 <html lang="es">
 <head>
   <meta charset="UTF-8">
@@ -18,19 +107,19 @@ def serve_swagger_ui(event, context):
   <link rel="stylesheet"
       href="https://unpkg.com/swagger-ui-dist@5.10.3/swagger-ui.css"/>
   <style>
-    .swagger-ui .topbar {{ display: none; }}
-    .swagger-ui .info {{ margin: 50px 0; }}
-    .swagger-ui .info .title {{ color: #3b4151; }}
-    .swagger-ui .scheme-container {{ background: #fff; }}
+    .swagger-ui .topbar { display: none; }
+    .swagger-ui .info { margin: 50px 0; }
+    .swagger-ui .info .title { color: #3b4151; }
+    .swagger-ui .scheme-container { background: #fff; }
   </style>
 </head>
 <body>
   <div id="swagger-ui"></div>
   <script src="https://unpkg.com/swagger-ui-dist@5.10.3/swagger-ui-bundle.js"></script>
   <script>
-    window.onload = function() {{
-      const ui = SwaggerUIBundle({{
-        url: '{swagger_json_url}',
+    window.onload = function() {
+      const ui = SwaggerUIBundle({
+        url: __SWAGGER_JSON_URL__,
         dom_id: '#swagger-ui',
         deepLinking: true,
         presets: [
@@ -48,68 +137,68 @@ def serve_swagger_ui(event, context):
         tagsSorter: "alpha",
         filter: true,
         supportedSubmitMethods: ['get', 'post', 'put', 'delete', 'patch'],
-        requestInterceptor: function(request) {{
+        requestInterceptor: function(request) {
           const token = localStorage.getItem('authToken');
-          if (token) {{
+          if (token) {
             request.headers['Authorization'] = 'Bearer ' + token;
-          }}
+          }
           return request;
-        }},
-        responseInterceptor: function(response) {{
+        },
+        responseInterceptor: function(response) {
           console.log('Response intercepted:', response);
           return response;
-        }},
-        onComplete: function() {{
+        },
+        onComplete: function() {
           console.log('Swagger UI loaded successfully');
           
           // Configurar autorización si existe token
           const savedToken = localStorage.getItem('authToken');
-          if (savedToken) {{
+          if (savedToken) {
             ui.preauthorizeApiKey('bearerAuth', 'Bearer ' + savedToken);
-          }}
-        }},
-        onFailure: function(error) {{
+          }
+        },
+        onFailure: function(error) {
           console.error('Error loading Swagger UI:', error);
-        }}
-      }});
+        }
+      });
       
       window.ui = ui;
       
-      window.setAuthToken = function(token) {{
-        if (!token || token.trim() === '') {{
+      window.setAuthToken = function(token) {
+        if (!token || token.trim() === '') {
           alert('Por favor ingresa un token válido');
           return;
-        }}
+        }
         
         localStorage.setItem('authToken', token);
         ui.preauthorizeApiKey('bearerAuth', 'Bearer ' + token);
         
         // Actualizar el campo de entrada
         const tokenInput = document.getElementById('jwtToken');
-        if (tokenInput) {{
+        if (tokenInput) {
           tokenInput.value = token;
-        }}
+        }
         
         alert('Token de autorización establecido correctamente');
-      }};
+      };
       
-      window.clearAuthToken = function() {{
+      window.clearAuthToken = function() {
         localStorage.removeItem('authToken');
         
         // Limpiar el campo de entrada
         const tokenInput = document.getElementById('jwtToken');
-        if (tokenInput) {{
+        if (tokenInput) {
           tokenInput.value = '';
-        }}
+        }
         
         // Recargar la página para limpiar la autorización
         location.reload();
-      }};
+      };
       
       // Agregar la sección de configuración de token después de que se cargue
-      setTimeout(function() {{
+      setTimeout(function() {
         const infoDiv = document.querySelector('.info');
-        if (infoDiv && !document.getElementById('token-config')) {{
+        if (infoDiv && !document.getElementById('token-config')) {
           const savedToken = localStorage.getItem('authToken');
           const tokenDiv = document.createElement('div');
           tokenDiv.id = 'token-config';
@@ -124,7 +213,7 @@ def serve_swagger_ui(event, context):
                   type="text" 
                   id="jwtToken" 
                   placeholder="Ingresa tu token JWT aquí..." 
-                  value="${{savedToken || ''}}"
+                  value="${savedToken || ''}"
                   style="flex: 1; min-width: 300px; padding: 8px 12px; border: 1px solid #ddd; border-radius: 4px; font-size: 14px;"
                 >
                 <button 
@@ -141,35 +230,54 @@ def serve_swagger_ui(event, context):
                 </button>
               </div>
               <div style="margin-top: 10px; font-size: 12px; color: #6c757d;">
-                <strong>Estado:</strong> <span id="token-status">${{savedToken ? 'Token configurado ✅' : 'Sin token configurado ❌'}}</span>
+                <strong>Estado:</strong> <span id="token-status">${savedToken ? 'Token configurado ✅' : 'Sin token configurado ❌'}</span>
               </div>
             </div>
           `;
           infoDiv.appendChild(tokenDiv);
-        }}
-      }}, 1500);
-    }};
+        }
+      }, 1500);
+    };
   </script>
 </body>
 </html>'''
+SWAGGER_UI_PREFIJO, SWAGGER_UI_SUFIJO = SWAGGER_UI_TEMPLATE.split('__SWAGGER_JSON_URL__')
+
+# Páginas renderizadas por (host, stage); el contenido solo cambia con un despliegue
+UI_CACHE_CONTROL = 'public, max-age=300'
+UI_LAST_MODIFIED_TS = int(time.time())
+UI_LAST_MODIFIED = formatdate(UI_LAST_MODIFIED_TS, usegmt=True)
+ui_cache = CacheLRU(32)
+
+def renderizar_swagger_ui(swagger_json_url):
+    """Inserta la URL (como literal JS seguro) en la plantilla precompilada"""
+    url_js = json.dumps(swagger_json_url).replace('<', '\\u003c')
+    return f"{SWAGGER_UI_PREFIJO}{url_js}{SWAGGER_UI_SUFIJO}"
+
+def serve_swagger_ui(event, context):
+    """Sirve la interfaz de Swagger UI"""
+    try:
+        # Obtener la URL base de la API desde el evento
+        headers = event.get('headers') or {}
+        host = obtener_header(headers, 'Host') or 'localhost'
+        stage = (event.get('requestContext') or {}).get('stage', 'dev')
         
-        # Formato de respuesta para lambda-proxy
-        response = {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'text/html; charset=utf-8',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            },
-            'body': html,
-            'isBase64Encoded': False
-        }
+        clave = (host, stage)
+        representacion = ui_cache.obtener(clave)
+        if representacion is None:
+            swagger_json_url = f"https://{host}/{stage}/swagger.json"
+            representacion = construir_representacion(renderizar_swagger_ui(swagger_json_url))
+            ui_cache.guardar(clave, representacion)
         
-        return response
+        # Formato de respuesta para lambda-proxy
+        return respuesta_condicional(headers, representacion, {
+            'Content-Type': 'text/html; charset=utf-8',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+            'Access-Control-Allow-Methods': 'GET,OPTIONS',
+            'Cache-Control': UI_CACHE_CONTROL,
+            'Last-Modified': UI_LAST_MODIFIED
+        }, UI_LAST_MODIFIED_TS)
         
     except Exception as e:
         print(f"Error sirviendo Swagger UI: {str(e)}")
@@ -191,515 +299,964 @@ def serve_swagger_ui(event, context):
         
         return error_response
 
-def get_swagger_json(event, context):
-    """Retorna la especificación OpenAPI/Swagger en formato JSON"""
-    try:
-        # Obtener la URL base de la API
-        headers = event.get('headers', {})
-        host = headers.get('Host') or headers.get('host', 'localhost')
-        stage = event.get('requestContext', {}).get('stage', 'dev')
-        base_url = f"https://{host}/{stage}"
-        
-        # Especificación OpenAPI 3.0.0 - Corregida y simplificada
-        swagger_spec = {
-            "openapi": "3.1.0",
-            "info": {
-                "title": "API Compras - Microservicio Multi-tenant",
-                "version": "1.0.0",
-                "description": "Microservicio para gestión de compras con soporte multi-tenant usando AWS Lambda y DynamoDB."
-            },
-            "servers": [
-                {
-                    "url": base_url,
-                    "description": "Servidor de desarrollo"
+def construir_spec(base_url):
+    """Construye la especificación OpenAPI para la URL base indicada"""
+    # Especificación OpenAPI 3.0.0 - Corregida y simplificada
+    return {
+        "openapi": "3.1.0",
+        "info": {
+            "title": "API Compras - Microservicio Multi-tenant",
+            "version": "1.0.0",
+            "description": "Microservicio para gestión de compras con soporte multi-tenant usando AWS Lambda y DynamoDB."
+        },
+        "servers": [
+            {
+                "url": base_url,
+                "description": "Servidor de desarrollo"
+            }
+        ],
+        "components": {
+            "securitySchemes": {
+                "bearerAuth": {
+                    "type": "http",
+                    "scheme": "bearer",
+                    "bearerFormat": "JWT"
                 }
-            ],
-            "components": {
-                "securitySchemes": {
-                    "bearerAuth": {
-                        "type": "http",
-                        "scheme": "bearer",
-                        "bearerFormat": "JWT"
+            },
+            "schemas": {
+                "Producto": {
+                    "type": "object",
+                    "required": ["codigo", "nombre", "precio", "cantidad"],
+                    "properties": {
+                        "codigo": {
+                            "type": "string",
+                            "description": "Código del producto",
+                            "example": "MED-ABC123-DEF456"
+                        },
+                        "nombre": {
+                            "type": "string",
+                            "description": "Nombre del producto",
+                            "example": "Paracetamol 500mg"
+                        },
+                        "precio": {
+                            "type": "number",
+                            "format": "float",
+                            "description": "Precio unitario",
+                            "example": 12.50
+                        },
+                        "cantidad": {
+                            "type": "integer",
+                            "description": "Cantidad comprada",
+                            "example": 2
+                        }
                     }
                 },
-                "schemas": {
-                    "Producto": {
-                        "type": "object",
-                        "required": ["codigo", "nombre", "precio", "cantidad"],
-                        "properties": {
-                            "codigo": {
-                                "type": "string",
-                                "description": "Código del producto",
-                                "example": "MED-ABC123-DEF456"
+                "CompraRequest": {
+                    "type": "object",
+                    "required": ["productos"],
+                    "properties": {
+                        "productos": {
+                            "type": "array",
+                            "items": {
+                                "$ref": "#/components/schemas/Producto"
+                            }
+                        },
+                        "metodo_pago": {
+                            "type": "string",
+                            "description": "Método de pago utilizado",
+                            "example": "tarjeta"
+                        },
+                        "direccion_entrega": {
+                            "type": "string",
+                            "description": "Dirección de entrega",
+                            "example": "Av. Siempre Viva 123, Lima"
+                        },
+                        "observaciones": {
+                            "type": "string",
+                            "description": "Observaciones adicionales",
+                            "example": "Entregar en horario de oficina"
+                        }
+                    }
+                },
+                "Compra": {
+                    "type": "object",
+                    "properties": {
+                        "tenant_id": {
+                            "type": "string",
+                            "description": "ID del tenant"
+                        },
+                        "codigo_compra": {
+                            "type": "string",
+                            "description": "Código único de la compra",
+                            "example": "COM-1718123456-A7B9C2D4"
+                        },
+                        "email_usuario": {
+                            "type": "string",
+                            "format": "email",
+                            "description": "Email del usuario"
+                        },
+                        "nombre_usuario": {
+                            "type": "string",
+                            "description": "Nombre del usuario"
+                        },
+                        "productos": {
+                            "type": "array",
+                            "items": {
+                                "$ref": "#/components/schemas/Producto"
+                            }
+                        },
+                        "total_productos": {
+                            "type": "integer",
+                            "description": "Total de productos comprados"
+                        },
+                        "total_monto": {
+                            "type": "number",
+                            "format": "float",
+                            "description": "Monto total de la compra"
+                        },
+                        "fecha_compra": {
+                            "type": "string",
+                            "format": "date-time",
+                            "description": "Fecha y hora de la compra"
+                        },
+                        "estado": {
+                            "type": "string",
+                            "enum": ["completada", "pendiente", "cancelada"],
+                            "description": "Estado actual de la compra"
+                        },
+                        "metodo_pago": {
+                            "type": "string",
+                            "description": "Método de pago utilizado"
+                        },
+                        "direccion_entrega": {
+                            "type": "string",
+                            "description": "Dirección de entrega"
+                        },
+                        "observaciones": {
+                            "type": "string",
+                            "description": "Observaciones adicionales"
+                        }
+                    }
+                },
+                "CompraResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {
+                            "type": "string",
+                            "example": "Compra registrada exitosamente"
+                        },
+                        "compra": {
+                            "$ref": "#/components/schemas/Compra"
+                        }
+                    }
+                },
+                "ListaComprasResponse": {
+                    "type": "object",
+                    "properties": {
+                        "compras": {
+                            "type": "array",
+                            "items": {
+                                "$ref": "#/components/schemas/Compra"
+                            }
+                        },
+                        "count": {
+                            "type": "integer",
+                            "description": "Número de compras devueltas"
+                        },
+                        "nextKey": {
+                            "type": "string",
+                            "nullable": True,
+                            "description": "Cursor para solicitar la siguiente página (parámetro lastKey)"
+                        },
+                        "hasMore": {
+                            "type": "boolean",
+                            "description": "Indica si hay más resultados"
+                        }
+                    }
+                },
+                "EstadisticasResponse": {
+                    "type": "object",
+                    "properties": {
+                        "total_compras": {
+                            "type": "integer",
+                            "description": "Total de compras realizadas"
+                        },
+                        "total_gastado": {
+                            "type": "number",
+                            "format": "float",
+                            "description": "Total gastado en compras"
+                        },
+                        "total_productos_comprados": {
+                            "type": "integer",
+                            "description": "Total de productos comprados"
+                        },
+                        "promedio_por_compra": {
+                            "type": "number",
+                            "format": "float",
+                            "description": "Promedio gastado por compra"
+                        },
+                        "primera_compra": {
+                            "type": "string",
+                            "format": "date-time",
+                            "description": "Fecha de la primera compra"
+                        },
+                        "ultima_compra": {
+                            "type": "string",
+                            "format": "date-time",
+                            "description": "Fecha de la última compra"
+                        }
+                    }
+                },
+                "BusquedaMultipleResponse": {
+                    "type": "object",
+                    "properties": {
+                        "compras": {
+                            "type": "array",
+                            "items": {
+                                "$ref": "#/components/schemas/Compra"
                             },
-                            "nombre": {
+                            "description": "Compras encontradas, en el orden pedido"
+                        },
+                        "no_encontrados": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Códigos inexistentes o de otro usuario"
+                        },
+                        "no_procesados": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Códigos que DynamoDB no devolvió tras los reintentos"
+                        },
+                        "total": {
+                            "type": "integer",
+                            "example": 2
+                        }
+                    }
+                },
+                "TopProductosResponse": {
+                    "type": "object",
+                    "properties": {
+                        "desde": {"type": "string", "format": "date"},
+                        "hasta": {"type": "string", "format": "date"},
+                        "orden": {"type": "string", "example": "monto"},
+                        "productos": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "codigo": {"type": "string", "example": "MED-001"},
+                                    "nombre": {"type": "string", "example": "Paracetamol 500mg"},
+                                    "unidades": {"type": "number", "example": 120},
+                                    "monto": {"type": "number", "example": 1020.0}
+                                }
+                            }
+                        },
+                        "serie": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "dia": {"type": "string", "format": "date"},
+                                    "compras": {"type": "integer", "example": 14},
+                                    "unidades": {"type": "number", "example": 52},
+                                    "monto": {"type": "number", "example": 640.5}
+                                }
+                            }
+                        },
+                        "total": {
+                            "type": "object",
+                            "properties": {
+                                "compras": {"type": "integer"},
+                                "unidades": {"type": "number"},
+                                "monto": {"type": "number"}
+                            }
+                        }
+                    }
+                },
+                "ErrorResponse": {
+                    "type": "object",
+                    "properties": {
+                        "error": {
+                            "type": "string",
+                            "description": "Mensaje de error"
+                        },
+                        "message": {
+                            "type": "string",
+                            "description": "Descripción detallada del error"
+                        }
+                    }
+                }
+            }
+        },
+        "security": [
+            {
+                "bearerAuth": []
+            }
+        ],
+        "paths": {
+            "/compras/registrar": {
+                "post": {
+                    "summary": "Registrar nueva compra",
+                    "description": "Registra una nueva compra con múltiples productos",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "parameters": [
+                        {
+                            "name": "Idempotency-Key",
+                            "in": "header",
+                            "description": "Clave única por intento de compra; los reintentos con la misma clave repiten la respuesta guardada (header Idempotent-Replayed) sin registrar otra compra",
+                            "required": False,
+                            "schema": {
                                 "type": "string",
-                                "description": "Nombre del producto",
-                                "example": "Paracetamol 500mg"
-                            },
-                            "precio": {
-                                "type": "number",
-                                "format": "float",
-                                "description": "Precio unitario",
-                                "example": 12.50
-                            },
-                            "cantidad": {
-                                "type": "integer",
-                                "description": "Cantidad comprada",
-                                "example": 2
+                                "maxLength": 255,
+                                "example": "8f14e45f-ceea-4c6e-9f3a-2b1f0c7d9a10"
                             }
                         }
-                    },
-                    "CompraRequest": {
-                        "type": "object",
-                        "required": ["productos"],
-                        "properties": {
-                            "productos": {
-                                "type": "array",
-                                "items": {
-                                    "$ref": "#/components/schemas/Producto"
+                    ],
+                    "requestBody": {
+                        "required": True,
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/CompraRequest"
+                                },
+                                "example": {
+                                    "productos": [
+                                        {
+                                            "codigo": "MED-ABC123-DEF456",
+                                            "nombre": "Paracetamol 500mg",
+                                            "precio": 12.50,
+                                            "cantidad": 2
+                                        }
+                                    ],
+                                    "metodo_pago": "tarjeta",
+                                    "direccion_entrega": "Av. Siempre Viva 123, Lima",
+                                    "observaciones": "Entregar en horario de oficina"
                                 }
-                            },
-                            "metodo_pago": {
-                                "type": "string",
-                                "description": "Método de pago utilizado",
-                                "example": "tarjeta"
-                            },
-                            "direccion_entrega": {
-                                "type": "string",
-                                "description": "Dirección de entrega",
-                                "example": "Av. Siempre Viva 123, Lima"
-                            },
-                            "observaciones": {
-                                "type": "string",
-                                "description": "Observaciones adicionales",
-                                "example": "Entregar en horario de oficina"
                             }
                         }
                     },
-                    "Compra": {
-                        "type": "object",
-                        "properties": {
-                            "tenant_id": {
-                                "type": "string",
-                                "description": "ID del tenant"
-                            },
-                            "codigo_compra": {
-                                "type": "string",
-                                "description": "Código único de la compra",
-                                "example": "COM-1718123456-A7B9C2D4"
-                            },
-                            "email_usuario": {
-                                "type": "string",
-                                "format": "email",
-                                "description": "Email del usuario"
-                            },
-                            "nombre_usuario": {
-                                "type": "string",
-                                "description": "Nombre del usuario"
-                            },
-                            "productos": {
-                                "type": "array",
-                                "items": {
-                                    "$ref": "#/components/schemas/Producto"
+                    "responses": {
+                        "201": {
+                            "description": "Compra registrada exitosamente",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/CompraResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "400": {
+                            "description": "Datos inválidos",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "409": {
+                            "description": "Solicitud con la misma Idempotency-Key en curso",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "422": {
+                            "description": "Idempotency-Key ya usada con otro contenido",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
                                 }
-                            },
-                            "total_productos": {
-                                "type": "integer",
-                                "description": "Total de productos comprados"
-                            },
-                            "total_monto": {
-                                "type": "number",
-                                "format": "float",
-                                "description": "Monto total de la compra"
-                            },
-                            "fecha_compra": {
-                                "type": "string",
-                                "format": "date-time",
-                                "description": "Fecha y hora de la compra"
-                            },
-                            "estado": {
-                                "type": "string",
-                                "enum": ["completada", "pendiente", "cancelada"],
-                                "description": "Estado actual de la compra"
-                            },
-                            "metodo_pago": {
-                                "type": "string",
-                                "description": "Método de pago utilizado"
-                            },
-                            "direccion_entrega": {
-                                "type": "string",
-                                "description": "Dirección de entrega"
-                            },
-                            "observaciones": {
-                                "type": "string",
-                                "description": "Observaciones adicionales"
                             }
                         }
-                    },
-                    "CompraResponse": {
-                        "type": "object",
-                        "properties": {
-                            "message": {
-                                "type": "string",
-                                "example": "Compra registrada exitosamente"
-                            },
-                            "compra": {
-                                "$ref": "#/components/schemas/Compra"
+                    }
+                }
+            },
+            "/compras/registrar-lote": {
+                "post": {
+                    "summary": "Registrar lote de compras",
+                    "description": "Registra hasta 500 compras en una sola llamada (BatchWriteItem) y devuelve el resultado de cada una",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "requestBody": {
+                        "required": True,
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "required": ["compras"],
+                                    "properties": {
+                                        "compras": {
+                                            "type": "array",
+                                            "maxItems": 500,
+                                            "items": {
+                                                "$ref": "#/components/schemas/CompraRequest"
+                                            }
+                                        }
+                                    }
+                                }
                             }
                         }
                     },
-                    "ListaComprasResponse": {
-                        "type": "object",
-                        "properties": {
-                            "compras": {
-                                "type": "array",
-                                "items": {
-                                    "$ref": "#/components/schemas/Compra"
+                    "responses": {
+                        "201": {
+                            "description": "Todas las compras registradas"
+                        },
+                        "207": {
+                            "description": "Algunas compras no se registraron; ver resultados"
+                        },
+                        "400": {
+                            "description": "Lote inválido",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
                                 }
-                            },
-                            "count": {
-                                "type": "integer",
-                                "description": "Número de compras devueltas"
-                            },
-                            "hasMore": {
-                                "type": "boolean",
-                                "description": "Indica si hay más resultados"
                             }
                         }
-                    },
-                    "EstadisticasResponse": {
-                        "type": "object",
-                        "properties": {
-                            "total_compras": {
-                                "type": "integer",
-                                "description": "Total de compras realizadas"
-                            },
-                            "total_gastado": {
-                                "type": "number",
-                                "format": "float",
-                                "description": "Total gastado en compras"
-                            },
-                            "total_productos_comprados": {
+                    }
+                }
+            },
+            "/compras/listar": {
+                "get": {
+                    "summary": "Listar compras del usuario",
+                    "description": "Obtiene lista paginada de compras del usuario autenticado",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "parameters": [
+                        {
+                            "name": "limit",
+                            "in": "query",
+                            "description": "Número de compras por página",
+                            "required": False,
+                            "schema": {
                                 "type": "integer",
-                                "description": "Total de productos comprados"
-                            },
-                            "promedio_por_compra": {
-                                "type": "number",
-                                "format": "float",
-                                "description": "Promedio gastado por compra"
-                            },
-                            "primera_compra": {
+                                "default": 10,
+                                "maximum": 100
+                            }
+                        },
+                        {
+                            "name": "lastKey",
+                            "in": "query",
+                            "description": "Cursor nextKey devuelto por la página anterior",
+                            "required": False,
+                            "schema": {
+                                "type": "string"
+                            }
+                        },
+                        {
+                            "name": "fields",
+                            "in": "query",
+                            "description": "Atributos a devolver, separados por coma (solo esos se leen de DynamoDB)",
+                            "required": False,
+                            "schema": {
                                 "type": "string",
-                                "format": "date-time",
-                                "description": "Fecha de la primera compra"
-                            },
-                            "ultima_compra": {
+                                "example": "codigo_compra,fecha_compra,total_monto,estado"
+                            }
+                        },
+                        {
+                            "name": "vista",
+                            "in": "query",
+                            "description": "resumen: codigo_compra, fecha_compra, total_monto, total_productos y estado. Se ignora si se envía fields",
+                            "required": False,
+                            "schema": {
                                 "type": "string",
-                                "format": "date-time",
-                                "description": "Fecha de la última compra"
+                                "enum": ["completa", "resumen"],
+                                "default": "completa"
+                            }
+                        },
+                        {
+                            "name": "tenant_id",
+                            "in": "query",
+                            "description": "ID del tenant",
+                            "required": False,
+                            "schema": {
+                                "type": "string"
                             }
                         }
-                    },
-                    "ErrorResponse": {
-                        "type": "object",
-                        "properties": {
-                            "error": {
-                                "type": "string",
-                                "description": "Mensaje de error"
-                            },
-                            "message": {
-                                "type": "string",
-                                "description": "Descripción detallada del error"
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "Lista de compras obtenida exitosamente",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ListaComprasResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
                             }
                         }
                     }
                 }
             },
-            "security": [
-                {
-                    "bearerAuth": []
-                }
-            ],
-            "paths": {
-                "/compras/registrar": {
-                    "post": {
-                        "summary": "Registrar nueva compra",
-                        "description": "Registra una nueva compra con múltiples productos",
-                        "tags": ["Compras"],
-                        "security": [{"bearerAuth": []}],
-                        "requestBody": {
+            "/compras/buscar/{codigo}": {
+                "get": {
+                    "summary": "Buscar compra por código",
+                    "description": "Busca una compra específica por su código único",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "parameters": [
+                        {
+                            "name": "codigo",
+                            "in": "path",
+                            "description": "Código único de la compra",
                             "required": True,
+                            "schema": {
+                                "type": "string",
+                                "example": "COM-1718123456-A7B9C2D4"
+                            }
+                        }
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "Compra encontrada",
                             "content": {
                                 "application/json": {
                                     "schema": {
-                                        "$ref": "#/components/schemas/CompraRequest"
-                                    },
-                                    "example": {
-                                        "productos": [
-                                            {
-                                                "codigo": "MED-ABC123-DEF456",
-                                                "nombre": "Paracetamol 500mg",
-                                                "precio": 12.50,
-                                                "cantidad": 2
+                                        "type": "object",
+                                        "properties": {
+                                            "compra": {
+                                                "$ref": "#/components/schemas/Compra"
                                             }
-                                        ],
-                                        "metodo_pago": "tarjeta",
-                                        "direccion_entrega": "Av. Siempre Viva 123, Lima",
-                                        "observaciones": "Entregar en horario de oficina"
+                                        }
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "201": {
-                                "description": "Compra registrada exitosamente",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/CompraResponse"
-                                        }
+                        "404": {
+                            "description": "Compra no encontrada",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "400": {
-                                "description": "Datos inválidos",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Token inválido o faltante",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "500": {
-                                "description": "Error interno del servidor",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        }
+                    }
+                }
+            },
+            "/compras/buscar": {
+                "get": {
+                    "summary": "Buscar varias compras por código",
+                    "description": "Busca hasta 200 compras del usuario en una sola llamada (BatchGetItem en bloques de 100)",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "parameters": [
+                        {
+                            "name": "codigos",
+                            "in": "query",
+                            "description": "Códigos de compra separados por coma",
+                            "required": True,
+                            "schema": {
+                                "type": "string",
+                                "example": "COM-1718123456-A7B9C2D4,COM-1718123456-B1C2D3E4"
+                            }
+                        }
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "Compras encontradas",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/BusquedaMultipleResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "207": {
+                            "description": "Algunos códigos no se procesaron tras los reintentos; ver no_procesados"
+                        },
+                        "400": {
+                            "description": "Códigos faltantes o excedidos",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
                 },
-                "/compras/listar": {
-                    "get": {
-                        "summary": "Listar compras del usuario",
-                        "description": "Obtiene lista paginada de compras del usuario autenticado",
-                        "tags": ["Compras"],
-                        "security": [{"bearerAuth": []}],
-                        "parameters": [
-                            {
-                                "name": "limit",
-                                "in": "query",
-                                "description": "Número de compras por página",
-                                "required": False,
+                "post": {
+                    "summary": "Buscar varias compras por código (body)",
+                    "description": "Igual que GET /compras/buscar, con los códigos en el body",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "requestBody": {
+                        "required": True,
+                        "content": {
+                            "application/json": {
                                 "schema": {
-                                    "type": "integer",
-                                    "default": 10
+                                    "type": "object",
+                                    "required": ["codigos"],
+                                    "properties": {
+                                        "codigos": {
+                                            "type": "array",
+                                            "maxItems": 200,
+                                            "items": {"type": "string"}
+                                        }
+                                    }
                                 }
-                            },
-                            {
-                                "name": "tenant_id",
-                                "in": "query",
-                                "description": "ID del tenant",
-                                "required": False,
-                                "schema": {
-                                    "type": "string"
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Compras encontradas",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/BusquedaMultipleResponse"
+                                    }
                                 }
                             }
-                        ],
-                        "responses": {
-                            "200": {
-                                "description": "Lista de compras obtenida exitosamente",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ListaComprasResponse"
-                                        }
+                        },
+                        "207": {
+                            "description": "Algunos códigos no se procesaron tras los reintentos; ver no_procesados"
+                        },
+                        "400": {
+                            "description": "Códigos faltantes o excedidos",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Token inválido o faltante",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "500": {
-                                "description": "Error interno del servidor",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/compras/buscar/{codigo}": {
-                    "get": {
-                        "summary": "Buscar compra por código",
-                        "description": "Busca una compra específica por su código único",
-                        "tags": ["Compras"],
-                        "security": [{"bearerAuth": []}],
-                        "parameters": [
-                            {
-                                "name": "codigo",
-                                "in": "path",
-                                "description": "Código único de la compra",
-                                "required": True,
-                                "schema": {
-                                    "type": "string",
-                                    "example": "COM-1718123456-A7B9C2D4"
-                                }
-                            }
-                        ],
-                        "responses": {
-                            "200": {
-                                "description": "Compra encontrada",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "type": "object",
-                                            "properties": {
-                                                "compra": {
-                                                    "$ref": "#/components/schemas/Compra"
-                                                }
-                                            }
-                                        }
+                }
+            },
+            "/compras/productos/top": {
+                "get": {
+                    "summary": "Productos más vendidos del tenant",
+                    "description": "Ranking de productos y serie de ventas diarias entre dos fechas, desde los acumulados diarios mantenidos por el stream",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "parameters": [
+                        {
+                            "name": "desde",
+                            "in": "query",
+                            "description": "Primer día (YYYY-MM-DD); por defecto 29 días antes de hasta",
+                            "required": False,
+                            "schema": {
+                                "type": "string",
+                                "format": "date"
+                            }
+                        },
+                        {
+                            "name": "hasta",
+                            "in": "query",
+                            "description": "Último día (YYYY-MM-DD); por defecto hoy (UTC)",
+                            "required": False,
+                            "schema": {
+                                "type": "string",
+                                "format": "date"
+                            }
+                        },
+                        {
+                            "name": "top",
+                            "in": "query",
+                            "description": "Cantidad de productos",
+                            "required": False,
+                            "schema": {
+                                "type": "integer",
+                                "default": 10,
+                                "maximum": 100
+                            }
+                        },
+                        {
+                            "name": "orden",
+                            "in": "query",
+                            "description": "Criterio del ranking",
+                            "required": False,
+                            "schema": {
+                                "type": "string",
+                                "enum": ["monto", "unidades"],
+                                "default": "monto"
+                            }
+                        }
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "Ranking y serie obtenidos",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/TopProductosResponse"
                                     }
                                 }
-                            },
-                            "404": {
-                                "description": "Compra no encontrada",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "400": {
+                            "description": "Parámetros inválidos",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Token inválido o faltante",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "500": {
-                                "description": "Error interno del servidor",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "403": {
+                            "description": "El token no tiene el rol de reportes",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/compras/estadisticas": {
-                    "get": {
-                        "summary": "Obtener estadísticas de compras",
-                        "description": "Obtiene estadísticas completas de compras del usuario autenticado",
-                        "tags": ["Compras"],
-                        "security": [{"bearerAuth": []}],
-                        "responses": {
-                            "200": {
-                                "description": "Estadísticas obtenidas exitosamente",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/EstadisticasResponse"
-                                        }
+                }
+            },
+            "/compras/estadisticas": {
+                "get": {
+                    "summary": "Obtener estadísticas de compras",
+                    "description": "Obtiene estadísticas completas de compras del usuario autenticado",
+                    "tags": ["Compras"],
+                    "security": [{"bearerAuth": []}],
+                    "responses": {
+                        "200": {
+                            "description": "Estadísticas obtenidas exitosamente",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/EstadisticasResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Token inválido o faltante",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Token inválido o faltante",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "500": {
-                                "description": "Error interno del servidor",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "500": {
+                            "description": "Error interno del servidor",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
                 }
+            }
+        },
+        "tags": [
+            {
+                "name": "Compras",
+                "description": "Operaciones relacionadas con la gestión de compras"
+            }
+        ]
+    }
+
+def representacion_spec(host, stage):
+    """Spec serializada (texto, gzip y ETag) calculada una vez por (host, stage)"""
+    clave = (host, stage)
+    representacion = spec_cache.obtener(clave)
+    if representacion is not None:
+        return representacion
+    
+    # Convertir a JSON con manejo de errores
+    try:
+        json_response = json.dumps(construir_spec(f"https://{host}/{stage}"), ensure_ascii=False, separators=(',', ':'))
+    except Exception as json_error:
+        print(f"Error al convertir a JSON: {str(json_error)}")
+        # Fallback a especificación mínima (no se guarda en cache)
+        minimal_spec = {
+            "openapi": "3.0.0",
+            "info": {
+                "title": "API Compras",
+                "version": "1.0.0"
             },
-            "tags": [
-                {
-                    "name": "Compras",
-                    "description": "Operaciones relacionadas con la gestión de compras"
-                }
-            ]
+            "paths": {}
         }
+        return {'body': json.dumps(minimal_spec, ensure_ascii=False), 'etag': None, 'gzip': None}
+    
+    representacion = construir_representacion(json_response)
+    spec_cache.guardar(clave, representacion)
+    return representacion
+
+def get_swagger_json(event, context):
+    """Retorna la especificación OpenAPI/Swagger en formato JSON"""
+    try:
+        # Obtener la URL base de la API
+        headers = event.get('headers') or {}
+        host = obtener_header(headers, 'Host') or 'localhost'
+        stage = (event.get('requestContext') or {}).get('stage', 'dev')
         
-        # Convertir a JSON con manejo de errores
-        try:
-            json_response = json.dumps(swagger_spec, ensure_ascii=False, separators=(',', ':'))
-        except Exception as json_error:
-            print(f"Error al convertir a JSON: {str(json_error)}")
-            # Fallback a especificación mínima
-            minimal_spec = {
-                "openapi": "3.0.0",
-                "info": {
-                    "title": "API Compras",
-                    "version": "1.0.0"
-                },
-                "paths": {}
-            }
-            json_response = json.dumps(minimal_spec, ensure_ascii=False)
+        representacion = representacion_spec(host, stage)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json; charset=utf-8',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS'
-            },
-            'body': json_response,
-            'isBase64Encoded': False
+        response_headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+            'Access-Control-Allow-Methods': 'GET,OPTIONS'
         }
         
+        if representacion['etag'] is None:
+            return {
+                'statusCode': 200,
+                'headers': response_headers,
+                'body': representacion['body'],
+                'isBase64Encoded': False
+            }
+        
+        response_headers['Cache-Control'] = SPEC_CACHE_CONTROL
+        return respuesta_condicional(headers, representacion, response_headers)
+        
     except Exception as e:
         print(f"Error generando Swagger JSON: {str(e)}")
         import traceback
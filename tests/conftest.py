@@ -0,0 +1,170 @@
+import json
+import os
+import re
+import sys
+import time
+
+import jwt
+import pytest
+
+# Entorno mínimo para importar los handlers fuera de AWS
+os.environ.setdefault('TABLE_NAME', 'test-t_compras')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('METRICAS_HABILITADAS', 'false')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compras  # noqa: E402
+import dynamo  # noqa: E402
+import estadisticas  # noqa: E402
+from repositorio import RepositorioMemoria  # noqa: E402
+
+class CondicionFallida(Exception):
+    """Error con el código de DynamoDB de una condición no cumplida"""
+
+    def __init__(self, codigo):
+        super().__init__(codigo)
+        self.response = {'Error': {'Code': codigo}}
+
+def cumple(item, condicion, valores):
+    """Evalúa las condiciones que usa estadisticas.py (attribute_not_exists, =, <, > unidos por OR)"""
+    if not condicion:
+        return True
+    for termino in condicion.split(' OR '):
+        termino = termino.strip()
+        ausente = re.match(r'attribute_not_exists\((\w+)\)$', termino)
+        if ausente:
+            if ausente.group(1) not in item:
+                return True
+            continue
+        atributo, operador, valor = termino.split()
+        if atributo not in item:
+            continue
+        actual, esperado = item[atributo], valores[valor]
+        if (operador == '=' and actual == esperado) or (operador == '<' and actual < esperado) \
+                or (operador == '>' and actual > esperado):
+            return True
+    return False
+
+def actualizar(item, expresion, valores):
+    """Aplica una UpdateExpression con cláusulas SET, ADD y REMOVE"""
+    for clausula, cuerpo in re.findall(r'(SET|ADD|REMOVE) (.*?)(?= SET | ADD | REMOVE |$)', expresion):
+        for parte in cuerpo.split(','):
+            parte = parte.strip()
+            if clausula == 'SET':
+                atributo, valor = [x.strip() for x in parte.split('=')]
+                item[atributo] = valores[valor]
+            elif clausula == 'ADD':
+                atributo, valor = parte.split()
+                item[atributo] = item.get(atributo, 0) + valores[valor]
+            else:
+                item.pop(parte, None)
+
+class TablaAgregados:
+    """Tabla de agregados en memoria con la interfaz de dynamo.Tabla que usa estadisticas.py"""
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.items.get((Key['tenant_id'], Key['clave']))
+        return {'Item': dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeValues=None):
+        clave = (Key['tenant_id'], Key['clave'])
+        item = dict(self.items.get(clave, Key))
+        if not cumple(item, ConditionExpression, ExpressionAttributeValues or {}):
+            raise CondicionFallida('ConditionalCheckFailedException')
+        actualizar(item, UpdateExpression, ExpressionAttributeValues or {})
+        self.items[clave] = item
+        return {}
+
+class ClienteTransacciones:
+    """transact_write_items del cliente de bajo nivel sobre la tabla de agregados en memoria"""
+
+    def __init__(self, agregados):
+        self.agregados = agregados
+
+    def transact_write_items(self, TransactItems):
+        # Todas las condiciones se evalúan antes de escribir (todo o nada)
+        for operacion in TransactItems:
+            tipo, datos = next(iter(operacion.items()))
+            key = dynamo.deserializar_item(datos.get('Key') or datos['Item'])
+            actual = self.agregados.items.get((key['tenant_id'], key['clave']), {})
+            valores = dynamo.deserializar_item(datos.get('ExpressionAttributeValues') or {})
+            if not cumple(actual, datos.get('ConditionExpression'), valores):
+                raise CondicionFallida('TransactionCanceledException')
+
+        for operacion in TransactItems:
+            tipo, datos = next(iter(operacion.items()))
+            if tipo == 'Put':
+                item = dynamo.deserializar_item(datos['Item'])
+                self.agregados.items[(item['tenant_id'], item['clave'])] = item
+            elif tipo == 'Delete':
+                key = dynamo.deserializar_item(datos['Key'])
+                self.agregados.items.pop((key['tenant_id'], key['clave']), None)
+            else:
+                key = dynamo.deserializar_item(datos['Key'])
+                self.agregados.update_item(Key=key, UpdateExpression=datos['UpdateExpression'],
+                                           ExpressionAttributeValues=dynamo.deserializar_item(
+                                               datos['ExpressionAttributeValues']))
+
+class IndiceUsuario:
+    """Índice por usuario en memoria; los tests lo actualizan aparte para simular su consistencia eventual"""
+
+    def __init__(self):
+        self.items = {}
+
+    def poner(self, compra):
+        self.items[compra['codigo_compra']] = compra
+
+    def quitar(self, codigo_compra):
+        self.items.pop(codigo_compra, None)
+
+    def query(self, IndexName, KeyConditionExpression, ExpressionAttributeValues, ProjectionExpression=None,
+              ScanIndexForward=True, Limit=None):
+        tenant_usuario = ExpressionAttributeValues[':tenant_usuario']
+        items = sorted((c for c in self.items.values() if c['tenant_usuario'] == tenant_usuario),
+                       key=lambda c: c['fecha_compra'], reverse=not ScanIndexForward)
+        if ProjectionExpression:
+            campos = [campo.strip() for campo in ProjectionExpression.split(',')]
+            items = [{campo: item[campo] for campo in campos if campo in item} for item in items]
+        return {'Items': items[:Limit]}
+
+@pytest.fixture
+def almacen(monkeypatch):
+    """Agregados, transacciones e índice por usuario en memoria para estadisticas.py"""
+    agregados = TablaAgregados()
+    indice = IndiceUsuario()
+    monkeypatch.setattr(estadisticas, 'agregados_table', agregados)
+    monkeypatch.setattr(estadisticas, 'table', indice)
+    monkeypatch.setattr(dynamo, '_cliente', ClienteTransacciones(agregados))
+    return agregados, indice
+
+def token(email='ana@x.com', tenant_id='inkafarma', nombre='Ana'):
+    """JWT firmado con el secreto del entorno de pruebas"""
+    payload = {'email': email, 'tenant_id': tenant_id, 'nombre': nombre, 'exp': int(time.time()) + 3600}
+    return jwt.encode(payload, os.environ['JWT_SECRET'], algorithm='HS256')
+
+def evento(usuario=None, query=None, body=None, headers=None, **campos):
+    """Evento de la integración lambda (la de las rutas de compras) con el token del usuario"""
+    return {
+        'headers': {'Authorization': f"Bearer {token(**(usuario or {}))}", **(headers or {})},
+        'query': query or {},
+        'path': campos.pop('path', {}),
+        'body': body,
+        **campos
+    }
+
+def respuesta(resultado):
+    """(statusCode, body parseado) de la respuesta de un handler"""
+    return resultado['statusCode'], json.loads(resultado['body'])
+
+@pytest.fixture
+def memoria(monkeypatch):
+    """Handlers de compras sobre el repositorio en memoria, con los caches del contenedor vacíos"""
+    memoria = RepositorioMemoria()
+    monkeypatch.setattr(compras, 'repositorio', memoria)
+    for cache in (compras.compra_cache, compras.version_cache, compras.idempotencia_cache):
+        cache.limpiar()
+    return memoria
@@ -0,0 +1,30 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import codigos
+import compras
+
+USUARIO = {'tenant_id': 'inkafarma', 'email': 'a@x.com', 'nombre': 'Ana'}
+BODY = {'productos': [{'codigo': 'P1', 'nombre': 'Producto', 'precio': '10.00', 'cantidad': 1}]}
+
+def test_codigo_y_fecha_en_utc_con_zona_horaria_local(monkeypatch):
+    # Un host con otra zona horaria (servidor.py) genera los mismos instantes que Lambda
+    monkeypatch.setenv('TZ', 'America/Lima')
+    time.tzset()
+    try:
+        compra, errores = compras.construir_compra(USUARIO, BODY)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    assert errores == []
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    creado = codigos.fecha_de_codigo(compra['codigo_compra'])
+    assert abs(creado - ahora) < timedelta(seconds=5)
+    assert abs(datetime.fromisoformat(compra['fecha_compra']) - creado) < timedelta(milliseconds=1)
+
+def test_rango_de_fechas_incluye_la_compra_recien_creada():
+    compra, _ = compras.construir_compra(USUARIO, BODY)
+    fecha = datetime.fromisoformat(compra['fecha_compra'])
+    rangos = codigos.rangos_codigos(fecha - timedelta(seconds=1), fecha + timedelta(seconds=1))
+    assert any(inicio <= compra['codigo_compra'] <= fin for inicio, fin in rangos)
@@ -0,0 +1,33 @@
+import json
+import zlib
+from decimal import Decimal
+
+import pytest
+
+import compactacion
+import dynamo
+
+def como_dynamo(valor):
+    """El valor tal como lo devuelve una lectura de DynamoDB (números como Decimal)"""
+    return dynamo.deserializar(dynamo.serializar(valor))
+
+@pytest.mark.parametrize('producto', [
+    {'codigo': 'P1', 'nombre': 'Producto', 'precio': Decimal('12.50'), 'cantidad': 2, 'subtotal': Decimal('25.00')},
+    {'codigo': 123, 'nombre': 'Numérico', 'precio': Decimal('1E+2'), 'cantidad': Decimal('3'), 'subtotal': 300},
+    {'codigo': 'P2', 'nombre': None, 'precio': '9.90', 'cantidad': 1, 'subtotal': Decimal('9.90')},
+    {'codigo': 'P3', 'precio': Decimal('1'), 'cantidad': 1, 'descuento': Decimal('0.5'), 'lote': None},
+    {'codigo': '007', 'nombre': 'Con ceros', 'precio': Decimal('0.10'), 'cantidad': 10, 'subtotal': Decimal('1.00')}
+])
+def test_ida_y_vuelta_conserva_tipos(producto):
+    expandido = compactacion.expandir(compactacion.compactar({'codigo_compra': 'C1', 'productos': [producto]}))
+    assert expandido['productos'] == [como_dynamo(producto)]
+    assert {k: type(v) for k, v in expandido['productos'][0].items()} == \
+        {k: type(v) for k, v in como_dynamo(producto).items()}
+
+def test_lee_el_formato_v1():
+    filas = [['P1', 'Producto', '12.50', '2', '25.00']]
+    datos = bytes((1,)) + zlib.compress(json.dumps(filas).encode('utf-8'))
+    assert compactacion.desempaquetar(datos) == [
+        {'codigo': 'P1', 'nombre': 'Producto', 'precio': Decimal('12.50'), 'cantidad': Decimal('2'),
+         'subtotal': Decimal('25.00')}
+    ]
@@ -0,0 +1,42 @@
+from conftest import evento, respuesta
+
+import compras
+
+PRODUCTOS = [{'codigo': 'P1', 'nombre': 'Paracetamol', 'precio': '2.50', 'cantidad': 2}]
+
+def registrar(usuario=None):
+    status, body = respuesta(compras.registrar_compra(evento(usuario, body={'productos': PRODUCTOS}), None))
+    assert status == 201
+    return body['compra']
+
+def test_registrar_no_devuelve_clave_del_indice(memoria):
+    compra = registrar()
+    assert 'tenant_usuario' not in compra
+    # El item guardado conserva la clave del índice por usuario
+    assert memoria.compras[('inkafarma', compra['codigo_compra'])]['tenant_usuario'] == 'inkafarma#ana@x.com'
+
+def test_listar_no_devuelve_clave_del_indice(memoria):
+    registrar()
+    registrar()
+    status, body = respuesta(compras.listar_compras(evento(query={'limit': '1'}), None))
+    assert status == 200
+    assert body['compras'] and all('tenant_usuario' not in compra for compra in body['compras'])
+
+    # El cursor sigue funcionando aunque la respuesta no lleve la clave
+    status, body = respuesta(compras.listar_compras(evento(query={'limit': '1', 'lastKey': body['nextKey']}), None))
+    assert status == 200 and body['count'] == 1
+
+def test_buscar_no_devuelve_clave_del_indice(memoria):
+    codigo = registrar()['codigo_compra']
+    for _ in range(2):  # lectura de la tabla y luego del cache
+        status, body = respuesta(compras.buscar_compra(evento(path={'codigo': codigo}), None))
+        assert status == 200
+        assert body['compra']['codigo_compra'] == codigo and 'tenant_usuario' not in body['compra']
+    assert 'tenant_usuario' in memoria.compras[('inkafarma', codigo)]
+
+def test_buscar_varias_no_devuelve_clave_del_indice(memoria):
+    codigos = [registrar()['codigo_compra'] for _ in range(2)]
+    status, body = respuesta(compras.buscar_compras(evento(query={'codigos': ','.join(codigos)}), None))
+    assert status == 200
+    assert [compra['codigo_compra'] for compra in body['compras']] == codigos
+    assert all('tenant_usuario' not in compra for compra in body['compras'])
@@ -0,0 +1,56 @@
+import base64
+import json
+
+import pytest
+from conftest import evento, respuesta
+
+import compras
+from repositorio import clave_usuario
+
+PROPIO = clave_usuario('inkafarma', 'ana@x.com')
+CLAVE = {'tenant_id': 'inkafarma', 'codigo_compra': 'C1', 'tenant_usuario': PROPIO,
+         'fecha_compra': '2025-06-01T10:00:00'}
+
+def payload(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii').rstrip('=')
+
+def test_cursor_firmado_se_decodifica():
+    token = compras.codificar_cursor(CLAVE)
+    assert compras.decodificar_cursor(token, PROPIO) == CLAVE
+
+@pytest.mark.parametrize('alterar', [
+    # Otra clave con la firma original
+    lambda token: payload({**CLAVE, 'codigo_compra': 'C2'}) + '.' + token.split('.')[1],
+    # Firma modificada o ausente
+    lambda token: token[:-2] + ('AA' if not token.endswith('AA') else 'BB'),
+    lambda token: token.split('.')[0],
+    # No es un cursor
+    lambda token: 'no-es-un-cursor',
+])
+def test_cursor_alterado_se_rechaza(alterar):
+    with pytest.raises(ValueError, match='lastKey'):
+        compras.decodificar_cursor(alterar(compras.codificar_cursor(CLAVE)), PROPIO)
+
+def test_cursor_de_otro_usuario_o_tenant_se_rechaza():
+    for ajeno in (clave_usuario('inkafarma', 'beto@x.com'), clave_usuario('mifarma', 'ana@x.com')):
+        token = compras.codificar_cursor({**CLAVE, 'tenant_id': ajeno.split('#')[0], 'tenant_usuario': ajeno})
+        with pytest.raises(ValueError, match='lastKey'):
+            compras.decodificar_cursor(token, PROPIO)
+
+def test_cursor_firmado_con_otro_secreto_se_rechaza(monkeypatch):
+    token = compras.codificar_cursor(CLAVE)
+    monkeypatch.setattr(compras, 'jwt_secret', 'otro-secreto')
+    with pytest.raises(ValueError, match='lastKey'):
+        compras.decodificar_cursor(token, PROPIO)
+
+def test_listar_rechaza_cursor_de_otro_tenant(memoria):
+    for _ in range(2):
+        body = {'productos': [{'codigo': 'P1', 'nombre': 'Paracetamol', 'precio': '2.50', 'cantidad': 1}]}
+        compras.registrar_compra(evento({'tenant_id': 'mifarma'}, body=body), None)
+    status, body = respuesta(compras.listar_compras(evento({'tenant_id': 'mifarma'}, query={'limit': '1'}), None))
+    assert status == 200 and body['nextKey']
+
+    # El mismo email en otro tenant no puede continuar el listado
+    status, body = respuesta(compras.listar_compras(evento(query={'lastKey': body['nextKey']}), None))
+    assert status == 400
+    assert body['message'] == 'Parámetro lastKey inválido'
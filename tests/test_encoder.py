@@ -0,0 +1,28 @@
+import json
+from decimal import Decimal
+
+from compras import DecimalEncoder
+
+def codificar(documento, **kwargs):
+    return json.loads(json.dumps(documento, cls=DecimalEncoder, montos_exactos=True, **kwargs))
+
+def test_montos_exactos_se_eligen_por_atributo():
+    resultado = codificar({'total_monto': Decimal('50'), 'precio': Decimal('12.50'), 'x': Decimal('1E+2')})
+    assert resultado == {'total_monto': '50', 'precio': '12.50', 'x': 100}
+
+def test_montos_en_notacion_fija_y_cantidades_numericas():
+    compra = {
+        'total_gastado': Decimal('1.5E+3'),
+        'total_productos': Decimal('3'),
+        'productos': [{'codigo': 'P1', 'cantidad': Decimal('3'), 'subtotal': Decimal('2.5E+1'), 'monto': 7}]
+    }
+    resultado = codificar(compra, separators=(',', ':'), sort_keys=True)
+    assert resultado == {
+        'total_gastado': '1500',
+        'total_productos': 3,
+        'productos': [{'codigo': 'P1', 'cantidad': 3, 'subtotal': '25', 'monto': '7'}]
+    }
+
+def test_sin_montos_exactos_emite_float():
+    texto = json.dumps({'precio': Decimal('12.50'), 'cantidad': Decimal('2')}, cls=DecimalEncoder)
+    assert json.loads(texto) == {'precio': 12.5, 'cantidad': 2.0}
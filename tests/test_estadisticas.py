@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+import pytest
+
+import estadisticas
+from repositorio import clave_estadisticas, clave_usuario
+
+TENANT = 'inkafarma'
+
+def compra(codigo, email, fecha, monto='10'):
+    return {
+        'tenant_id': TENANT,
+        'codigo_compra': codigo,
+        'tenant_usuario': clave_usuario(TENANT, email),
+        'email_usuario': email,
+        'fecha_compra': fecha,
+        'total_monto': Decimal(monto),
+        'total_productos': Decimal('1'),
+        'productos': [{'codigo': 'P1', 'nombre': 'Producto', 'cantidad': Decimal('1'), 'subtotal': Decimal(monto)}]
+    }
+
+def aplicar(indice, item):
+    """Escribe la compra (el índice la ve enseguida) y aplica su registro del stream"""
+    indice.poner(item)
+    estadisticas.aplicar_compra(TENANT, item['codigo_compra'], item)
+
+def stats(agregados, email):
+    return agregados.get_item(Key={'tenant_id': TENANT, 'clave': clave_estadisticas(email)}).get('Item', {})
+
+def test_reentrega_completa_fechas_tras_fallar_despues_de_la_transaccion(almacen, monkeypatch):
+    agregados, indice = almacen
+    item = compra('C1', 'a@x.com', '2025-06-01T10:00:00')
+    indice.poner(item)
+
+    original = estadisticas.actualizar_fechas
+    def morir(*args):
+        raise RuntimeError('timeout de la invocación')
+    monkeypatch.setattr(estadisticas, 'actualizar_fechas', morir)
+    with pytest.raises(RuntimeError):
+        estadisticas.aplicar_compra(TENANT, 'C1', item)
+    assert 'primera_compra' not in stats(agregados, 'a@x.com')
+
+    monkeypatch.setattr(estadisticas, 'actualizar_fechas', original)
+    estadisticas.aplicar_compra(TENANT, 'C1', item)
+
+    resultado = stats(agregados, 'a@x.com')
+    assert resultado['total_compras'] == 1
+    assert resultado['total_gastado'] == Decimal('10')
+    assert resultado['primera_compra'] == resultado['ultima_compra'] == '2025-06-01T10:00:00'
+
+def test_reentrega_no_altera_totales(almacen):
+    agregados, indice = almacen
+    item = compra('C1', 'a@x.com', '2025-06-01T10:00:00')
+    for _ in range(3):
+        aplicar(indice, item)
+
+    resultado = stats(agregados, 'a@x.com')
+    assert resultado['total_compras'] == 1
+    assert resultado['total_gastado'] == Decimal('10')
+
+def test_modificar_fecha_con_indice_desactualizado(almacen):
+    agregados, indice = almacen
+    aplicar(indice, compra('C1', 'a@x.com', '2025-06-01T10:00:00'))
+
+    # El índice todavía devuelve la fecha anterior de la compra modificada
+    modificada = compra('C1', 'a@x.com', '2025-06-05T10:00:00', monto='12')
+    estadisticas.aplicar_compra(TENANT, 'C1', modificada)
+
+    resultado = stats(agregados, 'a@x.com')
+    assert resultado['total_compras'] == 1
+    assert resultado['total_gastado'] == Decimal('12')
+    assert resultado['primera_compra'] == resultado['ultima_compra'] == '2025-06-05T10:00:00'
+
+def test_mover_compra_entre_usuarios(almacen):
+    agregados, indice = almacen
+    aplicar(indice, compra('C1', 'a@x.com', '2025-06-01T10:00:00'))
+    aplicar(indice, compra('C2', 'a@x.com', '2025-06-03T10:00:00'))
+
+    # C2 pasa a b@x.com; el índice sigue listándola en a@x.com
+    movida = compra('C2', 'b@x.com', '2025-06-03T10:00:00')
+    estadisticas.aplicar_compra(TENANT, 'C2', movida)
+
+    origen = stats(agregados, 'a@x.com')
+    assert origen['total_compras'] == 1
+    assert origen['primera_compra'] == origen['ultima_compra'] == '2025-06-01T10:00:00'
+    destino = stats(agregados, 'b@x.com')
+    assert destino['total_compras'] == 1
+    assert destino['primera_compra'] == destino['ultima_compra'] == '2025-06-03T10:00:00'
+
+def test_eliminar_extremo_con_indice_desactualizado(almacen):
+    agregados, indice = almacen
+    aplicar(indice, compra('C1', 'a@x.com', '2025-06-01T10:00:00'))
+    aplicar(indice, compra('C2', 'a@x.com', '2025-06-03T10:00:00'))
+
+    # REMOVE de la compra más reciente antes de que el índice la quite
+    estadisticas.aplicar_compra(TENANT, 'C2', None)
+
+    resultado = stats(agregados, 'a@x.com')
+    assert resultado['total_compras'] == 1
+    assert resultado['total_gastado'] == Decimal('10')
+    assert resultado['ultima_compra'] == '2025-06-01T10:00:00'
+
+def test_eliminar_unica_compra_quita_fechas(almacen):
+    agregados, indice = almacen
+    aplicar(indice, compra('C1', 'a@x.com', '2025-06-01T10:00:00'))
+
+    estadisticas.aplicar_compra(TENANT, 'C1', None)
+
+    resultado = stats(agregados, 'a@x.com')
+    assert resultado['total_compras'] == 0
+    assert 'primera_compra' not in resultado and 'ultima_compra' not in resultado
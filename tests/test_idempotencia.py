@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from conftest import evento, respuesta
+
+import compras
+
+BODY = {'productos': [{'codigo': 'P1', 'nombre': 'Paracetamol', 'precio': '2.50', 'cantidad': 2}]}
+
+def registrar(body=BODY, clave='clave-1', usuario=None):
+    event = evento(usuario, body=json.dumps(body), headers={'Idempotency-Key': clave})
+    return compras.registrar_compra(event, None)
+
+def compras_guardadas(memoria):
+    return len(memoria.compras)
+
+@pytest.mark.parametrize('limpiar_cache', [False, True])
+def test_reintento_repite_la_respuesta(memoria, limpiar_cache):
+    original = registrar()
+    assert original['statusCode'] == 201
+
+    # Sin el cache del contenedor la respuesta sale del registro guardado
+    if limpiar_cache:
+        compras.idempotencia_cache.limpiar()
+    repetida = registrar()
+
+    assert repetida['statusCode'] == 201
+    assert repetida['body'] == original['body']
+    assert repetida['headers']['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in original['headers']
+    assert compras_guardadas(memoria) == 1
+
+def test_misma_clave_con_otro_body_responde_422(memoria):
+    registrar()
+    otro = {'productos': [{**BODY['productos'][0], 'cantidad': 3}]}
+
+    status, body = respuesta(registrar(otro))
+    assert status == 422
+    assert body['error'] == 'Idempotency-Key ya usada con otro contenido'
+    assert compras_guardadas(memoria) == 1
+
+def test_clave_en_curso_responde_409(memoria, monkeypatch):
+    def reintentar(usuario, event):
+        # El cliente reintenta mientras la primera solicitud todavía se procesa
+        return respuesta(registrar())
+    monkeypatch.setattr(compras, 'procesar_registro', reintentar)
+
+    status, body = respuesta(registrar())
+    assert status == 409
+
+def test_error_libera_la_clave(memoria, monkeypatch):
+    original = compras.procesar_registro
+    def fallar(usuario, event):
+        raise RuntimeError('DynamoDB no disponible')
+    monkeypatch.setattr(compras, 'procesar_registro', fallar)
+    assert registrar()['statusCode'] == 500
+
+    monkeypatch.setattr(compras, 'procesar_registro', original)
+    assert registrar()['statusCode'] == 201
+    assert compras_guardadas(memoria) == 1
+
+def test_clave_de_otro_usuario_no_se_repite(memoria):
+    registrar()
+    ajena = registrar(usuario={'email': 'beto@x.com'})
+    assert ajena['statusCode'] == 201
+    assert 'Idempotent-Replayed' not in ajena['headers']
+    assert compras_guardadas(memoria) == 2
+
+def test_sin_clave_no_se_repite(memoria):
+    for _ in range(2):
+        status, _ = respuesta(compras.registrar_compra(evento(body=json.dumps(BODY)), None))
+        assert status == 201
+    assert compras_guardadas(memoria) == 2
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+import pytest
+from conftest import evento, respuesta
+
+import compras
+
+USUARIO = {'tenant_id': 'inkafarma', 'email': 'ana@x.com', 'nombre': 'Ana'}
+
+def producto(**campos):
+    return {'codigo': 'P1', 'nombre': 'Paracetamol', 'precio': '2.50', 'cantidad': 2, **campos}
+
+def test_reporta_todos_los_errores_de_todas_las_lineas():
+    productos = [
+        {'codigo': 'P1', 'precio': '0', 'cantidad': 1.5},
+        producto(),
+        'P3',
+        {'nombre': 'Sin código', 'precio': 'abc', 'cantidad': 0},
+    ]
+    totales, errores = compras.validar_productos(productos)
+    assert totales is None
+    assert errores == [
+        'Campo requerido en producto 1: nombre',
+        'Cantidad debe ser un número entero mayor a 0 en producto 1',
+        'Precio debe ser mayor a 0 en producto 1',
+        'Producto 3 inválido',
+        'Campo requerido en producto 4: codigo',
+        'Cantidad debe ser un número entero mayor a 0 en producto 4',
+        'Precio inválido en producto 4',
+    ]
+
+@pytest.mark.parametrize('precio, error', [
+    (True, 'Precio inválido'),
+    ('NaN', 'Precio inválido'),
+    ('Infinity', 'Precio inválido'),
+    ([1], 'Precio inválido'),
+    ('-1', 'Precio debe ser mayor a 0'),
+])
+def test_precios_invalidos(precio, error):
+    _, errores = compras.validar_productos([producto(precio=precio)])
+    assert errores == [f'{error} en producto 1']
+
+def test_productos_validos_se_totalizan_en_decimal():
+    productos = [producto(), producto(codigo='P2', precio=0.1, cantidad=3)]
+    totales, errores = compras.validar_productos(productos)
+    assert errores == []
+    assert totales == (5, Decimal('5.3'))
+    assert productos[1]['precio'] == Decimal('0.1') and productos[1]['subtotal'] == Decimal('0.3')
+
+@pytest.mark.parametrize('body, error', [
+    (None, 'Lista de productos requerida'),
+    ({}, 'Lista de productos requerida'),
+    ({'productos': []}, 'Lista de productos requerida'),
+    ({'productos': {'codigo': 'P1'}}, 'Lista de productos inválida'),
+])
+def test_body_sin_lista_de_productos(body, error):
+    assert compras.construir_compra(USUARIO, body) == (None, [error])
+
+def test_registrar_devuelve_la_lista_de_errores(memoria):
+    body = {'productos': [producto(precio=None), producto(cantidad=-1)]}
+    status, respuesta_body = respuesta(compras.registrar_compra(evento(body=body), None))
+    assert status == 400
+    assert respuesta_body == {
+        'error': 'Campo requerido en producto 1: precio',
+        'errores': [
+            'Campo requerido en producto 1: precio',
+            'Cantidad debe ser un número entero mayor a 0 en producto 2',
+        ]
+    }
+    assert not memoria.compras
+
+def test_lote_devuelve_errores_por_compra(memoria):
+    body = {'compras': [{'productos': [producto()]}, {'productos': [producto(nombre=None, precio='x')]}]}
+    status, respuesta_body = respuesta(compras.registrar_compras_lote(evento(body=body), None))
+    assert status == 207
+    assert respuesta_body['registradas'] == 1
+    assert respuesta_body['resultados'][1] == {
+        'indice': 1,
+        'error': 'Campo requerido en producto 1: nombre',
+        'errores': ['Campo requerido en producto 1: nombre', 'Precio inválido en producto 1'],
+    }